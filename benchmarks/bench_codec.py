@@ -0,0 +1,43 @@
+"""
+Microbenchmark of the cost of parsing one step response of a screenshot environment.
+
+Run with `python benchmarks/bench_codec.py`. It compares the standard library with the
+codec backend that is installed, decoding a response with a base64 screenshot and validating
+its observation as `Environment.step` does.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import os
+import timeit
+
+from hud.server import codec
+from hud.utils.common import Observation
+
+ITERATIONS = 200
+SCREENSHOT_SIZE = 1024 * 1024
+
+
+def _step_response() -> bytes:
+    screenshot = base64.b64encode(os.urandom(SCREENSHOT_SIZE)).decode()
+    result = {"observation": {"screenshot": screenshot, "text": "step"}}
+    return json.dumps({"result": result, "stdout": "", "stderr": ""}).encode()
+
+
+def _parse_step(loads: object, body: bytes) -> Observation:
+    data = loads(body)  # type: ignore[operator]
+    return Observation.model_validate(data["result"]["observation"], strict=True)
+
+
+def main() -> None:
+    body = _step_response()
+    print(f"step response of {len(body) // 1024} kb, {ITERATIONS} iterations")
+    for name, loads in [("json", json.loads), (codec.BACKEND, codec.loads)]:
+        seconds = timeit.timeit(lambda loads=loads: _parse_step(loads, body), number=ITERATIONS)
+        print(f"{name:>8}: {seconds / ITERATIONS * 1e6:10.1f} us per step")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""Fixtures shared by the tests of every package."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from hud.settings import settings
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Keep the caches written by a test out of the cache directory of the user."""
+    monkeypatch.setattr(settings, "cache_dir", tmp_path / "cache")
+    return tmp_path / "cache"
@@ -13,13 +13,17 @@ def screenshot_base64() -> str:
     """
     Take a screenshot and return it as a base64 encoded string.
     """
+    return base64.b64encode(screenshot_png()).decode()
+
+
+def screenshot_png() -> bytes:
+    """
+    Take a screenshot and return it as raw PNG bytes.
+    """
     photo = pyautogui.screenshot()
     output = BytesIO()
     photo.save(output, format="PNG")
-    im_data = output.getvalue()
-
-    image_data = base64.b64encode(im_data).decode()
-    return image_data
+    return output.getvalue()
 
 
 def step(action: list[dict[str, Any]]) -> Any:
@@ -29,6 +33,7 @@ def step(action: list[dict[str, Any]]) -> Any:
     pyautogui_rosetta = PyAutoGUIRosetta()
     pyautogui_rosetta.execute_sequence(action)
 
-    screenshot = screenshot_base64()
+    # raw bytes are sent as a binary attachment, the SDK base64 encodes them on arrival
+    screenshot = screenshot_png()
 
     return {"observation": {"screenshot": screenshot}}
@@ -5,9 +5,9 @@ HUD Gym SDK - A Python SDK for interacting with HUD environments.
 from __future__ import annotations
 
 from . import agent, env, gym, settings, task, taskset, types, utils
-from .job import create_job, load_job, run_job
+from .job import create_job, load_job, resume_job, run_job
 from .job import job as register_job
-from .taskset import load_taskset
+from .taskset import iter_taskset, load_taskset
 
 __version__ = "0.2.4"
 
@@ -16,9 +16,11 @@ __all__ = [
     "create_job",
     "env",
     "gym",
+    "iter_taskset",
     "load_job",
     "load_taskset",
     "register_job",
+    "resume_job",
     "run_job",
     "settings",
     "task",
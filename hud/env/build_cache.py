@@ -0,0 +1,180 @@
+"""
+Cache of images built from build contexts.
+
+Images are keyed by where they were built and a digest of the contents of the build context,
+so every environment made from an unchanged build context reuses one image instead of building
+its own. Remote images are also keyed by the HUD server and account they were built with.
+Concurrent builds of the same context are deduplicated into a single build, and the index of
+built images is persisted in the SDK cache directory so it survives process restarts.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from typing import TYPE_CHECKING, Any
+
+from hud.settings import settings
+from hud.utils.archive import context_paths
+from hud.utils.concurrency import single_flight
+from hud.utils.disk_cache import load_json, update_json
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+    from pathlib import Path
+
+logger = logging.getLogger("hud.env.build_cache")
+
+_CACHE_FILE = "images.json"
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+# file -> (size, mtime_ns, sha256) of the last time it was hashed
+_file_hashes: dict[Path, tuple[int, int, str]] = {}
+
+# cache key -> {"uri": ..., "build_data": ...}
+_index: dict[str, dict[str, Any]] | None = None
+
+
+def context_digest(build_context: Path) -> str:
+    """
+    Get a digest of the contents of a build context. The digest only depends on the paths
+    and contents of the files sent with the context, so it is the same on every machine.
+
+    Only the entries listed by `context_paths`, which are the ones archived for a build, are
+    read, so files excluded by .dockerignore cost nothing. Files whose size and modification
+    time did not change since the last digest in this process are not read again.
+
+    Args:
+        build_context: The directory the image is built from
+
+    Returns:
+        str: A hex digest that changes whenever a file sent with the build context changes
+    """
+    digest = hashlib.sha256()
+    for rel_path in context_paths(build_context):
+        path = build_context / rel_path
+        if path.is_dir():
+            digest.update(f"d {rel_path}\0".encode())
+        else:
+            digest.update(f"f {rel_path}\0{_file_hash(path)}\0".encode())
+    return digest.hexdigest()
+
+
+def _file_hash(path: Path) -> str:
+    stat = path.stat()
+    cached = _file_hashes.get(path)
+    if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+    file_hash = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            file_hash.update(chunk)
+    _file_hashes[path] = (stat.st_size, stat.st_mtime_ns, file_hash.hexdigest())
+    return file_hash.hexdigest()
+
+
+def context_key(location: str, build_context: Path) -> str:
+    """
+    Get the cache key of a build context.
+
+    Args:
+        location: Where the image is built, "local" or "remote"
+        build_context: The directory the image is built from
+
+    Returns:
+        str: A key that changes whenever a file sent with the build context changes
+    """
+    digest = context_digest(build_context)
+    if location == "remote":
+        # an image built with one server or account is not available to another
+        account = hashlib.sha256((settings.api_key or "").encode()).hexdigest()[:16]
+        return f"remote:{settings.base_url}:{account}:{digest}"
+    return f"{location}:{digest}"
+
+
+def _load() -> dict[str, dict[str, Any]]:
+    global _index
+    if _index is None:
+        index = load_json(_CACHE_FILE)
+        _index = index if isinstance(index, dict) else {}
+    return _index
+
+
+def _store(key: str, entry: dict[str, Any] | None) -> None:
+    """Set or remove (None) the entry of a key, keeping the entries other processes saved."""
+    global _index
+
+    def update(index: Any) -> dict[str, dict[str, Any]]:
+        index = dict(index) if isinstance(index, dict) else {}
+        if entry is None:
+            index.pop(key, None)
+        else:
+            index[key] = entry
+        return index
+
+    _index = update_json(_CACHE_FILE, update)
+
+
+async def invalidate(location: str, build_context: Path) -> None:
+    """
+    Forget the image built from a build context, so the next build of it runs again, e.g.
+    after creating an environment from the cached image failed.
+
+    Args:
+        location: Where the image was built, "local" or "remote"
+        build_context: The directory the image was built from
+    """
+    key = await asyncio.to_thread(context_key, location, build_context)
+    if _load().get(key) is not None:
+        logger.info("Forgetting cached image for build context %s", build_context)
+    _store(key, None)
+
+
+async def _build(
+    key: str,
+    build_context: Path,
+    build: Callable[[Path], Awaitable[tuple[str, dict[str, Any]]]],
+    exists: Callable[[str], Awaitable[bool]] | None,
+) -> tuple[str, dict[str, Any]]:
+    cached = _load().get(key)
+    if cached is not None:
+        if exists is None or await exists(cached["uri"]):
+            logger.info("Using cached image %s for build context %s", cached["uri"], build_context)
+            return cached["uri"], {**cached["build_data"], "cached": True}
+        logger.info("Cached image %s no longer exists, rebuilding", cached["uri"])
+
+    uri, build_data = await build(build_context)
+    _store(key, {"uri": uri, "build_data": dict(build_data)})
+    return uri, build_data
+
+
+async def get_or_build(
+    location: str,
+    build_context: Path,
+    build: Callable[[Path], Awaitable[tuple[str, dict[str, Any]]]],
+    *,
+    exists: Callable[[str], Awaitable[bool]] | None = None,
+) -> tuple[str, dict[str, Any]]:
+    """
+    Get the image built from a build context, building it only if the context has not been
+    built before. Concurrent calls for the same context wait for a single build.
+
+    Args:
+        location: Where the image is built, "local" or "remote"
+        build_context: The directory to build the image from
+        build: Builds the image, returning its URI and build data
+        exists: Checks that a cached image still exists, if that can be checked
+
+    Returns:
+        tuple[str, dict[str, Any]]: The URI of the image and its build data
+    """
+    # hashing reads the build context, so keep it off the event loop
+    key = await asyncio.to_thread(context_key, location, build_context)
+
+    uri, build_data = await single_flight(
+        ("build", key), lambda: _build(key, build_context, build, exists)
+    )
+    # every caller gets its own build data to attach to its environment
+    return uri, dict(build_data)
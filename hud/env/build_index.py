@@ -0,0 +1,102 @@
+"""
+Indexes of images built remotely, keyed by the digest of their build context.
+
+Before uploading a build context, `RemoteDockerClient.build_image` asks an index whether an
+image was already built from the same contents, on this machine or any other, and skips the
+upload and build if so. The HUD API serves as the index when it advertises `BUILD_LOOKUP`;
+`LocalBuildIndex` keeps the index in memory, as a stand-in for tests and offline use.
+"""
+
+from __future__ import annotations
+
+import abc
+import logging
+from typing import Any
+
+from hud.exceptions import HudException, HudRequestError
+from hud.server import BUILD_LOOKUP, make_request, supports
+from hud.settings import settings
+
+logger = logging.getLogger("hud.env.build_index")
+
+
+class BuildIndex(abc.ABC):
+    """
+    An index of images, keyed by the digest of the build context they were built from.
+    """
+
+    @abc.abstractmethod
+    async def lookup(self, digest: str) -> tuple[str, dict[str, Any]] | None:
+        """
+        Look up the image built from a build context.
+
+        Args:
+            digest: The digest of the build context, see `build_cache.context_digest`
+
+        Returns:
+            tuple[str, dict[str, Any]] | None: The URI and build data of the image, or None if
+                no image is known for the digest
+        """
+
+    @abc.abstractmethod
+    async def record(self, digest: str, uri: str, build_data: dict[str, Any]) -> None:
+        """
+        Record the image built from a build context.
+
+        Args:
+            digest: The digest of the build context
+            uri: The URI of the image
+            build_data: The build data of the image
+        """
+
+
+class ServerBuildIndex(BuildIndex):
+    """
+    The index of builds kept by the HUD API. Builds are recorded by the server when they are
+    started with their context digest, so `record` does nothing.
+    """
+
+    async def lookup(self, digest: str) -> tuple[str, dict[str, Any]] | None:
+        if not await supports(BUILD_LOOKUP):
+            return None
+        try:
+            response = await make_request(
+                method="GET",
+                url=f"{settings.base_url}/v2/builds/by_digest/{digest}",
+                api_key=settings.api_key,
+                max_retries=1,
+            )
+        except HudRequestError as e:
+            if e.status_code != 404:
+                logger.debug("Could not look up build context %s: %s", digest, e)
+            return None
+        except HudException as e:
+            # building again is always possible, so a failed lookup is not an error
+            logger.debug("Could not look up build context %s: %s", digest, e)
+            return None
+        if not response.get("uri"):
+            return None
+        return response["uri"], {"logs": response.get("logs", "")}
+
+    async def record(self, digest: str, uri: str, build_data: dict[str, Any]) -> None:
+        pass
+
+
+class LocalBuildIndex(BuildIndex):
+    """
+    An index kept in memory.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the LocalBuildIndex."""
+        self.images: dict[str, tuple[str, dict[str, Any]]] = {}
+
+    async def lookup(self, digest: str) -> tuple[str, dict[str, Any]] | None:
+        image = self.images.get(digest)
+        if image is None:
+            return None
+        uri, build_data = image
+        return uri, dict(build_data)
+
+    async def record(self, digest: str, uri: str, build_data: dict[str, Any]) -> None:
+        self.images[digest] = (uri, dict(build_data))
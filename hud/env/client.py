@@ -1,20 +1,32 @@
 from __future__ import annotations
 
+import logging
+import time
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING, Any
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
+
+from hud.env.status import is_transient_error, wait_for_status
+from hud.types import EnvironmentStatus
 
 if TYPE_CHECKING:
-    from hud.types import EnvironmentStatus
+    from collections.abc import Callable
+
+    from hud.env.status import StatusPoll
     from hud.utils.config import FunctionConfig
 
+logger = logging.getLogger("hud.env.client")
+
 
 class Client(BaseModel, ABC):
     """
     Base class for all environment clients.
     """
 
+    _created_at: float = PrivateAttr(default_factory=time.monotonic)
+    _startup_latency: float | None = PrivateAttr(default=None)
+
     @abstractmethod
     async def invoke(self, config: FunctionConfig) -> Any:
         """
@@ -27,6 +39,61 @@ class Client(BaseModel, ABC):
         Get the current status of the environment.
         """
 
+    @property
+    def startup_latency(self) -> float | None:
+        """
+        Seconds from the creation of the client until the environment was first seen running
+        by `wait_until`, or None if it has not been.
+        """
+        return self._startup_latency
+
+    async def wait_until(
+        self, status: EnvironmentStatus, *, timeout: float | None = None
+    ) -> EnvironmentStatus:
+        """
+        Wait until the environment reaches a status, polling with an adaptive backoff.
+
+        Args:
+            status: The status to wait for, e.g. `EnvironmentStatus.RUNNING`
+            timeout: Seconds to wait at most, None to wait forever
+
+        Returns:
+            EnvironmentStatus: `status`, or the terminal status (`COMPLETED` or `ERROR`) the
+                environment reached instead
+
+        Raises:
+            HudTimeoutError: If the environment did not reach the status in time
+        """
+
+        async def poll(_: EnvironmentStatus, __: float) -> EnvironmentStatus:
+            return await self.get_status()
+
+        return await self._wait_until(poll, status, timeout=timeout)
+
+    async def _wait_until(
+        self,
+        poll: StatusPoll,
+        status: EnvironmentStatus,
+        *,
+        timeout: float | None,
+        long_poll: bool = False,
+        is_transient: Callable[[Exception], bool] = is_transient_error,
+    ) -> EnvironmentStatus:
+        """Wait for a status with `poll`, recording the startup latency once running."""
+        started = time.monotonic()
+        reached = await wait_for_status(
+            poll, status, timeout=timeout, long_poll=long_poll, is_transient=is_transient
+        )
+        if reached == EnvironmentStatus.RUNNING and self._startup_latency is None:
+            now = time.monotonic()
+            self._startup_latency = now - self._created_at
+            logger.info(
+                "Environment running %.2fs after creation (%.2fs spent waiting)",
+                self._startup_latency,
+                now - started,
+            )
+        return reached
+
     @abstractmethod
     async def close(self) -> None:
         """
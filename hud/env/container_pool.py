@@ -0,0 +1,288 @@
+"""
+Pools of pre-started containers for local docker environments.
+
+Pooling is off by default. Once enabled with `configure_container_pool`, `gym.make` hands out
+warm containers from a per-image pool instead of creating one per environment, and a
+background task keeps `min_size` idle containers ready so creation overlaps with agent work.
+When an environment is closed, its container goes back to the pool if the controller's
+`recycle` hook returns a truthy value, and is destroyed otherwise.
+
+Pools hold running containers, so call `close_container_pools` when you are done.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger("hud.env.container_pool")
+
+# The controller function called to reset a container before it goes back to the pool.
+RECYCLE_FUNCTION = "recycle"
+
+
+class PoolConfig(BaseModel):
+    """
+    Configuration of a container pool.
+
+    Attributes:
+        min_size: Number of idle containers to keep warm
+        max_size: Maximum number of containers, idle and in use
+        idle_ttl: Seconds an idle container above min_size is kept before it is destroyed
+    """
+
+    min_size: int = 0
+    max_size: int = 32
+    idle_ttl: float = 300.0
+
+
+class PooledContainer:
+    """
+    A container owned by a pool.
+
+    Attributes:
+        container_id: The ID of the container
+        state: Client state that belongs to the container and survives recycling
+        idle_since: Monotonic time the container was last returned to the pool
+    """
+
+    def __init__(self, container_id: str) -> None:
+        self.container_id = container_id
+        self.state: dict[str, Any] = {}
+        self.idle_since = time.monotonic()
+
+
+class ContainerPool:
+    """
+    A pool of pre-started containers for one image.
+    """
+
+    def __init__(
+        self,
+        config: PoolConfig,
+        create: Callable[[], Awaitable[str]],
+        destroy: Callable[[str], Awaitable[None]],
+        on_close: Callable[[], Awaitable[None]] | None = None,
+    ) -> None:
+        """
+        Initialize the ContainerPool.
+
+        Args:
+            config: The pool configuration
+            create: Creates and starts a container, returning its ID
+            destroy: Stops and removes a container
+            on_close: Called after the pool is closed, to release shared resources
+        """
+        self.config = config
+        self._create = create
+        self._destroy = destroy
+        self._on_close = on_close
+
+        self._idle: list[PooledContainer] = []
+        self._in_use = 0
+        self._creating = 0
+        self._closed = False
+        self._changed = asyncio.Condition()
+        self._background: set[asyncio.Task] = set()
+        self._reaper = asyncio.create_task(self._reap_idle())
+        self._refill()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """The number of idle, in use, and currently creating containers."""
+        return {"idle": len(self._idle), "in_use": self._in_use, "creating": self._creating}
+
+    def _total(self) -> int:
+        return len(self._idle) + self._in_use + self._creating
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _refill(self) -> None:
+        """Start creating containers until min_size are idle or being created."""
+        while (
+            not self._closed
+            and len(self._idle) + self._creating < self.config.min_size
+            and self._total() < self.config.max_size
+        ):
+            self._creating += 1
+            self._spawn(self._warm_one())
+
+    async def _warm_one(self) -> None:
+        try:
+            container_id = await self._create()
+        except Exception:
+            logger.exception("Failed to create a warm container")
+            async with self._changed:
+                self._creating -= 1
+                self._changed.notify_all()
+            return
+
+        async with self._changed:
+            self._creating -= 1
+            if self._closed:
+                self._spawn(self._destroy_quietly(container_id))
+            else:
+                self._idle.append(PooledContainer(container_id))
+            self._changed.notify_all()
+
+    async def _destroy_quietly(self, container_id: str) -> None:
+        try:
+            await self._destroy(container_id)
+        except Exception as e:
+            logger.warning("Error destroying pooled container %s: %s", container_id, e)
+
+    async def acquire(self) -> PooledContainer:
+        """
+        Take a container from the pool, creating one if none is idle and the pool is not full.
+        Waits for a container to be released if the pool is full.
+
+        Returns:
+            PooledContainer: The container, which must be given back with `release`
+        """
+        entry = None
+        async with self._changed:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Container pool is closed")
+                if self._idle:
+                    entry = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._total() < self.config.max_size:
+                    self._creating += 1
+                    break
+                await self._changed.wait()
+
+        if entry is None:
+            try:
+                container_id = await self._create()
+            except BaseException:
+                async with self._changed:
+                    self._creating -= 1
+                    self._changed.notify_all()
+                raise
+            async with self._changed:
+                self._creating -= 1
+                self._in_use += 1
+            entry = PooledContainer(container_id)
+
+        # replace what was taken in the background, while the caller gets to work
+        self._refill()
+        return entry
+
+    async def release(self, entry: PooledContainer, *, reusable: bool) -> None:
+        """
+        Give a container back to the pool.
+
+        Args:
+            entry: The container taken with `acquire`
+            reusable: Whether the container was reset and can be handed out again
+        """
+        async with self._changed:
+            self._in_use -= 1
+            if reusable and not self._closed:
+                entry.idle_since = time.monotonic()
+                self._idle.append(entry)
+            else:
+                self._spawn(self._destroy_quietly(entry.container_id))
+            self._changed.notify_all()
+        self._refill()
+
+    async def _reap_idle(self) -> None:
+        """Destroy containers that have been idle for longer than the TTL, above min_size."""
+        interval = max(self.config.idle_ttl / 2, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            async with self._changed:
+                # the oldest idle containers are at the front
+                while (
+                    len(self._idle) > self.config.min_size
+                    and now - self._idle[0].idle_since > self.config.idle_ttl
+                ):
+                    expired = self._idle.pop(0)
+                    self._spawn(self._destroy_quietly(expired.container_id))
+
+    async def close(self) -> None:
+        """
+        Destroy all idle containers and stop warming new ones.
+        Containers still in use are destroyed when they are released.
+        """
+        async with self._changed:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._changed.notify_all()
+
+        self._reaper.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._reaper
+        await asyncio.gather(*(self._destroy_quietly(entry.container_id) for entry in idle))
+        # let pending creations and destructions finish
+        while self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        if self._on_close is not None:
+            await self._on_close()
+
+
+# pool configuration per image, with the None key as the default for all images
+_CONFIGS: dict[str | None, PoolConfig] = {}
+_POOLS: dict[tuple[asyncio.AbstractEventLoop, str], ContainerPool] = {}
+
+
+def configure_container_pool(config: PoolConfig | None, *, image: str | None = None) -> None:
+    """
+    Enable, reconfigure or disable container pooling.
+
+    Args:
+        config: The pool configuration, or None to disable pooling
+        image: The image to configure, or None to configure all images
+    """
+    if config is None:
+        _CONFIGS.pop(image, None)
+    else:
+        _CONFIGS[image] = config
+
+
+def get_container_pool(
+    image: str, factory: Callable[[PoolConfig], ContainerPool]
+) -> ContainerPool | None:
+    """
+    Get the pool for an image on the running event loop, creating it if needed.
+
+    Args:
+        image: The image the pool holds containers of
+        factory: Creates the pool from its configuration
+
+    Returns:
+        ContainerPool | None: The pool, or None if pooling is not enabled for the image
+    """
+    config = _CONFIGS.get(image, _CONFIGS.get(None))
+    if config is None:
+        return None
+
+    key = (asyncio.get_running_loop(), image)
+    pool = _POOLS.get(key)
+    if pool is None:
+        pool = factory(config)
+        _POOLS[key] = pool
+    return pool
+
+
+async def close_container_pools() -> None:
+    """
+    Close all container pools on the running event loop, destroying their idle containers.
+    """
+    loop = asyncio.get_running_loop()
+    pools = [key for key in _POOLS if key[0] is loop]
+    await asyncio.gather(*(_POOLS.pop(key).close() for key in pools))
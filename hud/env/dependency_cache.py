@@ -0,0 +1,114 @@
+"""
+Cache of which controller dependency sets are already satisfied by which images.
+
+The first container of an image still runs `pip install -e .` for the controller. If pip
+reports that it only installed the controller itself, every dependency was already in the
+image, so later containers from the same image with the same dependency set can skip pip
+and just put /controller on the python path. The cache is persisted in the SDK cache
+directory so it survives process restarts.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+from typing import Any
+
+from hud.utils.disk_cache import load_json, update_json
+
+logger = logging.getLogger("hud.env.dependency_cache")
+
+_CACHE_FILE = "dependencies.json"
+
+# image -> dependency hashes known to be satisfied by the image
+_satisfied: dict[str, set[str]] | None = None
+
+
+def dependency_hash(pyproject_data: dict[str, Any]) -> str:
+    """
+    Hash the parts of a pyproject.toml that decide what `pip install -e .` installs.
+
+    Args:
+        pyproject_data: The parsed pyproject.toml
+
+    Returns:
+        str: A hex digest of the dependency section
+    """
+    project = pyproject_data.get("project", {})
+    relevant = {
+        "name": project.get("name"),
+        "dependencies": project.get("dependencies", []),
+        "optional-dependencies": project.get("optional-dependencies", {}),
+        "requires-python": project.get("requires-python"),
+        "build-system": pyproject_data.get("build-system", {}),
+    }
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode()).hexdigest()
+
+
+def _parse(data: Any) -> dict[str, set[str]]:
+    if not isinstance(data, dict):
+        return {}
+    return {image: set(hashes) for image, hashes in data.items()}
+
+
+def _load() -> dict[str, set[str]]:
+    global _satisfied
+    if _satisfied is None:
+        _satisfied = _parse(load_json(_CACHE_FILE))
+    return _satisfied
+
+
+def is_satisfied(image: str, deps_hash: str) -> bool:
+    """
+    Check if an image is known to already contain a dependency set.
+
+    Args:
+        image: The image the container was created from
+        deps_hash: The dependency hash of the controller
+
+    Returns:
+        bool: True if installing the controller would not install any dependencies
+    """
+    return deps_hash in _load().get(image, set())
+
+
+def record_satisfied(image: str, deps_hash: str) -> None:
+    """
+    Record that an image already contains a dependency set.
+
+    Args:
+        image: The image the container was created from
+        deps_hash: The dependency hash of the controller
+    """
+    global _satisfied
+
+    def update(data: Any) -> dict[str, list[str]]:
+        # other processes may have recorded images since the cache was loaded
+        satisfied = _parse(data)
+        satisfied.setdefault(image, set()).add(deps_hash)
+        return {image: sorted(hashes) for image, hashes in satisfied.items()}
+
+    _satisfied = _parse(update_json(_CACHE_FILE, update))
+
+
+def installed_only(pip_output: str, package_name: str) -> bool:
+    """
+    Check from the output of `pip install` that nothing but the given package was installed.
+
+    Args:
+        pip_output: The stdout of pip
+        package_name: The name of the package being installed
+
+    Returns:
+        bool: True if pip installed the package and no other distributions
+    """
+    normalized = re.sub(r"[-_.]+", "-", package_name).lower()
+    for line in pip_output.splitlines():
+        if line.startswith("Successfully installed "):
+            installed = line.removeprefix("Successfully installed ").split()
+            # each entry is "<name>-<version>"
+            names = {re.sub(r"[-_.]+", "-", entry.rsplit("-", 1)[0]).lower() for entry in installed}
+            return names == {normalized}
+    return False
@@ -3,18 +3,21 @@ from __future__ import annotations
 import abc
 import json
 import logging
-import os
-import uuid
-from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
 import toml
 
+from hud.env import dependency_cache
 from hud.env.client import Client
+from hud.env.framing import split_trailing_frame
+from hud.env.invoke_worker import FRAMING_SOURCE, InvokeWorker, InvokeWorkerError
+from hud.env.source_watcher import SourceManifest, SourceWatcher, watch_source
 from hud.types import EnvironmentStatus
-from hud.utils.common import directory_to_tar_bytes
+from hud.utils.common import files_to_tar_bytes
 
 if TYPE_CHECKING:
+    from pathlib import Path
+
     from hud.utils import ExecuteResult
     from hud.utils.config import FunctionConfig
 
@@ -28,28 +31,50 @@ STATUS_MESSAGES = {
 
 PACKAGE_NAME = "hud_controller"
 
+
 class InvokeError(Exception):
     """
     Error raised when an invoke fails.
     """
 
 
-def invoke_template(config: FunctionConfig, package_name: str, divider: str) -> str:
+def invoke_template(config: FunctionConfig, package_name: str) -> str:
     """
     Return a python script to run the given config.
+
+    The result is written to stdout as a frame with a trailer (see `hud.env.framing`),
+    after anything the function itself printed.
     """
     func_parts = config.function.split(".")
     module_str = ".".join([package_name] + func_parts[:-1])
     func_str = func_parts[-1]
 
     # the reason we call `json.dumps` twice is to escape the json string
-    return f"""import json
+    return (
+        FRAMING_SOURCE
+        + f"""
+import sys
 from {module_str} import {func_str}
 args = json.loads({json.dumps(json.dumps(config.args))})
 result = {func_str}(*args)
-result_str = json.dumps(result)
-print("{divider}")
-print(result_str)
+frame = encode_frame(result, trailer=True)
+sys.stdout.flush()
+sys.stdout.buffer.write(frame)
+sys.stdout.flush()
+"""
+    )
+
+
+def link_template(import_root: str) -> str:
+    """
+    Return a python script that puts a directory first on the python path of the environment,
+    through a .pth file in site-packages.
+    """
+    pth_line = f"import sys; sys.path.insert(0, {import_root!r})\n"
+    return f"""import pathlib
+import sysconfig
+site_packages = pathlib.Path(sysconfig.get_paths()["purelib"])
+(site_packages / "_hud_controller.pth").write_text({pth_line!r})
 """
 
 
@@ -60,10 +85,21 @@ class DockerClient(Client):
     Handles updating the environment when local files change.
     """
 
-    _last_pyproject_toml_str: str | None = None
+    # the image the environment was created from, if known
+    _image: str | None = None
+    # the dependency hash of the controller as last installed in the environment
+    _installed_deps_hash: str | None = None
     _last_update_time: int = 0
-    _last_file_mtimes: dict[str, float] = {}  # noqa: RUF012 - Not recognized as Pydantic model
     _source_path: Path | None = None
+    _source_watcher: SourceWatcher | None = None
+    # the watcher generation and manifest of the source as last synced to the environment
+    _synced_generation: int = 0
+    _synced_manifest: SourceManifest | None = None
+    # the manifest of the files uploaded to /controller in the container, None before the first
+    # upload since the image does not have the source at /controller
+    _controller_manifest: SourceManifest | None = None
+    _invoke_worker: InvokeWorker | None = None
+    _invoke_worker_disabled: bool = False
 
     @property
     def source_path(self) -> Path | None:
@@ -105,8 +141,13 @@ class DockerClient(Client):
 
         self._source_path = source_path
 
-        # set current mtimes
-        self._last_file_mtimes = self._get_all_file_mtimes()
+        # the image was built from this source, so the environment starts out in sync, unless
+        # it is a recycled environment that runs the source it was last synced with
+        self._source_watcher = watch_source(source_path)
+        generation = self._source_watcher.generation
+        manifest = self._source_watcher.manifest()
+        self._synced_manifest = self._controller_manifest or manifest
+        self._synced_generation = -1 if manifest.diff(self._synced_manifest) else generation
 
     @classmethod
     @abc.abstractmethod
@@ -118,7 +159,6 @@ class DockerClient(Client):
             tuple[str, dict[str, Any]]: The image tag and build output
         """
 
-
     @classmethod
     @abc.abstractmethod
     async def create(cls, image: str) -> DockerClient:
@@ -141,52 +181,19 @@ class DockerClient(Client):
             EnvironmentStatus: A status enum indicating the current state of the environment
         """
 
-    def _get_all_file_mtimes(self) -> dict[str, float]:
-        """
-        Get modification times for all files in the source path.
-
-        Returns:
-            Dict[str, float]: Dictionary mapping file paths to modification times
-        """
-        if not self._source_path:
-            return {}
-
-        file_mtimes = {}
-        for root, _, files in os.walk(self._source_path):
-            for file in files:
-                file_path = Path(root) / file
-                try:
-                    file_mtimes[str(file_path)] = file_path.stat().st_mtime
-                except (FileNotFoundError, PermissionError):
-                    # Skip files that can't be accessed
-                    continue
-        return file_mtimes
-
     async def needs_update(self) -> bool:
         """
-        Check if the environment needs an update by:
-        1. Checking if any file has been modified since the last update
+        Check if the environment needs an update, i.e. if the source watcher has seen
+        any change since the last sync. This is O(1) and safe to call on every invoke.
 
         Returns:
             bool: True if the environment needs an update, False otherwise.
         """
         # If no source path, no update needed
-        if not self.source_path:
+        if not self._source_watcher:
             return False
 
-        # Check if any file has been modified since the last update
-        current_mtimes = self._get_all_file_mtimes()
-
-        # If we don't have previous modification times, we need an update
-        if not self._last_file_mtimes:
-            return True
-
-        # Check for new or modified files
-        for file_path, mtime in current_mtimes.items():
-            if file_path not in self._last_file_mtimes or mtime > self._last_file_mtimes[file_path]:
-                return True
-
-        return False
+        return self._source_watcher.generation != self._synced_generation
 
     async def update(self) -> None:
         """
@@ -194,18 +201,28 @@ class DockerClient(Client):
         For controllers with no source path, this is a no-op.
         """
         # If no source path, nothing to update
-        if not self._source_path:
+        if not self._source_path or not self._source_watcher:
+            return
+
+        generation = self._source_watcher.generation
+        manifest = self._source_watcher.manifest()
+        changes = manifest.diff(self._synced_manifest)
+        if not changes:
+            # files were touched but their contents are unchanged
+            self._synced_generation = generation
             return
 
-        logger.info("Updating environment")
+        logger.info(
+            "Updating environment: %d added, %d modified, %d deleted files",
+            len(changes.added),
+            len(changes.modified),
+            len(changes.deleted),
+        )
 
-        # Save current file modification times
-        self._last_file_mtimes = self._get_all_file_mtimes()
+        # the worker has the old controller imported, restart it after the update
+        await self._close_invoke_worker()
 
-        # Create tar archive of the source code and send it to the container
-        tar_bytes = directory_to_tar_bytes(self._source_path)
-        await self.execute(["mkdir", "-p", "/controller"], timeout=5)
-        await self.put_archive("/controller", tar_bytes)
+        await self._sync_controller_files(manifest)
 
         # Check if pyproject.toml exists and parse it
         pyproject_path = self._source_path / "pyproject.toml"
@@ -213,27 +230,113 @@ class DockerClient(Client):
             raise FileNotFoundError(f"pyproject.toml not found in {self._source_path}")
 
         # Read and parse the current content of pyproject.toml
-        current_pyproject_content = pyproject_path.read_text()
+        pyproject_data = toml.loads(pyproject_path.read_text())
+        self._package_name = pyproject_data.get("project", {}).get("name")
+        if not self._package_name:
+            raise ValueError("Could not find package name in pyproject.toml")
+
+        # only reinstall if the dependencies changed, source changes are picked up by the
+        # editable install
+        deps_hash = dependency_cache.dependency_hash(pyproject_data)
+        if deps_hash != self._installed_deps_hash:
+            await self._install_controller(deps_hash)
+
+        self._synced_generation = generation
+        self._synced_manifest = manifest
+
+    def _controller_import_root(self) -> str | None:
+        """
+        Get the directory in the container that the controller package is imported from.
+
+        Returns:
+            str | None: The directory, or None if the source layout is not recognized
+        """
+        if not self._source_path:
+            return None
+        if (self._source_path / "src" / PACKAGE_NAME).is_dir():
+            return "/controller/src"
+        if (self._source_path / PACKAGE_NAME).is_dir():
+            return "/controller"
+        return None
+
+    async def _install_controller(self, deps_hash: str) -> None:
+        """
+        Make the controller in /controller importable in the environment.
+
+        On a fresh environment whose image is known to already contain the dependencies,
+        /controller is put on the python path directly. Otherwise the controller is
+        installed with pip, and if pip installed nothing but the controller, the image is
+        recorded as satisfying this dependency set.
+
+        Args:
+            deps_hash: The dependency hash of the controller's pyproject.toml
+        """
+        import_root = self._controller_import_root()
+        if (
+            self._installed_deps_hash is None
+            and self._image
+            and import_root
+            and dependency_cache.is_satisfied(self._image, deps_hash)
+        ):
+            logger.info("Dependencies already installed in image, linking /controller")
+            await self.execute(["python3", "-c", link_template(import_root)], timeout=10)
+            self._installed_deps_hash = deps_hash
+            return
+
+        logger.info("Installing %s in /controller", self._package_name)
+        result = await self.execute(
+            ["bash", "-c", "cd /controller && pip install -e . --break-system-packages"],
+            timeout=60,
+        )
+        stdout = result["stdout"].decode(errors="replace")
+        stderr = result["stderr"].decode(errors="replace")
+        if stdout:
+            logger.info("STDOUT:\n%s", stdout)
+        if stderr:
+            logger.warning("STDERR:\n%s", stderr)
+
         if (
-            self._last_pyproject_toml_str is None
-            or self._last_pyproject_toml_str != current_pyproject_content
+            self._installed_deps_hash is None
+            and self._image
+            and "ERROR:" not in stderr
+            and dependency_cache.installed_only(stdout, PACKAGE_NAME)
         ):
-            # Update package name if pyproject.toml changed
-            pyproject_data = toml.loads(current_pyproject_content)
-            self._package_name = pyproject_data.get("project", {}).get("name")
-            if not self._package_name:
-                raise ValueError("Could not find package name in pyproject.toml")
-            logger.info("Installing %s in /controller", self._package_name)
-            result = await self.execute(
-                ["bash", "-c", "cd /controller && pip install -e . --break-system-packages"],
-                timeout=60,
+            dependency_cache.record_satisfied(self._image, deps_hash)
+        self._installed_deps_hash = deps_hash
+
+    async def _sync_controller_files(self, manifest: SourceManifest) -> None:
+        """
+        Bring /controller in the container in line with the given manifest of the source, by
+        uploading only the files that were added or modified since the last upload and
+        deleting the files that were removed.
+
+        Args:
+            manifest: The manifest of the source path to sync
+        """
+        if not self._source_path:
+            return
+
+        delta = manifest.diff(self._controller_manifest)
+        if self._controller_manifest is None:
+            await self.execute(["mkdir", "-p", "/controller"], timeout=5)
+
+        if delta.changed:
+            tar_bytes = files_to_tar_bytes(self._source_path, delta.changed)
+            logger.info(
+                "Uploading %d changed files (%d KB) to /controller",
+                len(delta.changed),
+                len(tar_bytes) // 1024,
+            )
+            await self.put_archive("/controller", tar_bytes)
+
+        if delta.deleted:
+            logger.info("Deleting %d removed files from /controller", len(delta.deleted))
+            await self.execute(
+                ["rm", "-f", "--", *(f"/controller/{rel_path}" for rel_path in delta.deleted)],
+                timeout=5,
             )
-            if result["stdout"]:
-                logger.info("STDOUT:\n%s", result["stdout"])
-            if result["stderr"]:
-                logger.warning("STDERR:\n%s", result["stderr"])
-            # Save current pyproject.toml content
-            self._last_pyproject_toml_str = current_pyproject_content
+
+        self._controller_manifest = manifest
 
     @abc.abstractmethod
     async def execute(
@@ -254,6 +357,46 @@ class DockerClient(Client):
             ExecuteResult: The result of the command
         """
 
+    async def _start_invoke_worker(self) -> InvokeWorker | None:
+        """
+        Start a persistent invoke worker in the environment.
+
+        Environments that cannot attach to a process's stdin return None,
+        in which case every invoke runs a one-shot `python3 -c` template.
+
+        Returns:
+            InvokeWorker | None: The started worker, or None if not supported
+        """
+        return None
+
+    async def _get_invoke_worker(self) -> InvokeWorker | None:
+        """
+        Get the running invoke worker, starting one if needed.
+        If the worker cannot be started, fall back to the template path for good.
+        """
+        if self._invoke_worker_disabled:
+            return None
+        if self._invoke_worker is not None and not self._invoke_worker.closed:
+            return self._invoke_worker
+
+        try:
+            self._invoke_worker = await self._start_invoke_worker()
+        except InvokeWorkerError as e:
+            logger.warning("Could not start invoke worker, falling back to one-shot invoke: %s", e)
+            self._invoke_worker = None
+
+        if self._invoke_worker is None:
+            self._invoke_worker_disabled = True
+        return self._invoke_worker
+
+    async def _close_invoke_worker(self) -> None:
+        """
+        Close the invoke worker, if one is running. The next invoke starts a new one.
+        """
+        if self._invoke_worker is not None:
+            await self._invoke_worker.close()
+            self._invoke_worker = None
+
     async def invoke(self, config: FunctionConfig) -> tuple[Any, bytes, bytes]:
         """
         Invoke a function in the environment. Supported by all environments.
@@ -269,27 +412,26 @@ class DockerClient(Client):
             logger.info("Environment needs update, updating")
             await self.update()
 
-        # generate a random uuid as a divider
-        divider = str(uuid.uuid4())
+        worker = await self._get_invoke_worker()
+        if worker is not None:
+            # a worker that dies mid-call is not retried here since the function may have
+            # already run; the next invoke starts a fresh worker
+            return await worker.invoke(config)
 
-        template = invoke_template(config, PACKAGE_NAME, divider)
+        template = invoke_template(config, PACKAGE_NAME)
         logger.debug("Invoking template: %s", template)
 
         result = await self.execute(["python3", "-c", template])
 
         # parse the result
-        # we take the whole stderr as the stderr, and the stdout is the result pre-divider
+        # we take the whole stderr as the stderr, and the stdout is everything before the frame
         stderr = result["stderr"]
-        stdout_parts = result["stdout"].split(divider.encode())
-        stdout = stdout_parts[0]
-
-        # parse the json part of the stdout (if it exists)
-        if len(stdout_parts) > 1:
-            result = json.loads(stdout_parts[1])
-        else:
-            raise InvokeError(stdout, stderr)
+        parsed = split_trailing_frame(result["stdout"])
+        if parsed is None:
+            raise InvokeError(result["stdout"], stderr)
+        stdout, invoke_result = parsed
 
-        return result, stdout, stderr
+        return invoke_result, stdout, stderr
 
     @abc.abstractmethod
     async def get_archive(self, path: str) -> bytes:
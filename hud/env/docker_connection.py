@@ -0,0 +1,142 @@
+"""
+A shared connection to the local Docker daemon.
+
+Every local docker client, image build and container pool on an event loop shares one
+`aiodocker.Docker` connection instead of opening its own. The connection is reference
+counted: take a reference with `acquire_docker` and give it back with `release_docker`, and the
+connection is closed when the last reference is released. Connections to a unix socket use a
+bounded connector so that many concurrent environments cannot exhaust the daemon's sockets.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+from typing import TYPE_CHECKING, Any
+
+import aiodocker
+import aiohttp
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+logger = logging.getLogger("hud.env.docker_connection")
+
+# Maximum number of concurrent HTTP connections to the Docker daemon per event loop.
+MAX_CONNECTIONS = 32
+
+
+class _SharedDocker:
+    def __init__(self) -> None:
+        # set by connect
+        self.docker: aiodocker.Docker
+        self.session: aiohttp.ClientSession | None = None
+        self.refs = 0
+        self.requests = 0
+
+    async def _on_request_start(self, *_: Any) -> None:
+        self.requests += 1
+
+    async def connect(self) -> None:
+        """Open a connection to the Docker daemon, bounding the connector for unix sockets."""
+        docker = aiodocker.Docker()
+        if not isinstance(docker.connector, aiohttp.UnixConnector):
+            # other daemons keep aiodocker's own connector, which handles TLS and ssh
+            self.docker = docker
+            return
+
+        # aiodocker does not expose the connection limit, so reconnect with our own session
+        socket_path = docker.connector.path
+        await docker.close()
+        connector = aiohttp.UnixConnector(path=socket_path, limit=MAX_CONNECTIONS)
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        self.session = aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+        # the connector decides where requests go, the url only names the host in them
+        self.docker = aiodocker.Docker(
+            url="unix://localhost", connector=connector, session=self.session
+        )
+
+    async def close(self) -> None:
+        await self.docker.close()
+        if self.session is not None:
+            await self.session.close()
+
+
+_CONNECTIONS: dict[asyncio.AbstractEventLoop, _SharedDocker] = {}
+
+
+async def acquire_docker() -> aiodocker.Docker:
+    """
+    Take a reference on the shared Docker connection of the running event loop, opening the
+    connection if needed.
+
+    Returns:
+        aiodocker.Docker: The shared connection, which must be given back with `release_docker`
+    """
+    loop = asyncio.get_running_loop()
+    shared = _CONNECTIONS.get(loop)
+    if shared is None:
+        shared = _SharedDocker()
+        await shared.connect()
+        existing = _CONNECTIONS.get(loop)
+        if existing is None:
+            _CONNECTIONS[loop] = shared
+        else:
+            # another task connected while we were connecting
+            await shared.close()
+            shared = existing
+    shared.refs += 1
+    return shared.docker
+
+
+async def release_docker(docker: aiodocker.Docker) -> None:
+    """
+    Give back a reference on the shared Docker connection, closing it after the last one.
+
+    Args:
+        docker: The connection returned by `acquire_docker`
+    """
+    loop = asyncio.get_running_loop()
+    shared = _CONNECTIONS.get(loop)
+    if shared is None or shared.docker is not docker:
+        # not the current shared connection, so nobody else is using it
+        await docker.close()
+        return
+
+    shared.refs -= 1
+    if shared.refs > 0:
+        return
+    # forget the connection before closing it, so a concurrent acquire opens a new one
+    del _CONNECTIONS[loop]
+    await shared.close()
+
+
+@contextlib.asynccontextmanager
+async def shared_docker() -> AsyncIterator[aiodocker.Docker]:
+    """
+    Use the shared Docker connection for the duration of a block.
+
+    Yields:
+        aiodocker.Docker: The shared connection
+    """
+    docker = await acquire_docker()
+    try:
+        yield docker
+    finally:
+        await release_docker(docker)
+
+
+def connection_stats() -> dict[str, int]:
+    """
+    Get the usage of the shared Docker connection of the running event loop.
+    Requests are only counted on unix socket connections.
+
+    Returns:
+        dict[str, int]: The number of references held and API requests made
+    """
+    shared = _CONNECTIONS.get(asyncio.get_running_loop())
+    if shared is None:
+        return {"refs": 0, "requests": 0}
+    return {"refs": shared.refs, "requests": shared.requests}
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import base64
 import logging
 from typing import TYPE_CHECKING, Any
 
@@ -155,7 +156,12 @@ class Environment(BaseModel):
         if stderr:
             logger.warning("Step produced stderr: %s", stderr.decode())
 
-        observation = Observation.model_validate(result["observation"], strict=True)
+        observation_data = result["observation"]
+        # controllers may send the screenshot as raw png bytes over a binary frame
+        screenshot = observation_data.get("screenshot")
+        if isinstance(screenshot, bytes):
+            observation_data["screenshot"] = base64.b64encode(screenshot).decode()
+        observation = Observation.model_validate(observation_data, strict=True)
 
         return observation, 0, False, {}
 
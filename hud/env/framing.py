@@ -0,0 +1,161 @@
+"""
+Framing for invoke results passed between the SDK and the controller inside a container.
+
+A frame is a fixed header (magic, version, encoding, body length) followed by the body.
+JSON frames carry a plain JSON document. Binary frames carry a JSON document followed by
+raw attachments, so a controller can opt in to sending e.g. PNG screenshots as `bytes`
+without base64 encoding them. Any `bytes` value in a result is sent as an attachment and
+comes back as `bytes` on the client side.
+
+When a frame is appended to output that may contain other text (the one-shot invoke
+template), it is followed by a trailer holding the frame length so it can be located from
+the end of the buffer without scanning.
+
+This module only uses the standard library: its source is shipped into the container and
+run there as part of the invoke programs.
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any
+
+FRAME_MAGIC = b"HUDF"
+TRAILER_MAGIC = b"HUDE"
+FRAME_VERSION = 1
+
+ENCODING_JSON = 0
+ENCODING_BINARY = 1
+
+# magic, version, encoding, (2 pad bytes), body length
+FRAME_HEADER = struct.Struct(">4sBBxxI")
+# frame length, magic
+FRAME_TRAILER = struct.Struct(">I4s")
+# length of the JSON document at the start of a binary body
+_DOC_LENGTH = struct.Struct(">I")
+
+_BYTES_KEY = "__hud_bytes__"
+
+
+class FrameError(Exception):
+    """
+    Error raised when a frame is malformed.
+    """
+
+
+def encode_frame(obj: Any, *, trailer: bool = False) -> bytes:
+    """
+    Encode an object as a frame.
+
+    Args:
+        obj: A JSON serializable object, which may also contain `bytes` values
+        trailer: Whether to append a trailer so the frame can be found from the end of a buffer
+
+    Returns:
+        bytes: The encoded frame
+    """
+    attachments: list[bytes] = []
+    attachments_size = 0
+
+    def attach(value: Any) -> Any:
+        nonlocal attachments_size
+        # a tuple rather than a union, the container may run an older python
+        if isinstance(value, (bytes, bytearray, memoryview)):  # noqa: UP038
+            data = bytes(value)
+            attachments.append(data)
+            ref = {_BYTES_KEY: [attachments_size, len(data)]}
+            attachments_size += len(data)
+            return ref
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    doc = json.dumps(obj, default=attach).encode()
+    if attachments:
+        encoding = ENCODING_BINARY
+        body = b"".join([_DOC_LENGTH.pack(len(doc)), doc, *attachments])
+    else:
+        encoding = ENCODING_JSON
+        body = doc
+
+    frame = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, encoding, len(body)) + body
+    if trailer:
+        frame += FRAME_TRAILER.pack(len(frame), TRAILER_MAGIC)
+    return frame
+
+
+def frame_length(buffer: bytes | bytearray | memoryview) -> int | None:
+    """
+    Get the total length of the frame at the start of a buffer.
+
+    Args:
+        buffer: A buffer starting with a frame header
+
+    Returns:
+        int | None: The length of header and body, or None if the header is incomplete
+    """
+    if len(buffer) < FRAME_HEADER.size:
+        return None
+    magic, _, _, length = FRAME_HEADER.unpack_from(buffer)
+    if magic != FRAME_MAGIC:
+        raise FrameError(f"Bad frame magic: {bytes(magic)!r}")
+    return FRAME_HEADER.size + length
+
+
+def decode_frame(frame: memoryview) -> Any:
+    """
+    Decode a frame. Attachments are copied out of the frame exactly once.
+
+    Args:
+        frame: A view over exactly one frame
+
+    Returns:
+        Any: The decoded object, with attachments restored as `bytes`
+    """
+    magic, version, encoding, length = FRAME_HEADER.unpack_from(frame)
+    if magic != FRAME_MAGIC:
+        raise FrameError(f"Bad frame magic: {bytes(magic)!r}")
+    if version != FRAME_VERSION:
+        raise FrameError(f"Unsupported frame version: {version}")
+    body = frame[FRAME_HEADER.size : FRAME_HEADER.size + length]
+    if len(body) != length:
+        raise FrameError(f"Truncated frame: expected {length} bytes, got {len(body)}")
+
+    if encoding == ENCODING_JSON:
+        return json.loads(bytes(body))
+    if encoding != ENCODING_BINARY:
+        raise FrameError(f"Unsupported frame encoding: {encoding}")
+
+    (doc_length,) = _DOC_LENGTH.unpack_from(body)
+    doc_end = _DOC_LENGTH.size + doc_length
+    attachments = body[doc_end:]
+
+    def restore(value: dict[str, Any]) -> Any:
+        ref = value.get(_BYTES_KEY)
+        if ref is not None and len(value) == 1:
+            offset, size = ref
+            return bytes(attachments[offset : offset + size])
+        return value
+
+    return json.loads(bytes(body[_DOC_LENGTH.size : doc_end]), object_hook=restore)
+
+
+def split_trailing_frame(output: bytes) -> tuple[bytes, Any] | None:
+    """
+    Split a buffer that ends in a frame with a trailer into the preceding output and the
+    decoded frame.
+
+    Args:
+        output: The buffer, e.g. the stdout of an invoke template
+
+    Returns:
+        tuple[bytes, Any] | None: The output before the frame and the decoded object,
+            or None if the buffer does not end in a frame
+    """
+    if len(output) < FRAME_TRAILER.size:
+        return None
+    view = memoryview(output)
+    length, magic = FRAME_TRAILER.unpack_from(view, len(view) - FRAME_TRAILER.size)
+    start = len(view) - FRAME_TRAILER.size - length
+    if magic != TRAILER_MAGIC or start < 0:
+        return None
+    return output[:start], decode_frame(view[start : start + length])
@@ -0,0 +1,245 @@
+"""
+A persistent invoke channel to a remote environment.
+
+Instead of one `POST /invoke` per call, a remote client can open a WebSocket to its
+environment and send every invoke over it. Requests and responses are frames from
+`hud.env.framing`, sent as binary messages and tagged with a request id, so several invokes
+can be in flight at once and their results come back in whatever order they finish. stdout
+and stderr travel as raw attachments instead of base64.
+
+If the connection drops, the next invoke reconnects. An invoke that was already sent when
+the connection dropped is not resent, since the function may have run; it fails with
+`HudNetworkError` just like a POST that lost its connection.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import random
+from typing import TYPE_CHECKING, Any
+
+import aiohttp
+
+from hud.env import framing
+from hud.exceptions import HudNetworkError, HudRequestError
+from hud.server.rate_limit import INVOKE, RATE_LIMITER
+
+if TYPE_CHECKING:
+    from hud.utils.config import FunctionConfig
+
+logger = logging.getLogger("hud.env.invoke_channel")
+
+# Seconds to wait for the WebSocket handshake.
+CONNECT_TIMEOUT = 10.0
+# Seconds between pings, so idle channels are kept open and dead ones are noticed.
+HEARTBEAT = 30.0
+# Connection attempts made before giving up on the channel.
+CONNECT_ATTEMPTS = 3
+
+
+class InvokeChannelError(Exception):
+    """
+    Error raised when the invoke channel cannot be connected. The request was not sent.
+    """
+
+
+def channel_url(base_url: str, env_id: str) -> str:
+    """
+    Get the WebSocket URL of the invoke channel of an environment.
+
+    Args:
+        base_url: The base URL of the HUD API
+        env_id: The ID of the environment
+
+    Returns:
+        str: The ws:// or wss:// URL of the channel
+    """
+    if base_url.startswith("https://"):
+        base_url = "wss://" + base_url.removeprefix("https://")
+    elif base_url.startswith("http://"):
+        base_url = "ws://" + base_url.removeprefix("http://")
+    return f"{base_url}/v2/environments/{env_id}/invoke_channel"
+
+
+class _Connection:
+    def __init__(self, ws: aiohttp.ClientWebSocketResponse[bool]) -> None:
+        self.ws = ws
+        # calls sent on this connection and waiting for a response, by request id
+        self.pending: dict[int, asyncio.Future[Any]] = {}
+        # set by InvokeChannel._connect
+        self.reader: asyncio.Task[None]
+
+    @property
+    def closed(self) -> bool:
+        return self.ws.closed or self.reader.done()
+
+
+class InvokeChannel:
+    """
+    A multiplexed WebSocket channel for invoking functions in a remote environment.
+    """
+
+    def __init__(self, url: str, api_key: str) -> None:
+        """
+        Initialize the InvokeChannel. Call `connect` to open it.
+
+        Args:
+            url: The WebSocket URL of the channel, see `channel_url`
+            api_key: API key for authentication
+        """
+        self._url = url
+        self._api_key = api_key
+        self._session: aiohttp.ClientSession | None = None
+        self._connection: _Connection | None = None
+        self._connect_lock = asyncio.Lock()
+        self._next_id = 0
+        self._closed = False
+
+    @classmethod
+    async def connect(cls, url: str, api_key: str) -> InvokeChannel:
+        """
+        Open an invoke channel.
+
+        Args:
+            url: The WebSocket URL of the channel, see `channel_url`
+            api_key: API key for authentication
+
+        Returns:
+            InvokeChannel: The connected channel
+
+        Raises:
+            InvokeChannelError: If the channel could not be connected
+        """
+        channel = cls(url, api_key)
+        try:
+            await channel._get_connection()
+        except InvokeChannelError:
+            await channel.close()
+            raise
+        return channel
+
+    @property
+    def closed(self) -> bool:
+        """Whether the channel has been closed."""
+        return self._closed
+
+    async def _get_connection(self) -> _Connection:
+        """Get the open connection, reconnecting if it was lost."""
+        async with self._connect_lock:
+            if self._closed:
+                raise InvokeChannelError("Invoke channel is closed")
+            if self._connection is not None and not self._connection.closed:
+                return self._connection
+
+            if self._session is None:
+                self._session = aiohttp.ClientSession(
+                    timeout=aiohttp.ClientTimeout(total=None, connect=CONNECT_TIMEOUT)
+                )
+
+            error: Exception | None = None
+            for attempt in range(1, CONNECT_ATTEMPTS + 1):
+                try:
+                    ws = await self._session.ws_connect(
+                        self._url,
+                        headers={"Authorization": f"Bearer {self._api_key}"},
+                        heartbeat=HEARTBEAT,
+                        max_msg_size=0,
+                    )
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = e
+                    if isinstance(e, aiohttp.WSServerHandshakeError) and e.status < 500:
+                        # the server does not offer the channel, trying again will not help
+                        break
+                    if attempt < CONNECT_ATTEMPTS:
+                        await asyncio.sleep(random.uniform(0, 2 ** (attempt - 1)))  # noqa: S311
+                    continue
+
+                connection = _Connection(ws)
+                connection.reader = asyncio.create_task(self._read(connection))
+                self._connection = connection
+                return connection
+
+            raise InvokeChannelError(f"Could not connect invoke channel: {error}")
+
+    async def _read(self, connection: _Connection) -> None:
+        """Dispatch responses to their callers until the connection closes."""
+        reason = "connection closed"
+        try:
+            async for message in connection.ws:
+                if message.type == aiohttp.WSMsgType.BINARY:
+                    response = framing.decode_frame(memoryview(message.data))
+                    future = connection.pending.pop(response.get("id"), None)
+                    if future is not None and not future.done():
+                        future.set_result(response)
+                elif message.type == aiohttp.WSMsgType.ERROR:
+                    reason = f"connection error: {connection.ws.exception()}"
+                    break
+        except Exception as e:
+            reason = f"bad message: {e}"
+            logger.warning("Invoke channel failed, %s", reason)
+        finally:
+            await connection.ws.close()
+            for future in connection.pending.values():
+                if not future.done():
+                    future.set_exception(HudNetworkError(f"Invoke channel lost: {reason}"))
+            connection.pending.clear()
+
+    async def invoke(self, config: FunctionConfig) -> tuple[Any, bytes, bytes]:
+        """
+        Invoke a function over the channel.
+
+        Args:
+            config: The configuration to invoke
+
+        Returns:
+            tuple[Any, bytes, bytes]: The result of the invocation, stdout, and stderr
+
+        Raises:
+            InvokeChannelError: If the channel could not be connected, so the call was not sent
+            HudNetworkError: If the connection was lost after the call was sent
+            HudRequestError: If the server reported an error for the call
+        """
+        await RATE_LIMITER.acquire(INVOKE)
+        connection = await self._get_connection()
+
+        self._next_id += 1
+        request_id = self._next_id
+        future: asyncio.Future[Any] = asyncio.get_running_loop().create_future()
+        connection.pending[request_id] = future
+        request = framing.encode_frame(
+            {"id": request_id, "function": config.function, "args": config.args}
+        )
+        try:
+            await connection.ws.send_bytes(request)
+        except (aiohttp.ClientError, ConnectionError) as e:
+            connection.pending.pop(request_id, None)
+            raise HudNetworkError(f"Invoke channel lost: {e}") from e
+
+        try:
+            response = await future
+        finally:
+            connection.pending.pop(request_id, None)
+
+        if "error" in response:
+            raise HudRequestError(
+                f"Request failed: {response['error']}", status_code=response.get("status")
+            )
+        return response["result"], response.get("stdout", b""), response.get("stderr", b"")
+
+    async def close(self) -> None:
+        """
+        Close the channel. Calls still waiting for a response fail with `HudNetworkError`.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        connection = self._connection
+        self._connection = None
+        if connection is not None:
+            await connection.ws.close()
+            with contextlib.suppress(Exception):
+                await connection.reader
+        if self._session is not None:
+            await self._session.close()
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+from typing import TYPE_CHECKING, Any, Protocol
+
+from hud.env import framing
+
+if TYPE_CHECKING:
+    from aiodocker.stream import Message
+
+    from hud.utils.config import FunctionConfig
+
+logger = logging.getLogger("hud.env.invoke_worker")
+
+# Source of the framing module, prepended to the programs that run inside the container.
+FRAMING_SOURCE = inspect.getsource(framing)
+
+# Seconds to wait for the worker to import the controller and report that it is ready.
+WORKER_START_TIMEOUT = 60.0
+
+# The worker program that runs inside the container. It is passed to `python3 -c` with the
+# controller package name as its only argument, imports the package once, and then serves
+# framed invoke requests from stdin until stdin is closed. Requests and responses use the
+# frames from `hud.env.framing`, whose source is prepended to this program.
+_WORKER_MAIN = """
+import contextlib
+import importlib
+import io
+import os
+import sys
+import traceback
+
+package_name = sys.argv[1]
+
+# keep a private handle on the real stdout for frames, and point fd 1 at stderr so that
+# stray writes (native code, subprocesses) cannot corrupt the protocol stream
+proto_out = os.fdopen(os.dup(1), "wb")
+os.dup2(2, 1)
+sys.stdout = sys.stderr
+proto_in = sys.stdin.buffer
+
+
+def read_exact(size):
+    data = b""
+    while len(data) < size:
+        chunk = proto_in.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def read_frame():
+    header = read_exact(FRAME_HEADER.size)
+    if header is None:
+        return None
+    rest = read_exact(frame_length(header) - len(header))
+    if rest is None:
+        return None
+    return decode_frame(memoryview(header + rest))
+
+
+def write_frame(obj):
+    proto_out.write(encode_frame(obj))
+    proto_out.flush()
+
+
+try:
+    importlib.import_module(package_name)
+except Exception:
+    write_frame({"ready": False, "error": traceback.format_exc()})
+    sys.exit(1)
+write_frame({"ready": True})
+
+while True:
+    request = read_frame()
+    if request is None:
+        break
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    try:
+        parts = request["function"].split(".")
+        module = importlib.import_module(".".join([package_name, *parts[:-1]]))
+        func = getattr(module, parts[-1])
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            result = func(*request["args"])
+        # encode inside the try so an unserializable result is reported as an error
+        frame = encode_frame(
+            {
+                "result": result,
+                "stdout": stdout.getvalue().encode(),
+                "stderr": stderr.getvalue().encode(),
+            }
+        )
+    except Exception:
+        frame = encode_frame(
+            {
+                "error": traceback.format_exc(),
+                "stdout": stdout.getvalue().encode(),
+                "stderr": stderr.getvalue().encode(),
+            }
+        )
+    proto_out.write(frame)
+    proto_out.flush()
+"""
+
+WORKER_SOURCE = FRAMING_SOURCE + _WORKER_MAIN
+
+
+class InvokeWorkerError(Exception):
+    """
+    Error raised when the invoke worker cannot be started or stops responding.
+    """
+
+
+class WorkerStream(Protocol):
+    """
+    The subset of an aiodocker exec stream used by the invoke worker.
+    """
+
+    async def read_out(self) -> Message | None: ...
+
+    async def write_in(self, data: bytes) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class InvokeWorker:
+    """
+    Client-side handle on a long-lived invoke worker running inside a container.
+
+    The worker imports the controller package once, so each invoke is a single request/response
+    round trip over the exec stream instead of a fresh `python3 -c` process.
+    """
+
+    def __init__(self, stream: WorkerStream) -> None:
+        self._stream = stream
+        self._stdout = bytearray()
+        self._stderr = bytearray()
+        self._lock = asyncio.Lock()
+        self._closed = False
+
+    @classmethod
+    async def start(
+        cls, stream: WorkerStream, timeout: float = WORKER_START_TIMEOUT
+    ) -> InvokeWorker:
+        """
+        Wait for a freshly started worker to report that the controller was imported.
+
+        Args:
+            stream: The attached stdin/stdout stream of the worker process
+            timeout: Seconds to wait for the worker to become ready
+
+        Returns:
+            InvokeWorker: A worker that is ready to serve invoke requests
+
+        Raises:
+            InvokeWorkerError: If the worker could not import the controller in time
+        """
+        worker = cls(stream)
+        try:
+            ready = await asyncio.wait_for(worker._read_frame(), timeout)
+        except (asyncio.TimeoutError, InvokeWorkerError) as e:
+            await worker.close()
+            raise InvokeWorkerError(f"Invoke worker failed to start: {e}") from e
+
+        if not ready.get("ready"):
+            await worker.close()
+            raise InvokeWorkerError(f"Invoke worker failed to start:\n{ready.get('error')}")
+        return worker
+
+    @property
+    def closed(self) -> bool:
+        """Whether the worker has been closed."""
+        return self._closed
+
+    async def _read_frame(self) -> Any:
+        """Read the next frame from the worker, buffering partial stream messages."""
+        while True:
+            try:
+                end = framing.frame_length(self._stdout)
+            except framing.FrameError as e:
+                raise InvokeWorkerError(f"Invoke worker sent a bad frame: {e}") from e
+            if end is not None and len(self._stdout) >= end:
+                # decode straight from the receive buffer, and release the view before
+                # the buffer is resized
+                with memoryview(self._stdout) as view:
+                    obj = framing.decode_frame(view[:end])
+                del self._stdout[:end]
+                return obj
+
+            message = await self._stream.read_out()
+            if message is None:
+                raise InvokeWorkerError("Invoke worker exited unexpectedly")
+            if message.stream == 1:
+                self._stdout.extend(message.data)
+            else:
+                self._stderr.extend(message.data)
+
+    async def invoke(self, config: FunctionConfig) -> tuple[Any, bytes, bytes]:
+        """
+        Invoke a function through the worker.
+
+        Args:
+            config: The configuration to invoke
+
+        Returns:
+            tuple[Any, bytes, bytes]: The result of the invocation, stdout, and stderr
+
+        Raises:
+            InvokeWorkerError: If the worker stopped responding
+            InvokeError: If the invoked function raised
+        """
+        from hud.env.docker_client import InvokeError
+
+        async with self._lock:
+            if self._closed:
+                raise InvokeWorkerError("Invoke worker is closed")
+
+            request = framing.encode_frame({"function": config.function, "args": config.args})
+            self._stderr.clear()
+            try:
+                await self._stream.write_in(request)
+                response = await self._read_frame()
+            except Exception as e:
+                await self.close()
+                if isinstance(e, InvokeWorkerError):
+                    raise
+                raise InvokeWorkerError(f"Invoke worker stream failed: {e}") from e
+
+            stdout = response["stdout"]
+            # anything the worker wrote to the raw stderr stream belongs to this call too
+            stderr = response["stderr"] + bytes(self._stderr)
+            self._stderr.clear()
+
+        if "error" in response:
+            raise InvokeError(stdout, stderr + response["error"].encode())
+
+        return response["result"], stdout, stderr
+
+    async def close(self) -> None:
+        """
+        Close the worker. Closing its stdin makes the worker process exit.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._stream.close()
+        except Exception as e:
+            logger.debug("Error closing invoke worker stream: %s", e)
@@ -1,17 +1,25 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import io
 import logging
+import tempfile
 import textwrap
 import uuid
-from typing import TYPE_CHECKING, Any
+from typing import IO, TYPE_CHECKING, Any
 
 import aiodocker
-from aiohttp import ClientTimeout
+from aiohttp import ClientError, ClientTimeout
 
-from hud.env.docker_client import DockerClient, EnvironmentStatus
+from hud.env import container_pool
+from hud.env.container_pool import RECYCLE_FUNCTION, ContainerPool, PoolConfig, PooledContainer
+from hud.env.docker_client import PACKAGE_NAME, DockerClient, EnvironmentStatus
+from hud.env.docker_connection import acquire_docker, release_docker, shared_docker
+from hud.env.invoke_worker import WORKER_SOURCE, InvokeWorker, InvokeWorkerError
 from hud.utils import ExecuteResult
-from hud.utils.common import directory_to_tar_bytes
+from hud.utils.archive import context_paths, iter_tar
+from hud.utils.config import FunctionConfig
 
 if TYPE_CHECKING:
     from pathlib import Path
@@ -21,6 +29,30 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# Archives up to this size are kept in memory before they are sent to the daemon, larger ones
+# are spooled to a temporary file.
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+
+def _spool_tar(build_context: Path, paths: list[str]) -> IO[bytes]:
+    """Write the tar archive of a build context to a spooled temporary file."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)  # noqa: SIM115
+    try:
+        for chunk in iter_tar(build_context, paths):
+            spool.write(chunk)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+def _is_transient_docker_error(error: Exception) -> bool:
+    """Whether an error of the Docker API may go away if the call is made again."""
+    if isinstance(error, aiodocker.DockerError):
+        return error.status >= 500
+    return isinstance(error, ClientError | OSError | asyncio.TimeoutError)
+
 
 class LocalDockerClient(DockerClient):
     """
@@ -35,22 +67,24 @@ class LocalDockerClient(DockerClient):
         # Create a unique image tag
         image_tag = f"hud-env-{uuid.uuid4().hex[:8]}"
 
-        # Initialize Docker client
-        docker_client = aiodocker.Docker()
+        # List the build context, leaving out files excluded by .dockerignore
+        paths = context_paths(build_context)
+        logger.info("archiving %d entries of build context %s", len(paths), build_context)
 
-        # Create a tar file from the path
-        tar_bytes = directory_to_tar_bytes(build_context)
-        logger.info("generated tar file with size: %d KB", len(tar_bytes)//1024)
+        # aiodocker reads the archive synchronously, so write it off the event loop first
+        archive = await asyncio.to_thread(_spool_tar, build_context, paths)
 
         # Build the image
-        build_stream = await docker_client.images.build(
-            fileobj=io.BytesIO(tar_bytes),
-            encoding="gzip",
-            tag=image_tag,
-            rm=True,
-            pull=True,
-            forcerm=True,
-        )
+        with archive:
+            async with shared_docker() as docker_client:
+                build_stream = await docker_client.images.build(
+                    fileobj=archive,
+                    encoding="gzip",
+                    tag=image_tag,
+                    rm=True,
+                    pull=True,
+                    forcerm=True,
+                )
 
         # Print build output
         output = ""
@@ -61,10 +95,30 @@ class LocalDockerClient(DockerClient):
 
         return image_tag, {"build_output": output}
 
+    @classmethod
+    async def image_exists(cls, image: str) -> bool:
+        """
+        Check if an image exists in the local Docker daemon.
+
+        Args:
+            image: The image tag or ID
+
+        Returns:
+            bool: True if the image exists
+        """
+        async with shared_docker() as docker_client:
+            try:
+                await docker_client.images.inspect(image)
+            except aiodocker.DockerError as e:
+                if e.status == 404:
+                    return False
+                raise
+        return True
 
     @classmethod
     async def create(
-        cls, image: str,
+        cls,
+        image: str,
     ) -> LocalDockerClient:
         """
         Creates a Docker environment client from a image.
@@ -75,11 +129,45 @@ class LocalDockerClient(DockerClient):
         Returns:
             DockerClient: An instance of the Docker environment client
         """
-       
-        # Initialize Docker client
-        docker_client = aiodocker.Docker()
 
-        # Create and start the container
+        # Take a reference on the shared Docker connection
+        docker_client = await acquire_docker()
+
+        pool = container_pool.get_container_pool(image, functools.partial(cls._make_pool, image))
+        if pool is not None:
+            try:
+                pooled = await pool.acquire()
+            except BaseException:
+                await release_docker(docker_client)
+                raise
+            client = cls(docker_client, pooled.container_id)
+            client._image = image
+            client._pool = pool
+            client._pooled = pooled
+            # the container keeps its synced controller across recycling
+            client._controller_manifest = pooled.state.get("controller_manifest")
+            client._installed_deps_hash = pooled.state.get("installed_deps_hash")
+            return client
+
+        try:
+            container_id = await cls._create_container(docker_client, image)
+        except BaseException:
+            await release_docker(docker_client)
+            raise
+
+        # Return the controller instance
+        client = cls(docker_client, container_id)
+        client._image = image
+        return client
+
+    @staticmethod
+    async def _create_container(docker_client: aiodocker.Docker, image: str) -> str:
+        """
+        Create and start a container from an image.
+
+        Returns:
+            str: The ID of the started container
+        """
         container_config = {
             "Image": image,
             "Tty": True,
@@ -92,26 +180,58 @@ class LocalDockerClient(DockerClient):
 
         container = await docker_client.containers.create(config=container_config)
         await container.start()
+        return container.id
 
-        # Return the controller instance
-        return cls(docker_client, container.id)
+    @classmethod
+    async def _create_pooled_container(cls, image: str) -> str:
+        """
+        Create and start a container for a pool, using the shared Docker connection.
+        """
+        async with shared_docker() as docker_client:
+            return await cls._create_container(docker_client, image)
+
+    @staticmethod
+    async def _destroy_container(container_id: str) -> None:
+        """
+        Stop and remove a container, using the shared Docker connection.
+        """
+        async with shared_docker() as docker_client:
+            container = docker_client.containers.container(container_id)
+            await container.stop()
+            await container.delete()
+
+    @classmethod
+    def _make_pool(cls, image: str, config: PoolConfig) -> ContainerPool:
+        """
+        Create a container pool for an image. The pool uses the shared Docker connection
+        while it creates or destroys containers.
+        """
+        return ContainerPool(
+            config,
+            create=functools.partial(cls._create_pooled_container, image),
+            destroy=cls._destroy_container,
+        )
 
     def __init__(self, docker_conn: aiodocker.Docker, container_id: str) -> None:
         """
         Initialize the DockerClient.
 
         Args:
-            docker_conn: Docker client connection
+            docker_conn: Docker client connection, released when the client is closed
             container_id: ID of the Docker container to control
         """
         super().__init__()
 
-        # Store container ID instead of container object
         self._container_id = container_id
+        self._container = None
 
-        # Docker client will be initialized when needed
         self._docker = docker_conn
 
+    _container: DockerContainer | None = None
+    _pool: ContainerPool | None = None
+    _pooled: PooledContainer | None = None
+    _closed: bool = False
+
     @property
     def container_id(self) -> str:
         """Get the container ID."""
@@ -121,10 +241,18 @@ class LocalDockerClient(DockerClient):
     def container_id(self, value: str) -> None:
         """Set the container ID."""
         self._container_id = value
+        self._container = None
 
     async def _get_container(self) -> DockerContainer:
-        """Get the container object from aiodocker."""
-        return await self._docker.containers.get(self.container_id)
+        """
+        Get the container object from aiodocker.
+
+        The handle is built from the container ID once and reused, without a round trip to
+        the Docker API. Errors about a missing container surface from the calls made on it.
+        """
+        if self._container is None:
+            self._container = self._docker.containers.container(self.container_id)
+        return self._container
 
     async def get_status(self) -> EnvironmentStatus:
         """
@@ -134,27 +262,57 @@ class LocalDockerClient(DockerClient):
             EnvironmentStatus: The current status of the environment
         """
         try:
-            container = await self._get_container()
-            container_data = await container.show()
-
-            # Check the container state
-            state = container_data.get("State", {})
-            status = state.get("Status", "").lower()
-
-            if status == "running":
-                return EnvironmentStatus.RUNNING
-            elif status == "created" or status == "starting":
-                return EnvironmentStatus.INITIALIZING
-            elif status in ["exited", "dead", "removing", "paused"]:
-                return EnvironmentStatus.COMPLETED
-            else:
-                # Any other state is considered an error
-                return EnvironmentStatus.ERROR
-
+            return await self._fetch_status()
         except Exception:
             # If we can't connect to the container or there's any other error
             return EnvironmentStatus.ERROR
 
+    async def _fetch_status(self) -> EnvironmentStatus:
+        """Get the status of the container, raising if the Docker API cannot tell."""
+        container = await self._get_container()
+        container_data = await container.show()
+
+        # Check the container state
+        state = container_data.get("State", {})
+        status = state.get("Status", "").lower()
+
+        if status == "running":
+            return EnvironmentStatus.RUNNING
+        elif status == "created" or status == "starting":
+            return EnvironmentStatus.INITIALIZING
+        elif status in ["exited", "dead", "removing", "paused"]:
+            return EnvironmentStatus.COMPLETED
+        else:
+            # Any other state is considered an error
+            return EnvironmentStatus.ERROR
+
+    async def wait_until(
+        self, status: EnvironmentStatus, *, timeout: float | None = None
+    ) -> EnvironmentStatus:
+        """
+        Wait until the container reaches a status. Unlike `get_status`, errors of the Docker
+        API that may go away, such as a dropped connection or a 5xx, are retried, not
+        reported as `ERROR`.
+
+        Args:
+            status: The status to wait for, e.g. `EnvironmentStatus.RUNNING`
+            timeout: Seconds to wait at most, None to wait forever
+
+        Returns:
+            EnvironmentStatus: `status`, or the terminal status (`COMPLETED` or `ERROR`) the
+                environment reached instead
+
+        Raises:
+            HudTimeoutError: If the environment did not reach the status in time
+        """
+
+        async def poll(_: EnvironmentStatus, __: float) -> EnvironmentStatus:
+            return await self._fetch_status()
+
+        return await self._wait_until(
+            poll, status, timeout=timeout, is_transient=_is_transient_docker_error
+        )
+
     async def execute(
         self,
         command: list[str],
@@ -190,7 +348,6 @@ class LocalDockerClient(DockerClient):
             elif message.stream == 2:  # stderr
                 stderr_data.extend(message.data)
 
-
         if "No module named 'hud_controller'" in stderr_data.decode():
             if self._source_path is None:
                 message = textwrap.dedent("""\
@@ -216,6 +373,27 @@ class LocalDockerClient(DockerClient):
             exit_code=0,
         )
 
+    async def _start_invoke_worker(self) -> InvokeWorker | None:
+        """
+        Start a persistent invoke worker attached to an exec stream in the container.
+
+        Returns:
+            InvokeWorker: The started worker
+
+        Raises:
+            InvokeWorkerError: If the worker could not be started
+        """
+        container = await self._get_container()
+        try:
+            exec_result = await container.exec(
+                cmd=["python3", "-c", WORKER_SOURCE, PACKAGE_NAME],
+                stdin=True,
+            )
+            stream: Stream = exec_result.start(detach=False)
+        except aiodocker.DockerError as e:
+            raise InvokeWorkerError(f"Could not start invoke worker: {e}") from e
+        return await InvokeWorker.start(stream)
+
     async def get_archive(self, path: str) -> bytes:
         """
         Get an archive of a path from the container.
@@ -256,7 +434,25 @@ class LocalDockerClient(DockerClient):
     async def close(self) -> None:
         """
         Close the Docker environment by stopping and removing the container.
+        Pooled containers are recycled into their pool instead, if the controller allows it.
+        Closing a client again does nothing, since its container may belong to another client.
         """
+        if self._closed:
+            return
+        self._closed = True
+        if self._pool is not None and self._pooled is not None:
+            try:
+                reusable = await self._recycle()
+                await self._close_invoke_worker()
+                self._pooled.state["controller_manifest"] = self._controller_manifest
+                self._pooled.state["installed_deps_hash"] = self._installed_deps_hash
+                await self._pool.release(self._pooled, reusable=reusable)
+            finally:
+                self._pooled = None
+                await release_docker(self._docker)
+            return
+
+        await self._close_invoke_worker()
         try:
             container = await self._get_container()
             await container.stop()
@@ -265,4 +461,20 @@ class LocalDockerClient(DockerClient):
             # Log the error but don't raise it since this is cleanup
             logger.warning("Error during Docker container cleanup: %s", e)
         finally:
-            await self._docker.close()
+            await release_docker(self._docker)
+
+    async def _recycle(self) -> bool:
+        """
+        Ask the controller to reset the container so it can go back to the pool.
+
+        Returns:
+            bool: True if the controller's recycle hook reported success
+        """
+        if await self.get_status() != EnvironmentStatus.RUNNING:
+            return False
+        try:
+            result, _, _ = await self.invoke(FunctionConfig(function=RECYCLE_FUNCTION, args=[]))
+        except Exception as e:
+            logger.debug("Container %s not recycled: %s", self.container_id, e)
+            return False
+        return bool(result)
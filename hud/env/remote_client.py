@@ -1,12 +1,21 @@
 from __future__ import annotations
 
+import functools
 import logging
 from base64 import b64decode
 from typing import TYPE_CHECKING, Any
 
 from hud.env.client import Client
+from hud.env.invoke_channel import InvokeChannel, InvokeChannelError, channel_url
+from hud.env.status import fetch_remote_status
 from hud.exceptions import HudResponseError
-from hud.server import make_request
+from hud.server import (
+    INVOKE_CHANNEL,
+    STATUS_LONG_POLL,
+    make_request,
+    step_retry_policy,
+    supports,
+)
 from hud.settings import settings
 from hud.types import EnvironmentStatus
 from hud.utils import ExecuteResult
@@ -17,6 +26,37 @@ if TYPE_CHECKING:
 logger = logging.getLogger("hud.env.remote_env_client")
 
 
+async def create_environments(requests: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Create several remote environments with one request to the HUD API.
+    Only available when the server advertises `BATCH_CREATE`.
+
+    Args:
+        requests: One body per environment, as sent to `/v2/create_environment`
+
+    Returns:
+        list[dict[str, Any]]: The response for each request, in the same order. A response
+            with an "error" key means that environment could not be created.
+
+    Raises:
+        HudResponseError: If the server did not answer every request.
+    """
+    response = await make_request(
+        method="POST",
+        url=f"{settings.base_url}/v2/create_environments",
+        json={"environments": requests},
+        api_key=settings.api_key,
+    )
+    environments = response.get("environments")
+    if not isinstance(environments, list) or len(environments) != len(requests):
+        raise HudResponseError(
+            message="Failed to create remote environments: expected one response per "
+            "environment. Please contact support if this issue persists.",
+            response_json=response,
+        )
+    return environments
+
+
 class RemoteClient(Client):
     """
     Remote environment client implementation.
@@ -68,6 +108,26 @@ class RemoteClient(Client):
             api_key=settings.api_key,
         )
 
+        return cls.from_create_response(response, gym_id=gym_id)
+
+    @classmethod
+    def from_create_response(
+        cls, response: dict[str, Any], *, gym_id: str | None = None
+    ) -> tuple[RemoteClient, dict[str, Any]]:
+        """
+        Creates a remote environment client from the response to an environment creation.
+
+        Args:
+            response: The response for the environment, from `create_environment` or
+                `create_environments`
+            gym_id: The gym_id the environment was created from, for logging
+
+        Returns:
+            A tuple containing the remote environment client and the build metadata
+
+        Raises:
+            HudResponseError: If the response does not contain an environment ID.
+        """
         # Get the environment ID from the response
         env_id = response.get("id")
         if not env_id:
@@ -98,6 +158,8 @@ class RemoteClient(Client):
         """
         super().__init__()
         self._env_id = env_id
+        self._invoke_channel: InvokeChannel | None = None
+        self._invoke_channel_disabled = False
 
     @property
     def env_id(self) -> str:
@@ -112,31 +174,38 @@ class RemoteClient(Client):
             EnvironmentStatus: The current status of the environment
         """
         try:
-            response = await make_request(
-                method="GET",
-                url=f"{settings.base_url}/v2/environments/{self.env_id}/state",
-                api_key=settings.api_key,
-            )
-            logger.debug("Environment status response: %s", response)
-
-            status = response.get("state", "").lower()
-
-            if status == "running":
-                return EnvironmentStatus.RUNNING
-            elif status == "initializing" or status == "pending":
-                return EnvironmentStatus.INITIALIZING
-            elif status == "completed" or status == "terminated":
-                return EnvironmentStatus.COMPLETED
-            else:
-                # Any other status is considered an error
-                logger.warning("Abnormal environment status response: %s", response)
-                return EnvironmentStatus.ERROR
-
+            return await fetch_remote_status(self.env_id)
         except Exception:
             # If we can't connect to the API or there's any other error
             logger.info("(potentially transient) Error getting environment status")
             return EnvironmentStatus.ERROR
 
+    async def wait_until(
+        self, status: EnvironmentStatus, *, timeout: float | None = None
+    ) -> EnvironmentStatus:
+        """
+        Wait until the remote environment reaches a status, long-polling the HUD API when
+        it supports it. Unlike `get_status`, transient errors are retried, not reported as
+        `ERROR`.
+
+        Args:
+            status: The status to wait for, e.g. `EnvironmentStatus.RUNNING`
+            timeout: Seconds to wait at most, None to wait forever
+
+        Returns:
+            EnvironmentStatus: `status`, or the terminal status (`COMPLETED` or `ERROR`) the
+                environment reached instead
+
+        Raises:
+            HudTimeoutError: If the environment did not reach the status in time
+        """
+        return await self._wait_until(
+            functools.partial(fetch_remote_status, self.env_id),
+            status,
+            timeout=timeout,
+            long_poll=await supports(STATUS_LONG_POLL),
+        )
+
     async def execute(
         self,
         command: list[str],
@@ -164,6 +233,7 @@ class RemoteClient(Client):
                 "timeout": timeout,
             },
             api_key=settings.api_key,
+            retry_policy=step_retry_policy(),
         )
 
         return ExecuteResult(
@@ -172,15 +242,50 @@ class RemoteClient(Client):
             exit_code=data["exit_code"],
         )
 
+    async def _get_invoke_channel(self) -> InvokeChannel | None:
+        """
+        Get the invoke channel of the environment, connecting it if needed.
+        If the server does not offer a channel, fall back to POST requests for good.
+        """
+        if self._invoke_channel_disabled:
+            return None
+        if self._invoke_channel is not None and not self._invoke_channel.closed:
+            return self._invoke_channel
+
+        if not await supports(INVOKE_CHANNEL) or not settings.api_key:
+            self._invoke_channel_disabled = True
+            return None
+        try:
+            self._invoke_channel = await InvokeChannel.connect(
+                channel_url(settings.base_url, self.env_id), settings.api_key
+            )
+        except InvokeChannelError as e:
+            logger.warning("Could not open invoke channel, falling back to POST: %s", e)
+            self._invoke_channel = None
+            self._invoke_channel_disabled = True
+        return self._invoke_channel
+
     async def invoke(self, config: FunctionConfig) -> tuple[Any, bytes, bytes]:
         """
         Invoke a function in the environment.
         """
+        channel = await self._get_invoke_channel()
+        if channel is not None:
+            try:
+                return await channel.invoke(config)
+            except InvokeChannelError as e:
+                # the channel could not reconnect, the call was not sent so it is safe to POST
+                logger.warning("Invoke channel unavailable, falling back to POST: %s", e)
+                await channel.close()
+                self._invoke_channel = None
+                self._invoke_channel_disabled = True
+
         data = await make_request(
             method="POST",
             url=f"{settings.base_url}/v2/environments/{self.env_id}/invoke",
             json=config.model_dump(),
             api_key=settings.api_key,
+            retry_policy=step_retry_policy(),
         )
 
         return data["result"], b64decode(data["stdout"]), b64decode(data["stderr"])
@@ -189,6 +294,9 @@ class RemoteClient(Client):
         """
         Close the remote environment by making a request to the server.
         """
+        if self._invoke_channel is not None:
+            await self._invoke_channel.close()
+            self._invoke_channel = None
         await make_request(
             method="POST",
             url=f"{settings.base_url}/v2/environments/{self.env_id}/close",
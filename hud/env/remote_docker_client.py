@@ -1,33 +1,88 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import hashlib
 import logging
+import tempfile
 from base64 import b64decode, b64encode
 from pathlib import Path
-from typing import Any
-
-import httpx
+from typing import IO, TYPE_CHECKING, Any
 
+from hud.env.build_cache import context_digest
+from hud.env.build_index import ServerBuildIndex
 from hud.env.docker_client import DockerClient
+from hud.env.framing import decode_frame
+from hud.env.status import fetch_remote_status
+from hud.env.upload import (
+    multipart_upload,
+    upload_file_to_presigned_url,
+)
 from hud.exceptions import HudResponseError
-from hud.server import make_request
+from hud.server import (
+    BINARY_TRANSPORT,
+    BUILD_LOOKUP,
+    MULTIPART_UPLOAD,
+    STATUS_LONG_POLL,
+    make_binary_request,
+    make_request,
+    step_retry_policy,
+    supports,
+)
 from hud.settings import settings
 from hud.types import EnvironmentStatus
 from hud.utils import ExecuteResult
-from hud.utils.common import directory_to_zip_bytes, get_gym_id
+from hud.utils.archive import context_paths, iter_zip
+from hud.utils.common import get_gym_id
+
+if TYPE_CHECKING:
+    from hud.env.build_index import BuildIndex
+    from hud.env.upload import ProgressCallback
 
 logger = logging.getLogger("hud.env.remote_env_client")
 
-async def upload_bytes_to_presigned_url(presigned_url: str, data_bytes: bytes) -> None:
+# Archives up to this size are kept in memory before they are uploaded, larger ones are
+# spooled to a temporary file.
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+# Bytes uploaded between two progress messages.
+PROGRESS_LOG_INTERVAL = 64 * 1024 * 1024
+
+
+def _spool_zip(build_context: Path, paths: list[str]) -> tuple[IO[bytes], int, str]:
+    """
+    Write the zip archive of a build context to a spooled temporary file.
+    Returns the file, its size and its `Content-MD5`.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)  # noqa: SIM115
+    md5 = hashlib.md5()  # noqa: S324
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.put(presigned_url, content=data_bytes)
-            response.raise_for_status()
-    except httpx.HTTPStatusError as e:
-        logger.exception("Failed to upload to presigned URL")
-        raise HudResponseError(message=f"Failed to upload to presigned URL: {e}") from e
-    except httpx.RequestError as e:
-        logger.exception("Network error uploading to presigned URL")
-        raise HudResponseError(message=f"Network error uploading to presigned URL: {e}") from e
+        for chunk in iter_zip(build_context, paths):
+            spool.write(chunk)
+            md5.update(chunk)
+        size = spool.tell()
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool, size, b64encode(md5.digest()).decode()
+
+
+def _upload_progress_logger() -> ProgressCallback:
+    """Get a progress callback logging every `PROGRESS_LOG_INTERVAL` bytes uploaded."""
+    next_report = PROGRESS_LOG_INTERVAL
+
+    def report(uploaded: int, total: int | None) -> None:
+        nonlocal next_report
+        if uploaded < next_report and uploaded != total:
+            return
+        next_report = uploaded + PROGRESS_LOG_INTERVAL
+        if total is None:
+            logger.info("Uploaded %d kb of build context", uploaded // 1024)
+        else:
+            logger.info("Uploaded %d of %d kb of build context", uploaded // 1024, total // 1024)
+
+    return report
+
 
 class RemoteDockerClient(DockerClient):
     """
@@ -37,10 +92,36 @@ class RemoteDockerClient(DockerClient):
     """
 
     @classmethod
-    async def build_image(cls, build_context: Path) -> tuple[str, dict[str, Any]]:
+    async def build_image(
+        cls,
+        build_context: Path,
+        *,
+        progress: ProgressCallback | None = None,
+        index: BuildIndex | None = None,
+    ) -> tuple[str, dict[str, Any]]:
         """
         Build an image from a build context.
+
+        If `index` knows an image built from the same contents, it is returned without
+        uploading the build context.
+
+        Args:
+            build_context: The build context directory
+            progress: Called with the bytes uploaded so far and the total, if known;
+                progress is logged by default
+            index: The index of built images, the HUD API by default
         """
+        if index is None:
+            index = ServerBuildIndex()
+
+        # hashing reads the build context, so keep it off the event loop
+        digest = await asyncio.to_thread(context_digest, build_context)
+        known = await index.lookup(digest)
+        if known is not None:
+            uri, build_data = known
+            logger.info("Build context %s was already built as %s", build_context, uri)
+            return uri, {**build_data, "cached": True}
+
         # create the presigned url by making a POST request to /v2/builds
         logger.info("Creating build")
         response = await make_request(
@@ -49,22 +130,34 @@ class RemoteDockerClient(DockerClient):
             api_key=settings.api_key,
         )
         logger.info("Build created")
-        presigned_url = response["presigned_url"]
 
-        # List files in the build context
-        files = list(build_context.glob("**/*"))
-        logger.info("Found %d files in build context %s", len(files), build_context)
+        # List files in the build context, leaving out files excluded by .dockerignore
+        paths = context_paths(build_context)
+        logger.info("Found %d files in build context %s", len(paths), build_context)
 
-        if len(files) == 0:
+        if len(paths) == 0:
             raise HudResponseError(message="Build context is empty")
 
-        # zip the build context
-        logger.info("Zipping build context")
-        zip_bytes = directory_to_zip_bytes(build_context)
-        logger.info("Created zip archive of size %d kb", len(zip_bytes) // 1024)
-        # upload the zip bytes to the presigned url
-        logger.info("Uploading build context")
-        await upload_bytes_to_presigned_url(presigned_url, zip_bytes)
+        if progress is None:
+            progress = _upload_progress_logger()
+
+        if await supports(MULTIPART_UPLOAD):
+            # zip the build context while uploading it in parts
+            logger.info("Uploading build context")
+            await multipart_upload(
+                response["id"], iter_zip(build_context, paths), progress=progress
+            )
+        else:
+            # zip the build context
+            logger.info("Zipping build context")
+            spool, size, md5 = await asyncio.to_thread(_spool_zip, build_context, paths)
+            with spool:
+                logger.info("Created zip archive of size %d kb", size // 1024)
+                # upload the zip archive to the presigned url
+                logger.info("Uploading build context")
+                await upload_file_to_presigned_url(
+                    response["presigned_url"], spool, size, md5=md5, progress=progress
+                )
         logger.info("Build context uploaded")
 
         # start the build and return uri and logs
@@ -72,11 +165,15 @@ class RemoteDockerClient(DockerClient):
         response = await make_request(
             method="POST",
             url=f"{settings.base_url}/v2/builds/{response['id']}/start",
+            # lets servers that support build lookups index the build
+            json={"context_digest": digest} if await supports(BUILD_LOOKUP) else None,
             api_key=settings.api_key,
         )
         logger.info("Build completed")
-        
-        return response["uri"], {"logs": response["logs"]}
+
+        uri, build_data = response["uri"], {"logs": response["logs"]}
+        await index.record(digest, uri, build_data)
+        return uri, build_data
 
     @classmethod
     async def create(
@@ -131,6 +228,26 @@ class RemoteDockerClient(DockerClient):
             api_key=settings.api_key,
         )
 
+        return cls.from_create_response(response, image_uri=image_uri)
+
+    @classmethod
+    def from_create_response(
+        cls, response: dict[str, Any], *, image_uri: str
+    ) -> RemoteDockerClient:
+        """
+        Creates a remote environment client from the response to an environment creation.
+
+        Args:
+            response: The response for the environment, from `create` or
+                `hud.env.remote_client.create_environments`
+            image_uri: The image uri the environment was created from
+
+        Returns:
+            The remote environment client
+
+        Raises:
+            HudResponseError: If the response does not contain an environment ID.
+        """
         # Get the environment ID from the response
         env_id = response.get("id")
         if not env_id:
@@ -142,8 +259,9 @@ class RemoteDockerClient(DockerClient):
                 response_json=response,
             )
 
-        return cls(env_id)
-
+        client = cls(env_id)
+        client._image = image_uri
+        return client
 
     def __init__(self, env_id: str) -> None:
         """
@@ -168,31 +286,38 @@ class RemoteDockerClient(DockerClient):
             EnvironmentStatus: The current status of the environment
         """
         try:
-            response = await make_request(
-                method="GET",
-                url=f"{settings.base_url}/v2/environments/{self.env_id}/state",
-                api_key=settings.api_key,
-            )
-            logger.debug("Environment status response: %s", response)
-
-            status = response.get("state", "").lower()
-
-            if status == "running":
-                return EnvironmentStatus.RUNNING
-            elif status == "initializing" or status == "pending":
-                return EnvironmentStatus.INITIALIZING
-            elif status == "completed" or status == "terminated":
-                return EnvironmentStatus.COMPLETED
-            else:
-                # Any other status is considered an error
-                logger.warning("Abnormal environment status response: %s", response)
-                return EnvironmentStatus.ERROR
-
+            return await fetch_remote_status(self.env_id)
         except Exception:
             # If we can't connect to the API or there's any other error
             logger.info("(potentially transient) Error getting environment status")
             return EnvironmentStatus.ERROR
 
+    async def wait_until(
+        self, status: EnvironmentStatus, *, timeout: float | None = None
+    ) -> EnvironmentStatus:
+        """
+        Wait until the remote environment reaches a status, long-polling the HUD API when
+        it supports it. Unlike `get_status`, transient errors are retried, not reported as
+        `ERROR`.
+
+        Args:
+            status: The status to wait for, e.g. `EnvironmentStatus.RUNNING`
+            timeout: Seconds to wait at most, None to wait forever
+
+        Returns:
+            EnvironmentStatus: `status`, or the terminal status (`COMPLETED` or `ERROR`) the
+                environment reached instead
+
+        Raises:
+            HudTimeoutError: If the environment did not reach the status in time
+        """
+        return await self._wait_until(
+            functools.partial(fetch_remote_status, self.env_id),
+            status,
+            timeout=timeout,
+            long_poll=await supports(STATUS_LONG_POLL),
+        )
+
     async def execute(
         self,
         command: list[str],
@@ -211,15 +336,34 @@ class RemoteDockerClient(DockerClient):
         Returns:
             ExecuteResult: Result of the command execution
         """
+        url = f"{settings.base_url}/v2/environments/{self.env_id}/execute"
+        body = {
+            "command": command,
+            "workdir": workdir,
+            "timeout": timeout,
+        }
+        if await supports(BINARY_TRANSPORT):
+            # the output comes back as a frame with stdout and stderr as raw attachments
+            frame = await make_binary_request(
+                method="POST",
+                url=url,
+                json=body,
+                api_key=settings.api_key,
+                retry_policy=step_retry_policy(),
+            )
+            data = decode_frame(memoryview(frame))
+            return ExecuteResult(
+                stdout=data["stdout"],
+                stderr=data["stderr"],
+                exit_code=data["exit_code"],
+            )
+
         data = await make_request(
             method="POST",
-            url=f"{settings.base_url}/v2/environments/{self.env_id}/execute",
-            json={
-                "command": command,
-                "workdir": workdir,
-                "timeout": timeout,
-            },
+            url=url,
+            json=body,
             api_key=settings.api_key,
+            retry_policy=step_retry_policy(),
         )
 
         return ExecuteResult(
@@ -239,6 +383,14 @@ class RemoteDockerClient(DockerClient):
         Returns:
             bytes: Content of the file or archive
         """
+        if await supports(BINARY_TRANSPORT):
+            return await make_binary_request(
+                method="POST",
+                url=f"{settings.base_url}/v2/environments/{self.env_id}/get_archive",
+                json={"path": path},
+                api_key=settings.api_key,
+            )
+
         data = await make_request(
             method="POST",
             url=f"{settings.base_url}/v2/environments/{self.env_id}/get_archive",
@@ -261,6 +413,16 @@ class RemoteDockerClient(DockerClient):
         Returns:
             bool: True if successful
         """
+        if await supports(BINARY_TRANSPORT):
+            await make_binary_request(
+                method="POST",
+                url=f"{settings.base_url}/v2/environments/{self.env_id}/put_archive",
+                content=data,
+                params={"path": path},
+                api_key=settings.api_key,
+            )
+            return True
+
         await make_request(
             method="POST",
             url=f"{settings.base_url}/v2/environments/{self.env_id}/put_archive",
@@ -0,0 +1,397 @@
+"""
+Change detection for controller source directories.
+
+A `SourceWatcher` keeps a generation counter for a source directory that is bumped whenever a
+file under it changes, so clients can check for changes in O(1) on every invoke. Changes are
+picked up with inotify on Linux and by polling file stats in a background thread elsewhere.
+
+The watcher also keeps a `SourceManifest` of content hashes, persisted in the SDK cache
+directory so that hashes of unchanged files are reused across processes.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import hashlib
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from hud.settings import settings
+from hud.utils.disk_cache import write_atomic
+
+logger = logging.getLogger("hud.env.source_watcher")
+
+# Seconds between scans when falling back to polling.
+POLL_INTERVAL = 1.0
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+class ManifestEntry(BaseModel):
+    """
+    A single file in a source manifest.
+
+    Attributes:
+        size: Size of the file in bytes
+        mtime_ns: Modification time of the file in nanoseconds
+        sha256: Hex digest of the file contents
+    """
+
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+class ManifestDiff(BaseModel):
+    """
+    Difference between two source manifests.
+
+    Attributes:
+        added: Relative paths of files that are new
+        modified: Relative paths of files whose contents changed
+        deleted: Relative paths of files that were removed
+    """
+
+    added: list[str] = []
+    modified: list[str] = []
+    deleted: list[str] = []
+
+    @property
+    def changed(self) -> list[str]:
+        """Relative paths of files that are new or modified."""
+        return self.added + self.modified
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.modified or self.deleted)
+
+
+class SourceManifest(BaseModel):
+    """
+    Content hashes of all files in a source directory, keyed by relative posix path.
+    """
+
+    files: dict[str, ManifestEntry] = {}
+
+    @classmethod
+    def build(cls, root: Path, previous: SourceManifest | None = None) -> SourceManifest:
+        """
+        Build a manifest of a directory.
+
+        Files whose size and modification time match the previous manifest keep their hash
+        without being read again.
+
+        Args:
+            root: The directory to build the manifest of
+            previous: A previous manifest of the same directory
+
+        Returns:
+            SourceManifest: The manifest of the directory
+        """
+        previous_files = previous.files if previous else {}
+        files: dict[str, ManifestEntry] = {}
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                file_path = Path(dirpath) / filename
+                rel_path = file_path.relative_to(root).as_posix()
+                try:
+                    stat = file_path.stat()
+                    entry = previous_files.get(rel_path)
+                    if entry is None or (entry.size, entry.mtime_ns) != (
+                        stat.st_size,
+                        stat.st_mtime_ns,
+                    ):
+                        entry = ManifestEntry(
+                            size=stat.st_size,
+                            mtime_ns=stat.st_mtime_ns,
+                            sha256=_hash_file(file_path),
+                        )
+                except (FileNotFoundError, PermissionError):
+                    # Skip files that can't be accessed
+                    continue
+                files[rel_path] = entry
+        return cls(files=files)
+
+    def diff(self, previous: SourceManifest | None) -> ManifestDiff:
+        """
+        Compare this manifest to a previous one.
+
+        Args:
+            previous: The previous manifest, or None if nothing was synced before
+
+        Returns:
+            ManifestDiff: The files added, modified and deleted since the previous manifest
+        """
+        previous_files = previous.files if previous else {}
+        result = ManifestDiff()
+        for rel_path, entry in sorted(self.files.items()):
+            previous_entry = previous_files.get(rel_path)
+            if previous_entry is None:
+                result.added.append(rel_path)
+            elif previous_entry.sha256 != entry.sha256:
+                result.modified.append(rel_path)
+        result.deleted = sorted(set(previous_files) - set(self.files))
+        return result
+
+    def digest(self) -> str:
+        """
+        Hash the paths and contents of all files, independent of modification times.
+
+        Returns:
+            str: A hex digest that changes whenever a file is added, removed or modified
+        """
+        digest = hashlib.sha256()
+        for rel_path, entry in sorted(self.files.items()):
+            digest.update(f"{rel_path}\0{entry.sha256}\n".encode())
+        return digest.hexdigest()
+
+
+def _hash_file(path: Path) -> str:
+    """Get the sha256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_cache_path(root: Path) -> Path:
+    """Get the path the manifest of a source directory is persisted at."""
+    key = hashlib.sha256(str(root).encode()).hexdigest()[:16]
+    return settings.cache_dir / "manifests" / f"{key}.json"
+
+
+class SourceWatcher:
+    """
+    Watches a source directory for changes.
+
+    Use `watch_source` to get the shared watcher for a directory rather than creating one.
+    """
+
+    def __init__(self, root: Path) -> None:
+        """
+        Initialize the SourceWatcher and start watching in a background thread.
+
+        Args:
+            root: The directory to watch
+        """
+        self.root = root.resolve()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._manifest: SourceManifest | None = None
+        self._manifest_generation = -1
+        self._manifest_lock = threading.Lock()
+
+        self._inotify: _Inotify | None = None
+        if sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify(self.root)
+            except OSError as e:
+                logger.debug("inotify unavailable, polling %s for changes: %s", self.root, e)
+
+        if self._inotify:
+            target, args = self._watch_inotify, (self._inotify,)
+        else:
+            # snapshot before returning so no change after construction is missed
+            target, args = self._watch_polling, (_stat_snapshot(self.root),)
+        self._thread = threading.Thread(
+            target=target, args=args, name=f"hud-source-watcher-{self.root.name}", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def generation(self) -> int:
+        """A counter that is incremented whenever a file under the root changes."""
+        return self._generation
+
+    def mark_dirty(self) -> None:
+        """Record a change to the source directory."""
+        with self._lock:
+            self._generation += 1
+
+    def manifest(self) -> SourceManifest:
+        """
+        Get the manifest of the source directory as of the current generation.
+        The manifest is rebuilt incrementally only if something changed since it was last built.
+
+        Returns:
+            SourceManifest: The manifest of the source directory
+        """
+        with self._manifest_lock:
+            # read the generation before scanning, so changes during the scan bump it again
+            generation = self._generation
+            if self._manifest is not None and self._manifest_generation == generation:
+                return self._manifest
+
+            cache_path = _manifest_cache_path(self.root)
+            previous = self._manifest
+            if previous is None and cache_path.exists():
+                try:
+                    previous = SourceManifest.model_validate_json(cache_path.read_text())
+                except (OSError, ValueError) as e:
+                    logger.debug("Ignoring unreadable manifest cache %s: %s", cache_path, e)
+
+            self._manifest = SourceManifest.build(self.root, previous)
+            self._manifest_generation = generation
+
+            write_atomic(cache_path, self._manifest.model_dump_json())
+
+            return self._manifest
+
+    def close(self) -> None:
+        """Stop watching the source directory."""
+        self._stop.set()
+        self._thread.join(timeout=POLL_INTERVAL * 2)
+        if self._inotify:
+            self._inotify.close()
+
+    def _watch_inotify(self, inotify: _Inotify) -> None:
+        try:
+            while not self._stop.is_set():
+                if inotify.read_events(timeout=POLL_INTERVAL):
+                    self.mark_dirty()
+        except OSError:
+            logger.exception("inotify watcher for %s failed, polling instead", self.root)
+            self.mark_dirty()
+            self._watch_polling(_stat_snapshot(self.root))
+
+    def _watch_polling(self, snapshot: dict[str, tuple[int, int]]) -> None:
+        while not self._stop.wait(POLL_INTERVAL):
+            current = _stat_snapshot(self.root)
+            if current != snapshot:
+                snapshot = current
+                self.mark_dirty()
+
+
+def _stat_snapshot(root: Path) -> dict[str, tuple[int, int]]:
+    """Get the size and modification time of every file under a directory."""
+    snapshot = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            file_path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(file_path)
+            except (FileNotFoundError, PermissionError):
+                continue
+            snapshot[file_path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+# inotify(7) constants
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = os.O_CLOEXEC
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """A minimal recursive inotify watch over a directory tree, using libc through ctypes."""
+
+    def __init__(self, root: Path) -> None:
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: dict[int, Path] = {}
+        try:
+            self._add_tree(root)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _add_tree(self, root: Path) -> None:
+        for dirpath, _, _ in os.walk(root):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), _WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {dirpath}")
+            self._dirs[wd] = Path(dirpath)
+
+    def read_events(self, timeout: float) -> bool:
+        """
+        Wait for events and consume them.
+
+        Returns:
+            bool: True if anything under the tree changed
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return False
+
+        changed = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                name_start = offset + _EVENT_HEADER.size
+                name = data[name_start : name_start + name_len].rstrip(b"\0")
+                offset = name_start + name_len
+                changed = True
+                # new directories need their own watches to keep the watch recursive
+                if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO) and wd in self._dirs:
+                    try:
+                        self._add_tree(self._dirs[wd] / os.fsdecode(name))
+                    except OSError as e:
+                        logger.debug("Could not watch new directory %s: %s", name, e)
+                if mask & _IN_Q_OVERFLOW:
+                    logger.debug("inotify queue overflowed")
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+_WATCHERS: dict[Path, SourceWatcher] = {}
+_WATCHERS_LOCK = threading.Lock()
+
+
+def watch_source(root: Path) -> SourceWatcher:
+    """
+    Get the shared watcher for a source directory, starting one if needed.
+
+    Args:
+        root: The directory to watch
+
+    Returns:
+        SourceWatcher: The watcher for the directory
+    """
+    key = root.resolve()
+    with _WATCHERS_LOCK:
+        watcher = _WATCHERS.get(key)
+        if watcher is None:
+            watcher = SourceWatcher(key)
+            _WATCHERS[key] = watcher
+        return watcher
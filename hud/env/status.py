@@ -0,0 +1,185 @@
+"""
+Waiting for environments to reach a status.
+
+Remote environments take a while to start, and callers that need a running environment used
+to poll `get_status` in a loop. `wait_for_status` does the waiting for them: when the server
+advertises `STATUS_LONG_POLL`, each request is held by the server until the environment
+reaches the wanted status or a short wait elapses; otherwise the status is polled with an
+adaptive backoff, polling quickly while the status is changing and slowing down while it is
+not. Transient errors are retried until the deadline instead of being reported as `ERROR`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+
+from hud.exceptions import HudNetworkError, HudRequestError, HudTimeoutError
+from hud.server import make_request, step_retry_policy
+from hud.server.retry import RETRY_STATUS_CODES
+from hud.settings import settings
+from hud.types import EnvironmentStatus
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    # called with the wanted status and how long the server may hold the request
+    StatusPoll = Callable[[EnvironmentStatus, float], Awaitable[EnvironmentStatus]]
+
+logger = logging.getLogger("hud.env.status")
+
+# Statuses an environment does not leave, so waiting for another one is pointless.
+TERMINAL_STATUSES = frozenset({EnvironmentStatus.COMPLETED, EnvironmentStatus.ERROR})
+
+# Bounds of the delay between two polls without long-polling.
+MIN_POLL_INTERVAL = 0.25
+MAX_POLL_INTERVAL = 5.0
+POLL_BACKOFF = 1.5
+
+# Longest a long-poll request asks the server to wait.
+LONG_POLL_WAIT = 20.0
+
+
+def parse_remote_state(response: dict[str, Any]) -> EnvironmentStatus:
+    """
+    Get the status of an environment from a state response of the HUD API.
+
+    Args:
+        response: The response of `/v2/environments/{id}/state`
+
+    Returns:
+        EnvironmentStatus: The status, `ERROR` for any state that is not recognised
+    """
+    status = response.get("state", "").lower()
+
+    if status == "running":
+        return EnvironmentStatus.RUNNING
+    elif status == "initializing" or status == "pending":
+        return EnvironmentStatus.INITIALIZING
+    elif status == "completed" or status == "terminated":
+        return EnvironmentStatus.COMPLETED
+    else:
+        # Any other status is considered an error
+        logger.warning("Abnormal environment status response: %s", response)
+        return EnvironmentStatus.ERROR
+
+
+async def fetch_remote_status(
+    env_id: str, wait_for: EnvironmentStatus | None = None, wait: float = 0.0
+) -> EnvironmentStatus:
+    """
+    Get the status of a remote environment.
+
+    Args:
+        env_id: The ID of the environment
+        wait_for: The status the caller is waiting for, sent with long-poll requests
+        wait: Seconds the server may hold the request until the environment reaches
+            `wait_for`, zero to answer straight away
+
+    Returns:
+        EnvironmentStatus: The status of the environment
+
+    Raises:
+        HudRequestError: If the server answered with an error
+        HudNetworkError: If the server could not be reached
+        HudTimeoutError: If the request timed out
+    """
+    url = f"{settings.base_url}/v2/environments/{env_id}/state"
+    if wait_for is not None and wait > 0:
+        url += f"?wait_for={wait_for.value}&wait={wait:g}"
+    response = await make_request(
+        method="GET",
+        url=url,
+        api_key=settings.api_key,
+        retry_policy=step_retry_policy(),
+    )
+    logger.debug("Environment status response: %s", response)
+    return parse_remote_state(response)
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Whether an error of a status request to the HUD API may go away if it is sent again.
+
+    Args:
+        error: The error the request failed with
+
+    Returns:
+        bool: True for network errors, timeouts and retriable status codes
+    """
+    if isinstance(error, HudNetworkError | HudTimeoutError):
+        return True
+    if isinstance(error, HudRequestError):
+        return error.status_code is None or error.status_code in RETRY_STATUS_CODES
+    return False
+
+
+async def wait_for_status(
+    poll: StatusPoll,
+    status: EnvironmentStatus,
+    *,
+    timeout: float | None = None,
+    long_poll: bool = False,
+    is_transient: Callable[[Exception], bool] = is_transient_error,
+) -> EnvironmentStatus:
+    """
+    Wait until an environment reaches a status, or a status it cannot leave.
+
+    Args:
+        poll: Gets the status of the environment, see `StatusPoll`
+        status: The status to wait for
+        timeout: Seconds to wait at most, None to wait forever
+        long_poll: Whether `poll` supports holding the request on the server
+        is_transient: Whether an error raised by `poll` is retried rather than raised
+
+    Returns:
+        EnvironmentStatus: `status`, or the terminal status the environment reached instead
+
+    Raises:
+        HudTimeoutError: If the environment did not reach the status in time
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    interval = MIN_POLL_INTERVAL
+    last: EnvironmentStatus | None = None
+    polls = 0
+
+    while True:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise HudTimeoutError(
+                f"Environment did not become {status.value} within {timeout:g} seconds "
+                f"(last status: {last.value if last else 'unknown'}, {polls} polls)"
+            )
+
+        wait = 0.0
+        if long_poll:
+            wait = LONG_POLL_WAIT if remaining is None else min(LONG_POLL_WAIT, remaining)
+        started = time.monotonic()
+        polls += 1
+        try:
+            current = await poll(status, wait)
+        except Exception as e:
+            if not is_transient(e):
+                raise
+            logger.debug("(potentially transient) Error getting environment status: %s", e)
+            current = last
+        else:
+            if current == status or current in TERMINAL_STATUSES:
+                logger.debug("Environment is %s after %d polls", current.value, polls)
+                return current
+
+        if current != last:
+            # the environment is moving, look again soon
+            interval = MIN_POLL_INTERVAL
+        else:
+            interval = min(MAX_POLL_INTERVAL, interval * POLL_BACKOFF)
+        last = current
+
+        # a long-poll request that was held by the server has already waited
+        delay = max(0.0, interval - (time.monotonic() - started))
+        if deadline is not None:
+            delay = min(delay, max(0.0, deadline - time.monotonic()))
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+
+from hud.env import build_cache
+from hud.settings import settings
+from hud.utils.disk_cache import save_json
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(cache_dir, monkeypatch):
+    monkeypatch.setattr(build_cache, "_index", None)
+
+
+@pytest.fixture
+def context(tmp_path):
+    root = tmp_path / "context"
+    root.mkdir()
+    (root / "Dockerfile").write_text("FROM python:3.11\n")
+    return root
+
+
+class FakeBuilder:
+    def __init__(self) -> None:
+        self.builds = 0
+
+    async def build(self, build_context):
+        self.builds += 1
+        await asyncio.sleep(0.05)
+        return f"image-{self.builds}", {"build_output": "ok"}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_builds_are_deduplicated(context):
+    builder = FakeBuilder()
+    results = await asyncio.gather(
+        *(build_cache.get_or_build("local", context, builder.build) for _ in range(10))
+    )
+    assert builder.builds == 1
+    assert {uri for uri, _ in results} == {"image-1"}
+    # callers do not share build data
+    assert len({id(build_data) for _, build_data in results}) == 10
+
+
+@pytest.mark.asyncio
+async def test_cache_survives_restart_and_tracks_content(context, monkeypatch):
+    builder = FakeBuilder()
+    assert (await build_cache.get_or_build("local", context, builder.build))[0] == "image-1"
+
+    # a fresh process reads the index from disk
+    monkeypatch.setattr(build_cache, "_index", None)
+    uri, build_data = await build_cache.get_or_build("local", context, builder.build)
+    assert (uri, builder.builds) == ("image-1", 1)
+    assert build_data["cached"] is True
+
+    # the same context built elsewhere is a different image
+    await build_cache.get_or_build("remote", context, builder.build)
+    assert builder.builds == 2
+
+    (context / "Dockerfile").write_text("FROM python:3.12\n")
+    assert (await build_cache.get_or_build("local", context, builder.build))[0] == "image-3"
+
+
+@pytest.mark.asyncio
+async def test_missing_images_and_failures_are_rebuilt(context):
+    builder = FakeBuilder()
+    await build_cache.get_or_build("local", context, builder.build)
+
+    async def missing(uri: str) -> bool:
+        return False
+
+    uri, _ = await build_cache.get_or_build("local", context, builder.build, exists=missing)
+    assert uri == "image-2"
+
+    await build_cache.invalidate("local", context)
+
+    async def failing(build_context):
+        raise RuntimeError("build failed")
+
+    with pytest.raises(RuntimeError):
+        await build_cache.get_or_build("local", context, failing)
+    uri, _ = await build_cache.get_or_build("local", context, builder.build)
+    assert uri == "image-3"
+
+
+@pytest.mark.asyncio
+async def test_images_saved_by_other_processes_are_kept(context):
+    path = settings.cache_dir / "images.json"
+    builder = FakeBuilder()
+    await build_cache.get_or_build("local", context, builder.build)
+
+    # another shard of the job saves an image after this process loaded the index
+    index = json.loads(path.read_text())
+    save_json(path.name, {**index, "local:other": {"uri": "other", "build_data": {}}})
+
+    await build_cache.get_or_build("remote", context, builder.build)
+    assert len(json.loads(path.read_text())) == 3
+
+    await build_cache.invalidate("local", context)
+    index = json.loads(path.read_text())
+    assert len(index) == 2
+    assert "local:other" in index
+
+
+@pytest.mark.asyncio
+async def test_remote_images_are_kept_per_server(context, monkeypatch):
+    builder = FakeBuilder()
+    await build_cache.get_or_build("remote", context, builder.build)
+
+    monkeypatch.setattr(settings, "base_url", "https://other.hud.test")
+    uri, _ = await build_cache.get_or_build("remote", context, builder.build)
+    assert (uri, builder.builds) == ("image-2", 2)
+
+    monkeypatch.setattr(settings, "api_key", "another-account")
+    uri, _ = await build_cache.get_or_build("remote", context, builder.build)
+    assert (uri, builder.builds) == ("image-3", 3)
+
+
+def test_digest_skips_ignored_files(context, mocker):
+    (context / ".dockerignore").write_text("node_modules\n")
+    (context / "node_modules").mkdir()
+    (context / "node_modules" / "big.js").write_text("ignored")
+    hashed = mocker.spy(build_cache, "_file_hash")
+
+    digest = build_cache.context_digest(context)
+
+    assert {call.args[0].name for call in hashed.call_args_list} == {".dockerignore", "Dockerfile"}
+    (context / "node_modules" / "big.js").write_text("still ignored")
+    assert build_cache.context_digest(context) == digest
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from hud.env.build_cache import context_digest
+from hud.env.build_index import LocalBuildIndex
+from hud.env.remote_docker_client import RemoteDockerClient
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    import pytest_mock
+
+
+def make_context(root: Path) -> Path:
+    root.mkdir()
+    (root / "Dockerfile").write_text("FROM python:3.11\n")
+    (root / ".dockerignore").write_text("*.log\n")
+    (root / "app.py").write_text("print('hello')\n")
+    return root
+
+
+def test_context_digest_depends_on_contents_only(tmp_path: Path):
+    first = make_context(tmp_path / "first")
+    second = make_context(tmp_path / "second")
+    (second / "debug.log").write_text("ignored by .dockerignore")
+    assert context_digest(first) == context_digest(second)
+
+    (second / "app.py").write_text("print('changed')\n")
+    assert context_digest(second) != context_digest(first)
+
+
+@pytest.mark.asyncio
+async def test_build_image_skips_known_contexts(tmp_path: Path, mocker: pytest_mock.MockerFixture):
+    context = make_context(tmp_path / "context")
+    mocker.patch("hud.env.remote_docker_client.supports", return_value=False)
+    mock_upload = mocker.patch("hud.env.remote_docker_client.upload_file_to_presigned_url")
+    mock_request = mocker.patch(
+        "hud.env.remote_docker_client.make_request",
+        side_effect=[
+            {"id": "build-1", "presigned_url": "https://storage.test/context.zip"},
+            {"uri": "registry.test/image:1", "logs": "built"},
+        ],
+    )
+    index = LocalBuildIndex()
+
+    uri, build_data = await RemoteDockerClient.build_image(context, index=index)
+    assert (uri, build_data) == ("registry.test/image:1", {"logs": "built"})
+    assert mock_upload.await_count == 1
+
+    uri, build_data = await RemoteDockerClient.build_image(context, index=index)
+    assert uri == "registry.test/image:1"
+    assert build_data["cached"] is True
+    # nothing was created, uploaded or built the second time
+    assert mock_request.await_count == 2
+    assert mock_upload.await_count == 1
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+
+import pytest
+
+from hud.env import container_pool
+from hud.env.container_pool import ContainerPool, PoolConfig
+
+
+class FakeDocker:
+    def __init__(self) -> None:
+        self._ids = itertools.count()
+        self.created: list[str] = []
+        self.destroyed: list[str] = []
+
+    async def create(self) -> str:
+        await asyncio.sleep(0.01)
+        container_id = f"c{next(self._ids)}"
+        self.created.append(container_id)
+        return container_id
+
+    async def destroy(self, container_id: str) -> None:
+        self.destroyed.append(container_id)
+
+
+async def _settle() -> None:
+    await asyncio.sleep(0.05)
+
+
+@pytest.mark.asyncio
+async def test_pool_keeps_warm_containers_and_recycles():
+    docker = FakeDocker()
+    pool = ContainerPool(PoolConfig(min_size=2, max_size=4), docker.create, docker.destroy)
+    await _settle()
+    assert pool.stats == {"idle": 2, "in_use": 0, "creating": 0}
+
+    entry = await pool.acquire()
+    assert entry.container_id in {"c0", "c1"}
+    # the taken container is replaced in the background
+    await _settle()
+    assert pool.stats == {"idle": 2, "in_use": 1, "creating": 0}
+
+    await pool.release(entry, reusable=True)
+    assert pool.stats["idle"] == 3
+    assert docker.destroyed == []
+
+    entry = await pool.acquire()
+    await pool.release(entry, reusable=False)
+    await _settle()
+    assert docker.destroyed == [entry.container_id]
+
+    await pool.close()
+    assert sorted(docker.destroyed) == sorted(docker.created)
+
+
+@pytest.mark.asyncio
+async def test_pool_waits_when_full():
+    docker = FakeDocker()
+    pool = ContainerPool(PoolConfig(max_size=1), docker.create, docker.destroy)
+    first = await pool.acquire()
+
+    waiter = asyncio.create_task(pool.acquire())
+    await _settle()
+    assert not waiter.done()
+
+    await pool.release(first, reusable=True)
+    second = await asyncio.wait_for(waiter, 1)
+    assert second is first
+    assert len(docker.created) == 1
+    await pool.release(second, reusable=True)
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_reaps_idle_containers_above_min_size():
+    docker = FakeDocker()
+    pool = ContainerPool(PoolConfig(min_size=0, idle_ttl=0.01), docker.create, docker.destroy)
+    entry = await pool.acquire()
+    await pool.release(entry, reusable=True)
+    # the reaper checks at least every second
+    await asyncio.sleep(1.1)
+    assert docker.destroyed == [entry.container_id]
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_get_container_pool_only_when_configured():
+    docker = FakeDocker()
+
+    def factory(config: PoolConfig) -> ContainerPool:
+        return ContainerPool(config, docker.create, docker.destroy)
+
+    assert container_pool.get_container_pool("image", factory) is None
+    container_pool.configure_container_pool(PoolConfig(), image="image")
+    try:
+        pool = container_pool.get_container_pool("image", factory)
+        assert pool is not None
+        assert container_pool.get_container_pool("image", factory) is pool
+        assert container_pool.get_container_pool("other", factory) is None
+    finally:
+        container_pool.configure_container_pool(None, image="image")
+        await container_pool.close_container_pools()
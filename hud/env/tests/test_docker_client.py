@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import tarfile
+from typing import Any
+
+import pytest
+
+from hud.env import dependency_cache
+from hud.env.docker_client import DockerClient
+from hud.env.source_watcher import watch_source
+from hud.settings import settings
+from hud.types import EnvironmentStatus
+from hud.utils import ExecuteResult
+from hud.utils.disk_cache import save_json
+
+
+class FakeDockerClient(DockerClient):
+    """Records the commands and archives sent to the environment."""
+
+    @classmethod
+    async def build_image(cls, build_context):
+        raise NotImplementedError
+
+    @classmethod
+    async def create(cls, image: str) -> FakeDockerClient:
+        return cls()
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._commands: list[list[str]] = []
+        self._archives: list[tuple[str, bytes]] = []
+        self._pip_stdout = b"Successfully installed hud_controller-0.1.0\n"
+
+    async def get_status(self) -> EnvironmentStatus:
+        return EnvironmentStatus.RUNNING
+
+    async def execute(self, command: list[str], *, timeout: int | None = None) -> ExecuteResult:
+        self._commands.append(command)
+        if "pip install" in command[-1]:
+            return ExecuteResult(stdout=self._pip_stdout, stderr=b"", exit_code=0)
+        return ExecuteResult(stdout=b"", stderr=b"", exit_code=0)
+
+    async def get_archive(self, path: str) -> bytes:
+        raise NotImplementedError
+
+    async def put_archive(self, path: str, data: bytes) -> Any:
+        self._archives.append((path, data))
+        return True
+
+    async def close(self) -> None:
+        pass
+
+
+def _archive_names(data: bytes) -> set[str]:
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        return set(tar.getnames())
+
+
+async def _wait_for_update_needed(client: DockerClient) -> None:
+    for _ in range(250):
+        if await client.needs_update():
+            # let the rest of the events for the same write arrive
+            await asyncio.sleep(0.1)
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("change was not detected")
+
+
+def _pip_installs(client: FakeDockerClient) -> int:
+    return sum("pip install" in command[-1] for command in client._commands)
+
+
+@pytest.fixture(autouse=True)
+def fresh_dependency_cache(cache_dir, monkeypatch):
+    monkeypatch.setattr(dependency_cache, "_satisfied", None)
+
+
+@pytest.fixture
+def source(tmp_path):
+    root = tmp_path / "source"
+    (root / "src" / "hud_controller").mkdir(parents=True)
+    (root / "pyproject.toml").write_text("[project]\nname = 'hud_controller'\n")
+    (root / "src" / "hud_controller" / "__init__.py").write_text("")
+    (root / "src" / "hud_controller" / "step.py").write_text("def step(): pass\n")
+    return root
+
+
+@pytest.mark.asyncio
+async def test_update_uploads_only_changed_files(source):
+    client = FakeDockerClient()
+    client.set_source_path(source)
+    assert not await client.needs_update()
+
+    # the first update uploads the whole tree, since /controller starts out empty
+    (source / "src" / "hud_controller" / "step.py").write_text("def step(): return 1\n")
+    await _wait_for_update_needed(client)
+    await client.update()
+    assert not await client.needs_update()
+    assert _archive_names(client._archives[-1][1]) == {
+        "pyproject.toml",
+        "src/hud_controller/__init__.py",
+        "src/hud_controller/step.py",
+    }
+
+    # later updates only send the delta, and delete removed files
+    client._archives.clear()
+    client._commands.clear()
+    (source / "src" / "hud_controller" / "step.py").write_text("def step(): return 2\n")
+    (source / "src" / "hud_controller" / "__init__.py").unlink()
+    await _wait_for_update_needed(client)
+    await client.update()
+    assert len(client._archives) == 1
+    assert _archive_names(client._archives[0][1]) == {"src/hud_controller/step.py"}
+    assert ["rm", "-f", "--", "/controller/src/hud_controller/__init__.py"] in client._commands
+
+
+@pytest.mark.asyncio
+async def test_update_skips_touched_but_unchanged_files(source):
+    client = FakeDockerClient()
+    client.set_source_path(source)
+    watch_source(source).mark_dirty()
+    await client.update()
+    assert client._archives == []
+    assert client._commands == []
+    assert not await client.needs_update()
+
+
+@pytest.mark.asyncio
+async def test_update_skips_pip_when_dependencies_are_unchanged(source):
+    first = FakeDockerClient()
+    first._image = "hud-env-test"
+    first.set_source_path(source)
+    (source / "src" / "hud_controller" / "step.py").write_text("def step(): return 1\n")
+    await _wait_for_update_needed(first)
+    await first.update()
+    assert _pip_installs(first) == 1
+
+    # a source-only change does not reinstall
+    (source / "src" / "hud_controller" / "step.py").write_text("def step(): return 2\n")
+    await _wait_for_update_needed(first)
+    await first.update()
+    assert _pip_installs(first) == 1
+
+    # a fresh container from the same image links /controller instead of running pip
+    second = FakeDockerClient()
+    second._image = "hud-env-test"
+    second.set_source_path(source)
+    watch_source(source).mark_dirty()
+    second._synced_manifest = None
+    await second.update()
+    assert _pip_installs(second) == 0
+    assert any("_hud_controller.pth" in command[-1] for command in second._commands)
+
+    # changing the dependencies reinstalls
+    (source / "pyproject.toml").write_text(
+        "[project]\nname = 'hud_controller'\ndependencies = ['requests']\n"
+    )
+    await _wait_for_update_needed(second)
+    await second.update()
+    assert _pip_installs(second) == 1
+
+
+def test_installed_only():
+    assert dependency_cache.installed_only(
+        "Requirement already satisfied: pyautogui\nSuccessfully installed hud_controller-0.1.0\n",
+        "hud_controller",
+    )
+    assert not dependency_cache.installed_only(
+        "Successfully installed hud-controller-0.1.0 requests-2.32.0\n", "hud_controller"
+    )
+    assert not dependency_cache.installed_only("", "hud_controller")
+
+
+def test_satisfied_dependencies_of_other_processes_are_kept():
+    path = settings.cache_dir / "dependencies.json"
+    dependency_cache.record_satisfied("image-1", "deps-1")
+
+    # another shard of the job records an image after this process loaded the cache
+    save_json(path.name, {**json.loads(path.read_text()), "image-2": ["deps-2"]})
+
+    dependency_cache.record_satisfied("image-1", "deps-3")
+    assert json.loads(path.read_text()) == {"image-1": ["deps-1", "deps-3"], "image-2": ["deps-2"]}
+    assert dependency_cache.is_satisfied("image-2", "deps-2")
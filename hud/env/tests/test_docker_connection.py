@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from aiodocker import DockerError
+from aiohttp import web
+
+from hud.env import docker_connection
+from hud.env.container_pool import PooledContainer
+from hud.env.docker_connection import (
+    MAX_CONNECTIONS,
+    acquire_docker,
+    connection_stats,
+    release_docker,
+)
+from hud.env.local_docker_client import LocalDockerClient
+from hud.types import EnvironmentStatus
+from hud.utils.archive import context_paths, iter_tar
+
+
+@pytest_asyncio.fixture
+async def fake_daemon(monkeypatch):
+    """A minimal Docker API on a unix socket, recording the paths it was asked for."""
+    requests: list[str] = []
+
+    async def version(request: web.Request) -> web.Response:
+        return web.json_response({"ApiVersion": "1.43"})
+
+    async def inspect(request: web.Request) -> web.Response:
+        requests.append(request.path)
+        return web.json_response({"Id": request.match_info["id"], "State": {"Status": "running"}})
+
+    app = web.Application()
+    app.router.add_get("/version", version)
+    app.router.add_get("/v1.43/containers/{id}/json", inspect)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = Path(tmp) / "docker.sock"
+        await web.UnixSite(runner, str(socket_path)).start()
+        monkeypatch.setenv("DOCKER_HOST", f"unix://{socket_path}")
+        yield requests
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_connection_is_shared_and_reference_counted(fake_daemon):
+    first = await acquire_docker()
+    second = await acquire_docker()
+    assert first is second
+    assert first.connector.limit == MAX_CONNECTIONS
+    assert connection_stats()["refs"] == 2
+
+    await release_docker(first)
+    assert not first.session.closed
+    await release_docker(second)
+    assert first.session.closed
+    assert connection_stats() == {"refs": 0, "requests": 0}
+
+    # the next acquire opens a new connection
+    third = await acquire_docker()
+    assert third is not first
+    await release_docker(third)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_acquires_share_one_connection(fake_daemon):
+    dockers = await asyncio.gather(*(acquire_docker() for _ in range(5)))
+    assert all(docker is dockers[0] for docker in dockers)
+    assert len(docker_connection._CONNECTIONS) == 1
+    for docker in dockers:
+        await release_docker(docker)
+    assert docker_connection._CONNECTIONS == {}
+
+
+@pytest.mark.asyncio
+async def test_client_reuses_container_handle(fake_daemon):
+    client = LocalDockerClient(await acquire_docker(), "abc")
+    try:
+        for _ in range(3):
+            assert await client.get_status() == EnvironmentStatus.RUNNING
+        # one inspect per status check, and no lookups of the container itself
+        assert fake_daemon == ["/v1.43/containers/abc/json"] * 3
+        # the version is negotiated once on the first request
+        assert connection_stats()["requests"] == 4
+    finally:
+        await release_docker(client._docker)
+
+
+@pytest.mark.asyncio
+async def test_wait_until_retries_transient_docker_errors(fake_daemon, mocker):
+    client = LocalDockerClient(await acquire_docker(), "abc")
+    try:
+        mocker.patch.object(
+            LocalDockerClient,
+            "_fetch_status",
+            side_effect=[DockerError(500, "daemon busy"), EnvironmentStatus.RUNNING],
+        )
+        assert await client.wait_until(EnvironmentStatus.RUNNING, timeout=5) == (
+            EnvironmentStatus.RUNNING
+        )
+
+        mocker.patch.object(
+            LocalDockerClient, "_fetch_status", side_effect=DockerError(404, "no such container")
+        )
+        with pytest.raises(DockerError):
+            await client.wait_until(EnvironmentStatus.RUNNING, timeout=5)
+    finally:
+        await release_docker(client._docker)
+
+
+@pytest.mark.asyncio
+async def test_closing_a_pooled_client_twice_releases_it_once(fake_daemon, mocker):
+    other = await acquire_docker()
+    client = LocalDockerClient(await acquire_docker(), "abc")
+    pool = mocker.Mock(release=mocker.AsyncMock())
+    client._pool = pool
+    client._pooled = PooledContainer("abc")
+    mocker.patch.object(LocalDockerClient, "_recycle", return_value=True)
+    get_container = mocker.patch.object(LocalDockerClient, "_get_container")
+
+    await client.close()
+    await client.close()
+
+    pool.release.assert_awaited_once()
+    # the container went back to the pool, so it must not be stopped
+    get_container.assert_not_called()
+    # only the reference of the client was given back
+    assert connection_stats()["refs"] == 1
+    await release_docker(other)
+
+
+@pytest.mark.asyncio
+async def test_build_archive_is_written_off_the_event_loop(tmp_path, mocker):
+    context = tmp_path / "context"
+    context.mkdir()
+    (context / "Dockerfile").write_text("FROM python:3.11\n")
+    sent: list[bytes] = []
+    archived_in: list[threading.Thread] = []
+
+    async def build(*, fileobj, **kwargs):
+        sent.append(fileobj.read())
+        return [{"stream": "Successfully built\n"}]
+
+    @contextlib.asynccontextmanager
+    async def shared_docker():
+        docker = mocker.Mock()
+        docker.images.build = build
+        yield docker
+
+    def archive(*args):
+        archived_in.append(threading.current_thread())
+        return iter_tar(*args)
+
+    mocker.patch("hud.env.local_docker_client.shared_docker", shared_docker)
+    mocker.patch("hud.env.local_docker_client.iter_tar", side_effect=archive)
+
+    _, build_data = await LocalDockerClient.build_image(context)
+    assert sent == [b"".join(iter_tar(context, context_paths(context)))]
+    assert len(archived_in) == 1
+    assert archived_in[0] is not threading.main_thread()
+    assert build_data == {"build_output": "Successfully built\n"}
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from hud.env.docker_client import invoke_template
+from hud.env.framing import (
+    ENCODING_BINARY,
+    ENCODING_JSON,
+    FRAME_HEADER,
+    FrameError,
+    decode_frame,
+    encode_frame,
+    frame_length,
+    split_trailing_frame,
+)
+from hud.utils.config import FunctionConfig
+
+
+def test_json_frame_round_trip():
+    obj = {"observation": {"text": "hello"}, "values": [1, 2.5, None]}
+    frame = encode_frame(obj)
+    assert FRAME_HEADER.unpack_from(frame)[2] == ENCODING_JSON
+    assert frame_length(frame) == len(frame)
+    assert decode_frame(memoryview(frame)) == obj
+
+
+def test_binary_frame_round_trip():
+    png = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 10
+    obj = {"observation": {"screenshot": png, "text": None}, "stdout": b""}
+    frame = encode_frame(obj)
+    assert FRAME_HEADER.unpack_from(frame)[2] == ENCODING_BINARY
+    # the attachment is carried raw, not base64 encoded
+    assert png in frame
+    assert decode_frame(memoryview(frame)) == obj
+
+
+def test_frame_length_incomplete_and_bad_magic():
+    frame = encode_frame({"a": 1})
+    assert frame_length(frame[: FRAME_HEADER.size - 1]) is None
+    with pytest.raises(FrameError):
+        frame_length(b"XXXX" + frame[4:])
+
+
+def test_split_trailing_frame():
+    output = b"some output\n" + encode_frame({"result": b"raw"}, trailer=True)
+    parsed = split_trailing_frame(output)
+    assert parsed is not None
+    prefix, obj = parsed
+    assert prefix == b"some output\n"
+    assert obj == {"result": b"raw"}
+
+    assert split_trailing_frame(b"no frame here") is None
+    assert split_trailing_frame(b"") is None
+
+
+def test_invoke_template_output_can_be_parsed(tmp_path):
+    package_dir = tmp_path / "fake_controller"
+    package_dir.mkdir()
+    (package_dir / "__init__.py").write_text(
+        textwrap.dedent(
+            """
+            def step(actions):
+                print("took", len(actions), "actions")
+                return {"observation": {"screenshot": b"png", "text": "ok"}}
+            """
+        )
+    )
+    template = invoke_template(FunctionConfig(function="step", args=[[1, 2]]), "fake_controller")
+    completed = subprocess.run(
+        [sys.executable, "-c", template], cwd=tmp_path, capture_output=True, check=True
+    )
+
+    parsed = split_trailing_frame(completed.stdout)
+    assert parsed is not None
+    stdout, result = parsed
+    assert stdout == b"took 2 actions\n"
+    assert result == {"observation": {"screenshot": b"png", "text": "ok"}}
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiohttp import WSMsgType, web
+
+from hud.env import framing
+from hud.env.invoke_channel import InvokeChannel, InvokeChannelError, channel_url
+from hud.exceptions import HudNetworkError, HudRequestError
+from hud.utils.config import FunctionConfig
+
+
+class StandInServer:
+    """A local stand-in for the invoke channel endpoint of the HUD API."""
+
+    def __init__(self) -> None:
+        self.url = ""
+        self.connections = 0
+        self.auth: list[str | None] = []
+        self.release_slow = asyncio.Event()
+        self.drop_next = False
+        self.answers: set[asyncio.Task[None]] = set()
+
+    async def handler(self, request: web.Request) -> web.WebSocketResponse:
+        self.connections += 1
+        self.auth.append(request.headers.get("Authorization"))
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for message in ws:
+            if message.type != WSMsgType.BINARY:
+                continue
+            call = framing.decode_frame(memoryview(message.data))
+            if self.drop_next:
+                self.drop_next = False
+                await ws.close()
+                break
+            answer = asyncio.create_task(self.answer(ws, call))
+            self.answers.add(answer)
+            answer.add_done_callback(self.answers.discard)
+        return ws
+
+    async def answer(self, ws: web.WebSocketResponse, call: dict) -> None:
+        if call["function"] == "slow":
+            await self.release_slow.wait()
+        if call["function"] == "fail":
+            response = {"id": call["id"], "error": "boom", "status": 500}
+        else:
+            response = {
+                "id": call["id"],
+                "result": {"function": call["function"], "args": call["args"]},
+                "stdout": b"out",
+                "stderr": b"",
+            }
+        await ws.send_bytes(framing.encode_frame(response))
+
+
+@pytest_asyncio.fixture
+async def server():
+    stand_in = StandInServer()
+    app = web.Application()
+    app.router.add_get("/v2/environments/{env_id}/invoke_channel", stand_in.handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    stand_in.url = channel_url(f"http://127.0.0.1:{port}", "env-1")
+    yield stand_in
+    for answer in stand_in.answers:
+        answer.cancel()
+    await runner.cleanup()
+
+
+def test_channel_url():
+    assert channel_url("https://api.hud.so/hud-gym/api", "e") == (
+        "wss://api.hud.so/hud-gym/api/v2/environments/e/invoke_channel"
+    )
+    assert channel_url("http://localhost:8000", "e").startswith("ws://localhost:8000/")
+
+
+@pytest.mark.asyncio
+async def test_invokes_are_pipelined_over_one_connection(server):
+    channel = await InvokeChannel.connect(server.url, "test-key")
+    try:
+        slow = asyncio.create_task(channel.invoke(FunctionConfig(function="slow", args=[])))
+        result, stdout, stderr = await channel.invoke(FunctionConfig(function="step", args=[1]))
+        assert result == {"function": "step", "args": [1]}
+        assert (stdout, stderr) == (b"out", b"")
+        # the first call is still running while the second one already answered
+        assert not slow.done()
+
+        server.release_slow.set()
+        result, _, _ = await slow
+        assert result["function"] == "slow"
+        assert server.connections == 1
+        assert server.auth == ["Bearer test-key"]
+    finally:
+        await channel.close()
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_raised(server):
+    channel = await InvokeChannel.connect(server.url, "test-key")
+    try:
+        with pytest.raises(HudRequestError) as excinfo:
+            await channel.invoke(FunctionConfig(function="fail", args=[]))
+        assert excinfo.value.status_code == 500
+    finally:
+        await channel.close()
+
+
+@pytest.mark.asyncio
+async def test_lost_call_fails_and_next_call_reconnects(server):
+    channel = await InvokeChannel.connect(server.url, "test-key")
+    try:
+        server.drop_next = True
+        with pytest.raises(HudNetworkError):
+            await channel.invoke(FunctionConfig(function="step", args=[]))
+
+        result, _, _ = await channel.invoke(FunctionConfig(function="step", args=[2]))
+        assert result["args"] == [2]
+        assert server.connections == 2
+    finally:
+        await channel.close()
+
+
+@pytest.mark.asyncio
+async def test_missing_endpoint_raises_channel_error(server):
+    with pytest.raises(InvokeChannelError):
+        await InvokeChannel.connect(server.url.replace("invoke_channel", "missing"), "test-key")
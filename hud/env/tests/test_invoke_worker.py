@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+import textwrap
+from typing import TYPE_CHECKING
+
+import pytest
+from aiodocker.stream import Message
+
+from hud.env.docker_client import InvokeError
+from hud.env.invoke_worker import WORKER_SOURCE, InvokeWorker, InvokeWorkerError
+from hud.utils.config import FunctionConfig
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class SubprocessStream:
+    """Adapts a local subprocess to the exec stream interface used by the worker."""
+
+    def __init__(self, process: asyncio.subprocess.Process) -> None:
+        if process.stdin is None or process.stdout is None or process.stderr is None:
+            raise ValueError("the worker process must be started with pipes")
+        self._process = process
+        self._stdin = process.stdin
+        self._queue: asyncio.Queue[Message | None] = asyncio.Queue()
+        self._pumps = [
+            asyncio.create_task(self._pump(process.stdout, 1)),
+            asyncio.create_task(self._pump(process.stderr, 2)),
+        ]
+        self._open_pumps = 2
+
+    async def _pump(self, reader, stream: int) -> None:
+        while chunk := await reader.read(65536):
+            await self._queue.put(Message(stream, chunk))
+        self._open_pumps -= 1
+        if self._open_pumps == 0:
+            await self._queue.put(None)
+
+    async def read_out(self) -> Message | None:
+        return await self._queue.get()
+
+    async def write_in(self, data: bytes) -> None:
+        self._stdin.write(data)
+        await self._stdin.drain()
+
+    async def close(self) -> None:
+        self._stdin.close()
+        await self._process.wait()
+        await asyncio.gather(*self._pumps)
+
+
+async def _start_worker(tmp_path: Path, package_source: str) -> InvokeWorker:
+    package_dir = tmp_path / "fake_controller"
+    package_dir.mkdir()
+    (package_dir / "__init__.py").write_text(textwrap.dedent(package_source))
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-c",
+        WORKER_SOURCE,
+        "fake_controller",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=tmp_path,
+    )
+    return await InvokeWorker.start(SubprocessStream(process), timeout=10)
+
+
+@pytest.mark.asyncio
+async def test_worker_serves_multiple_invokes(tmp_path):
+    worker = await _start_worker(
+        tmp_path,
+        """
+        import sys
+
+        CALLS = []
+
+        def step(actions):
+            CALLS.append(actions)
+            print("stepping")
+            print("careful", file=sys.stderr)
+            return {"observation": {"text": str(len(CALLS))}}
+        """,
+    )
+    try:
+        result, stdout, stderr = await worker.invoke(FunctionConfig(function="step", args=[[]]))
+        assert result == {"observation": {"text": "1"}}
+        assert stdout == b"stepping\n"
+        assert b"careful" in stderr
+
+        # state survives between calls since the controller is only imported once
+        result, _, _ = await worker.invoke(FunctionConfig(function="step", args=[[]]))
+        assert result == {"observation": {"text": "2"}}
+    finally:
+        await worker.close()
+
+
+@pytest.mark.asyncio
+async def test_worker_reports_function_errors(tmp_path):
+    worker = await _start_worker(
+        tmp_path,
+        """
+        def fail():
+            raise RuntimeError("boom")
+
+        def ok():
+            return 1
+        """,
+    )
+    try:
+        with pytest.raises(InvokeError) as excinfo:
+            await worker.invoke(FunctionConfig(function="fail", args=[]))
+        assert b"boom" in excinfo.value.args[1]
+
+        # the worker keeps serving after a failed call
+        result, _, _ = await worker.invoke(FunctionConfig(function="ok", args=[]))
+        assert result == 1
+    finally:
+        await worker.close()
+
+
+@pytest.mark.asyncio
+async def test_worker_start_fails_on_import_error(tmp_path):
+    with pytest.raises(InvokeWorkerError, match="ModuleNotFoundError"):
+        await _start_worker(tmp_path, "import not_a_real_module\n")
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from hud.env import source_watcher
+from hud.env.source_watcher import SourceManifest, SourceWatcher
+
+
+@pytest.fixture
+def source(tmp_path):
+    root = tmp_path / "source"
+    (root / "pkg").mkdir(parents=True)
+    (root / "pyproject.toml").write_text("[project]\nname = 'hud_controller'\n")
+    (root / "pkg" / "step.py").write_text("def step(): pass\n")
+    return root
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_manifest_diff(source):
+    before = SourceManifest.build(source)
+    assert set(before.files) == {"pyproject.toml", "pkg/step.py"}
+
+    (source / "pkg" / "step.py").write_text("def step(): return 1\n")
+    (source / "pkg" / "new.py").write_text("x = 1\n")
+    (source / "pyproject.toml").unlink()
+    after = SourceManifest.build(source, before)
+
+    changes = after.diff(before)
+    assert changes.added == ["pkg/new.py"]
+    assert changes.modified == ["pkg/step.py"]
+    assert changes.deleted == ["pyproject.toml"]
+    assert not after.diff(after)
+
+
+def test_manifest_reuses_hashes_of_unchanged_files(source, mocker):
+    before = SourceManifest.build(source)
+    hash_file = mocker.spy(source_watcher, "_hash_file")
+    (source / "pkg" / "other.py").write_text("y = 2\n")
+    SourceManifest.build(source, before)
+    assert hash_file.call_count == 1
+
+
+@pytest.mark.parametrize("platform", ["linux", "darwin"])
+def test_watcher_detects_changes(source, monkeypatch, platform):
+    monkeypatch.setattr(source_watcher.sys, "platform", platform)
+    monkeypatch.setattr(source_watcher, "POLL_INTERVAL", 0.05)
+    watcher = SourceWatcher(source)
+    try:
+        assert (watcher._inotify is not None) == (platform == "linux")
+        generation = watcher.generation
+        (source / "pkg" / "step.py").write_text("def step(): return 2\n")
+        assert _wait_for(lambda: watcher.generation != generation)
+
+        # files in directories created after the watch started are picked up too
+        (source / "pkg" / "sub").mkdir()
+        time.sleep(0.2)
+        generation = watcher.generation
+        (source / "pkg" / "sub" / "deep.py").write_text("z = 3\n")
+        assert _wait_for(lambda: watcher.generation != generation)
+    finally:
+        watcher.close()
+
+
+def test_watcher_manifest_is_cached_per_generation(source):
+    watcher = SourceWatcher(source)
+    try:
+        manifest = watcher.manifest()
+        assert watcher.manifest() is manifest
+        assert source_watcher._manifest_cache_path(watcher.root).exists()
+
+        watcher.mark_dirty()
+        assert watcher.manifest() is not manifest
+    finally:
+        watcher.close()
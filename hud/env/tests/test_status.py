@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from hud.env import status as status_module
+from hud.env.remote_client import RemoteClient
+from hud.env.status import fetch_remote_status, parse_remote_state, wait_for_status
+from hud.exceptions import HudNetworkError, HudRequestError, HudTimeoutError
+from hud.types import EnvironmentStatus
+
+if TYPE_CHECKING:
+    import pytest_mock
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(status_module, "MIN_POLL_INTERVAL", 0.001)
+    monkeypatch.setattr(status_module, "MAX_POLL_INTERVAL", 0.01)
+
+
+def scripted_poll(*results: EnvironmentStatus | Exception):
+    calls: list[tuple[EnvironmentStatus, float]] = []
+    remaining = list(results)
+
+    async def poll(status: EnvironmentStatus, wait: float) -> EnvironmentStatus:
+        calls.append((status, wait))
+        result = remaining.pop(0) if len(remaining) > 1 else remaining[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return poll, calls
+
+
+def test_parse_remote_state():
+    assert parse_remote_state({"state": "Running"}) == EnvironmentStatus.RUNNING
+    assert parse_remote_state({"state": "pending"}) == EnvironmentStatus.INITIALIZING
+    assert parse_remote_state({"state": "terminated"}) == EnvironmentStatus.COMPLETED
+    assert parse_remote_state({}) == EnvironmentStatus.ERROR
+
+
+@pytest.mark.asyncio
+async def test_wait_retries_transient_errors_until_running():
+    poll, calls = scripted_poll(
+        EnvironmentStatus.INITIALIZING,
+        HudNetworkError("connection reset"),
+        HudRequestError("unavailable", status_code=503),
+        EnvironmentStatus.RUNNING,
+    )
+    reached = await wait_for_status(poll, EnvironmentStatus.RUNNING, timeout=5)
+    assert reached == EnvironmentStatus.RUNNING
+    assert len(calls) == 4
+    # without long-polling the server is never asked to hold the request
+    assert all(wait == 0 for _, wait in calls)
+
+
+@pytest.mark.asyncio
+async def test_wait_stops_at_terminal_status():
+    poll, _ = scripted_poll(EnvironmentStatus.INITIALIZING, EnvironmentStatus.ERROR)
+    assert await wait_for_status(poll, EnvironmentStatus.RUNNING) == EnvironmentStatus.ERROR
+
+
+@pytest.mark.asyncio
+async def test_wait_raises_client_errors():
+    poll, _ = scripted_poll(HudRequestError("not found", status_code=404))
+    with pytest.raises(HudRequestError):
+        await wait_for_status(poll, EnvironmentStatus.RUNNING, timeout=5)
+
+
+@pytest.mark.asyncio
+async def test_wait_times_out():
+    poll, _ = scripted_poll(EnvironmentStatus.INITIALIZING)
+    with pytest.raises(HudTimeoutError):
+        await wait_for_status(poll, EnvironmentStatus.RUNNING, timeout=0.05)
+
+
+@pytest.mark.asyncio
+async def test_long_poll_wait_is_capped_by_timeout():
+    poll, calls = scripted_poll(EnvironmentStatus.RUNNING)
+    await wait_for_status(poll, EnvironmentStatus.RUNNING, timeout=3, long_poll=True)
+    assert calls[0][0] == EnvironmentStatus.RUNNING
+    assert 0 < calls[0][1] <= 3
+
+
+@pytest.mark.asyncio
+async def test_fetch_remote_status_sends_long_poll_parameters(mocker: pytest_mock.MockerFixture):
+    mock_request = mocker.patch("hud.env.status.make_request", return_value={"state": "running"})
+    status = await fetch_remote_status("env-1", EnvironmentStatus.RUNNING, 20.0)
+    assert status == EnvironmentStatus.RUNNING
+    assert mock_request.call_args.kwargs["url"].endswith(
+        "/v2/environments/env-1/state?wait_for=running&wait=20"
+    )
+
+
+@pytest.mark.asyncio
+async def test_remote_client_records_startup_latency(mocker: pytest_mock.MockerFixture):
+    mocker.patch("hud.env.remote_client.supports", return_value=True)
+    mocker.patch(
+        "hud.env.status.make_request",
+        side_effect=[{"state": "pending"}, {"state": "running"}],
+    )
+    client = RemoteClient("env-1")
+    assert client.startup_latency is None
+
+    assert await client.wait_until(EnvironmentStatus.RUNNING, timeout=5) == (
+        EnvironmentStatus.RUNNING
+    )
+    assert client.startup_latency is not None
+    assert client.startup_latency >= 0
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import hashlib
+from typing import TYPE_CHECKING
+
+import httpx
+import pytest
+
+from hud.env import upload
+from hud.env.upload import content_md5, iter_parts, multipart_upload
+from hud.server.retry import RetryPolicy
+
+if TYPE_CHECKING:
+    import pytest_mock
+
+
+class StandInStorage:
+    """Object storage accepting presigned part uploads, failing some attempts."""
+
+    def __init__(self, fail_first: set[str] | None = None) -> None:
+        self.fail_first = fail_first or set()
+        self.parts: dict[str, bytes] = {}
+        self.attempts: dict[str, int] = {}
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        name = request.url.path
+        self.attempts[name] = self.attempts.get(name, 0) + 1
+        if name == "/forbidden":
+            return httpx.Response(403)
+        if name in self.fail_first and self.attempts[name] == 1:
+            return httpx.Response(503)
+        body = request.read()
+        assert request.headers["Content-MD5"] == content_md5(body)
+        self.parts[name] = body
+        return httpx.Response(200, headers={"ETag": f'"{name}"'})
+
+
+@pytest.fixture
+def storage(monkeypatch: pytest.MonkeyPatch):
+    stand_in = StandInStorage(fail_first={"/part-2"})
+    client = httpx.AsyncClient(transport=httpx.MockTransport(stand_in.handler))
+    monkeypatch.setattr(upload, "get_shared_client", lambda: client)
+    monkeypatch.setattr(
+        upload,
+        "UPLOAD_RETRY_POLICY",
+        RetryPolicy(max_retries=2, base_delay=0.001, circuit_breaker=None, budget=None),
+    )
+    return stand_in
+
+
+def test_iter_parts():
+    chunks = [b"abc", b"defgh", b"", b"ij"]
+    assert list(iter_parts(chunks, 4)) == [b"abcd", b"efgh", b"ij"]
+    assert list(iter_parts([b"abcd"], 4)) == [b"abcd"]
+
+
+@pytest.mark.asyncio
+async def test_multipart_upload_retries_failed_parts(
+    mocker: pytest_mock.MockerFixture, storage: StandInStorage
+):
+    async def api(*, method: str, url: str, json=None, **_):
+        if url.endswith("/multipart"):
+            return {"upload_id": "up-1"}
+        if url.endswith("/multipart/parts"):
+            assert json is not None
+            return {"url": f"https://storage.test/part-{json['part_number']}"}
+        return {"ok": True}
+
+    mock_request = mocker.patch("hud.env.upload.make_request", side_effect=api)
+    progress: list[int] = []
+    chunks = [b"x" * 3, b"y" * 3, b"z" * 3]
+
+    result = await multipart_upload(
+        "build-1", iter(chunks), part_size=4, progress=lambda done, _: progress.append(done)
+    )
+
+    assert result == {"ok": True}
+    assert b"".join(storage.parts[f"/part-{n}"] for n in (1, 2, 3)) == b"".join(chunks)
+    # only the failed part was sent again
+    assert storage.attempts == {"/part-1": 1, "/part-2": 2, "/part-3": 1}
+    assert sorted(progress)[-1] == 9
+
+    complete = mock_request.call_args_list[-1].kwargs
+    assert complete["url"].endswith("/v2/builds/build-1/multipart/complete")
+    assert complete["json"]["parts"] == [
+        {"part_number": n, "etag": f'"/part-{n}"'} for n in (1, 2, 3)
+    ]
+    assert complete["json"]["size"] == 9
+    assert complete["json"]["sha256"] == hashlib.sha256(b"".join(chunks)).hexdigest()
+
+
+@pytest.mark.asyncio
+async def test_multipart_upload_aborts_on_failure(
+    mocker: pytest_mock.MockerFixture, storage: StandInStorage
+):
+    async def api(*, method: str, url: str, json=None, **_):
+        if url.endswith("/multipart"):
+            return {"upload_id": "up-1"}
+        if url.endswith("/multipart/parts"):
+            # presigned URL pointing at a part the storage refuses
+            return {"url": "https://storage.test/forbidden"}
+        return {}
+
+    mock_request = mocker.patch("hud.env.upload.make_request", side_effect=api)
+
+    with pytest.raises(upload.HudResponseError):
+        await multipart_upload("build-1", iter([b"data"]), part_size=4)
+    assert mock_request.call_args_list[-1].kwargs["url"].endswith("/multipart/abort")
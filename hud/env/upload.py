@@ -0,0 +1,285 @@
+"""
+Uploads of build contexts to the HUD API.
+
+Build contexts are uploaded to presigned URLs. When the server advertises `MULTIPART_UPLOAD`,
+the zip archive is uploaded in parts while it is being written: parts are cut from the
+archiver's output as it is produced, a few are uploaded at once, and a failed part is retried
+on its own instead of restarting the whole upload. Only the parts in flight are held in
+memory. Every part carries a `Content-MD5` header so the storage rejects corrupted parts, and
+the SHA-256 of the whole archive is sent when the upload is completed.
+
+Older servers take the archive in a single PUT, which is retried from the start of the file.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import logging
+from typing import IO, TYPE_CHECKING, Any
+
+import httpx
+
+from hud.exceptions import HudResponseError
+from hud.server import get_shared_client, make_request
+from hud.server.retry import RetryPolicy
+from hud.settings import settings
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Callable, Iterable, Iterator
+
+    # called with the bytes uploaded so far and the total, if known
+    ProgressCallback = Callable[[int, int | None], None]
+
+logger = logging.getLogger("hud.env.upload")
+
+# Size of the parts of a multipart upload, object stores require at least 5 MiB.
+PART_SIZE = 8 * 1024 * 1024
+# Parts uploaded at once, and so held in memory at once.
+PART_CONCURRENCY = 4
+
+_UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Uploads go to object storage rather than the HUD API, so they keep their own retry state.
+UPLOAD_RETRY_POLICY = RetryPolicy(
+    max_retries=5, base_delay=1.0, max_delay=20.0, circuit_breaker=None, budget=None
+)
+
+
+def content_md5(data: bytes) -> str:
+    """
+    Get the value of the `Content-MD5` header for a body.
+
+    Args:
+        data: The body
+
+    Returns:
+        str: The base64 encoded MD5 digest of the body
+    """
+    return base64.b64encode(hashlib.md5(data).digest()).decode()  # noqa: S324
+
+
+async def _put(
+    url: str,
+    content: Callable[[], bytes | AsyncIterator[bytes]],
+    headers: dict[str, str],
+) -> httpx.Response:
+    """PUT a body to a presigned URL, retrying transient failures with a fresh body."""
+    client = get_shared_client()
+    host = httpx.URL(url).host
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            response = await client.put(url, content=content(), headers=headers)
+        except httpx.TimeoutException as e:
+            raise HudResponseError(message=f"Timed out uploading to presigned URL: {e}") from e
+        except httpx.RequestError as e:
+            delay = UPLOAD_RETRY_POLICY.on_network_error(host, attempt)
+            if delay is None:
+                logger.exception("Network error uploading to presigned URL")
+                raise HudResponseError(
+                    message=f"Network error uploading to presigned URL: {e}"
+                ) from e
+            logger.debug("Upload attempt %d failed (%s), retrying in %.2fs", attempt, e, delay)
+            await asyncio.sleep(delay)
+            continue
+
+        delay = UPLOAD_RETRY_POLICY.on_response(host, attempt, response)
+        if delay is not None:
+            logger.debug(
+                "Upload attempt %d got status %d, retrying in %.2fs",
+                attempt,
+                response.status_code,
+                delay,
+            )
+            await asyncio.sleep(delay)
+            continue
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            logger.exception("Failed to upload to presigned URL")
+            raise HudResponseError(message=f"Failed to upload to presigned URL: {e}") from e
+        return response
+
+
+async def upload_bytes_to_presigned_url(presigned_url: str, data_bytes: bytes) -> None:
+    """
+    Upload bytes to a presigned URL.
+
+    Args:
+        presigned_url: The URL to PUT the bytes to
+        data_bytes: The bytes to upload
+
+    Raises:
+        HudResponseError: If the upload fails
+    """
+    await _put(presigned_url, lambda: data_bytes, {"Content-MD5": content_md5(data_bytes)})
+
+
+async def upload_file_to_presigned_url(
+    presigned_url: str,
+    fileobj: IO[bytes],
+    size: int,
+    *,
+    md5: str | None = None,
+    progress: ProgressCallback | None = None,
+) -> None:
+    """
+    Upload a file to a presigned URL, streaming it in chunks.
+
+    Args:
+        presigned_url: The URL to PUT the file to
+        fileobj: The file, positioned at the start of the data; it is rewound for retries
+        size: The number of bytes to upload, sent as the content length
+        md5: The `Content-MD5` of the file, see `content_md5`
+        progress: Called as chunks are sent
+
+    Raises:
+        HudResponseError: If the upload fails
+    """
+    start = fileobj.tell()
+
+    async def chunks() -> AsyncIterator[bytes]:
+        await asyncio.to_thread(fileobj.seek, start)
+        sent = 0
+        while chunk := await asyncio.to_thread(fileobj.read, _UPLOAD_CHUNK_SIZE):
+            sent += len(chunk)
+            if progress is not None:
+                progress(sent, size)
+            yield chunk
+
+    # presigned URLs do not accept chunked uploads, so the length is sent up front
+    headers = {"Content-Length": str(size)}
+    if md5 is not None:
+        headers["Content-MD5"] = md5
+    await _put(presigned_url, chunks, headers)
+
+
+def iter_parts(chunks: Iterable[bytes], part_size: int = PART_SIZE) -> Iterator[bytes]:
+    """
+    Regroup a stream of chunks into parts of a fixed size.
+
+    Args:
+        chunks: The chunks of the stream
+        part_size: The size of every part but the last
+
+    Yields:
+        bytes: Consecutive parts of the stream, the last one possibly shorter
+    """
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= part_size:
+            yield bytes(buffer[:part_size])
+            del buffer[:part_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def multipart_upload(
+    build_id: str,
+    chunks: Iterable[bytes],
+    *,
+    part_size: int = PART_SIZE,
+    concurrency: int = PART_CONCURRENCY,
+    progress: ProgressCallback | None = None,
+) -> dict[str, Any]:
+    """
+    Upload the build context of a build in parts, reading the archive lazily.
+
+    Args:
+        build_id: The ID of the build, from `/v2/builds`
+        chunks: The chunks of the archive, produced synchronously, e.g. by `iter_zip`
+        part_size: The size of the parts
+        concurrency: The number of parts uploaded at once
+        progress: Called after every part with the bytes uploaded so far
+
+    Returns:
+        dict[str, Any]: The response of the server to the completed upload
+
+    Raises:
+        HudResponseError: If a part could not be uploaded
+    """
+    build_url = f"{settings.base_url}/v2/builds/{build_id}"
+    upload = await make_request(
+        method="POST", url=f"{build_url}/multipart", api_key=settings.api_key
+    )
+    upload_id = upload["upload_id"]
+
+    semaphore = asyncio.Semaphore(concurrency)
+    etags: dict[int, str] = {}
+    uploads: list[asyncio.Task[None]] = []
+    sha256 = hashlib.sha256()
+    total = 0
+    uploaded = 0
+
+    async def upload_part(part_number: int, part: bytes) -> None:
+        nonlocal uploaded
+        try:
+            md5 = content_md5(part)
+            target = await make_request(
+                method="POST",
+                url=f"{build_url}/multipart/parts",
+                json={"upload_id": upload_id, "part_number": part_number, "content_md5": md5},
+                api_key=settings.api_key,
+            )
+            response = await _put(target["url"], lambda: part, {"Content-MD5": md5})
+            etags[part_number] = response.headers.get("ETag", "")
+            uploaded += len(part)
+            logger.debug("Uploaded part %d (%d bytes)", part_number, len(part))
+            if progress is not None:
+                progress(uploaded, None)
+        finally:
+            semaphore.release()
+
+    parts = iter_parts(chunks, part_size)
+    try:
+        part_number = 0
+        while True:
+            # wait for a free slot before reading, so at most `concurrency` parts are in memory
+            await semaphore.acquire()
+            part = await asyncio.to_thread(next, parts, None)
+            if part is None:
+                semaphore.release()
+                break
+            part_number += 1
+            total += len(part)
+            sha256.update(part)
+            uploads.append(asyncio.create_task(upload_part(part_number, part)))
+            # stop reading early if a part has already failed
+            for task in uploads:
+                if task.done() and task.exception() is not None:
+                    raise task.exception()  # type: ignore[misc]
+        await asyncio.gather(*uploads)
+
+        logger.info("Uploaded %d parts, %d kb", part_number, total // 1024)
+        return await make_request(
+            method="POST",
+            url=f"{build_url}/multipart/complete",
+            json={
+                "upload_id": upload_id,
+                "parts": [
+                    {"part_number": number, "etag": etags[number]} for number in sorted(etags)
+                ],
+                "size": total,
+                "sha256": sha256.hexdigest(),
+            },
+            api_key=settings.api_key,
+        )
+    except BaseException:
+        for task in uploads:
+            task.cancel()
+        await asyncio.gather(*uploads, return_exceptions=True)
+        try:
+            await make_request(
+                method="POST",
+                url=f"{build_url}/multipart/abort",
+                json={"upload_id": upload_id},
+                api_key=settings.api_key,
+                max_retries=0,
+            )
+        except Exception as e:
+            logger.debug("Could not abort multipart upload %s: %s", upload_id, e)
+        raise
@@ -167,8 +167,17 @@ class HudNetworkError(HudException):
     """
 
 
+class HudCircuitOpenError(HudNetworkError):
+    """Raised when a request is refused because the circuit for its route is open.
+
+    This exception is raised without contacting the server after repeated
+    failures, until the circuit breaker lets a trial request through.
+    """
+
+
 class GymMakeException(HudException):
     """Raised when environment creation or setup fails, includes context data."""
+
     def __init__(self, message: str, data: dict[str, Any]) -> None:
         super().__init__(message)
         self.data = data
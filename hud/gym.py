@@ -1,23 +1,125 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import copy
 import logging
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
+from hud.env import build_cache
 from hud.env.environment import Environment
 from hud.env.local_docker_client import LocalDockerClient
-from hud.env.remote_client import RemoteClient
+from hud.env.remote_client import RemoteClient, create_environments
 from hud.env.remote_docker_client import RemoteDockerClient
-from hud.exceptions import GymMakeException
-from hud.types import CustomGym, Gym
+from hud.exceptions import GymMakeException, HudException, HudResponseError
+from hud.server import BATCH_CREATE, supports
+from hud.types import CustomGym, EnvironmentStatus, Gym
 from hud.utils.common import get_gym_id
 
 if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Iterable
+
+    from hud.env.client import Client
+    from hud.env.docker_client import DockerClient
     from hud.job import Job
     from hud.task import Task
 
 logger = logging.getLogger("hud.gym")
 
+# Maximum number of environments requested from the HUD API in one batch.
+CREATE_BATCH_SIZE = 50
+# Seconds an environment may take to start running before it is given up on.
+START_TIMEOUT = 600.0
+
+
+def _effective_job_id(job: Job | None, job_id: str | None) -> str | None:
+    """Get the ID of the job to associate environments with, from the arguments or context."""
+    if job is not None:
+        return job.id
+    if job_id is not None:
+        return job_id
+    # Try to get an active job from the decorator context
+    try:
+        import hud.job
+
+        active_job = hud.job.get_active_job()
+        if active_job:
+            return active_job.id
+    except ImportError:
+        pass  # Module not available, skip
+    return None
+
+
+async def _resolve_image(gym: CustomGym) -> tuple[str, dict[str, Any]]:
+    """Get the image uri of a custom gym, building its build context if needed."""
+    if isinstance(gym.image_or_build_context, str):
+        return gym.image_or_build_context, {}
+    if isinstance(gym.image_or_build_context, Path):
+        # need to build the image, unless this build context was built before
+        if gym.location == "local":
+            return await build_cache.get_or_build(
+                "local",
+                gym.image_or_build_context,
+                LocalDockerClient.build_image,
+                exists=LocalDockerClient.image_exists,
+            )
+        if gym.location == "remote":
+            return await build_cache.get_or_build(
+                "remote", gym.image_or_build_context, RemoteDockerClient.build_image
+            )
+        raise ValueError(f"Invalid environment location: {gym.location}")
+    raise ValueError(f"Invalid image or build context: {gym.image_or_build_context}")
+
+
+async def _create_docker_client(
+    gym: CustomGym,
+    uri: str,
+    *,
+    job_id: str | None,
+    task: Task | None,
+    metadata: dict[str, Any],
+) -> DockerClient:
+    """Create the client of a custom gym from its image."""
+    if gym.location == "local":
+        logger.info("Creating local environment")
+        return await LocalDockerClient.create(uri)
+    if gym.location == "remote":
+        logger.info("Creating remote environment")
+        return await RemoteDockerClient.create(
+            image_uri=uri,
+            job_id=job_id,
+            task_id=task.id if task else None,
+            metadata=metadata,
+        )
+    raise ValueError(f"Invalid environment location: {gym.location}")
+
+
+async def _forget_cached_image(gym: CustomGym, build_data: dict[str, Any]) -> bool:
+    """
+    Forget the cached image of a custom gym, after an environment could not be created from
+    it. Returns True if there was a cached image to forget.
+    """
+    if not build_data.get("cached") or not isinstance(gym.image_or_build_context, Path):
+        return False
+    await build_cache.invalidate(gym.location, gym.image_or_build_context)
+    return True
+
+
+async def _finish(
+    client: Client, metadata: dict[str, Any], task: Task | None, build_data: dict[str, Any]
+) -> Environment:
+    """Wrap a client in an environment and run the task setup, if any."""
+    if isinstance(client, RemoteClient | RemoteDockerClient):
+        # remote environments may still be provisioning when they are created
+        status = await client.wait_until(EnvironmentStatus.RUNNING, timeout=START_TIMEOUT)
+        if status != EnvironmentStatus.RUNNING:
+            raise HudException(f"Environment is {status.value} instead of running")
+    environment = Environment(client=client, metadata=metadata, task=task, build_data=build_data)
+    if task:
+        await environment._setup()
+    return environment
+
 
 async def make(
     env_src: Gym | Task,
@@ -44,22 +146,7 @@ async def make(
         if metadata is None:
             metadata = {}
 
-        # Handle job parameter
-        effective_job_id = None
-        if job is not None:
-            effective_job_id = job.id
-        elif job_id is not None:
-            effective_job_id = job_id
-        else:
-            # Try to get an active job from the decorator context
-            try:
-                import hud.job
-
-                active_job = hud.job.get_active_job()
-                if active_job:
-                    effective_job_id = active_job.id
-            except ImportError:
-                pass  # Module not available, skip
+        effective_job_id = _effective_job_id(job, job_id)
 
         gym = None
         task = None
@@ -70,32 +157,20 @@ async def make(
             task = env_src
 
         if isinstance(gym, CustomGym):
-            if isinstance(gym.image_or_build_context, str):
-                uri = gym.image_or_build_context
-            elif isinstance(gym.image_or_build_context, Path):
-                # need to build the image
-                if gym.location == "local":
-                    uri, build_data = await LocalDockerClient.build_image(gym.image_or_build_context)
-                elif gym.location == "remote":
-                    uri, build_data = await RemoteDockerClient.build_image(gym.image_or_build_context)
-                else:
-                    raise ValueError(f"Invalid environment location: {gym.location}")
-            else:
-                raise ValueError(f"Invalid image or build context: {gym.image_or_build_context}")
-
-            if gym.location == "local":
-                logger.info("Creating local environment")
-                client = await LocalDockerClient.create(uri)
-            elif gym.location == "remote":
-                logger.info("Creating remote environment")
-                client = await RemoteDockerClient.create(
-                    image_uri=uri,
-                    job_id=effective_job_id,
-                    task_id=task.id if task else None,
-                    metadata=metadata,
+            uri, build_data = await _resolve_image(gym)
+            try:
+                client = await _create_docker_client(
+                    gym, uri, job_id=effective_job_id, task=task, metadata=metadata
+                )
+            except Exception:
+                # the cached image may have been deleted since it was built, so build it again
+                if not await _forget_cached_image(gym, build_data):
+                    raise
+                logger.info("Could not create environment from cached image %s, rebuilding", uri)
+                uri, build_data = await _resolve_image(gym)
+                client = await _create_docker_client(
+                    gym, uri, job_id=effective_job_id, task=task, metadata=metadata
                 )
-            else:
-                raise ValueError(f"Invalid environment location: {gym.location}")
 
             # Set up the environment with a source path
             if isinstance(gym.image_or_build_context, Path):
@@ -119,11 +194,176 @@ async def make(
             raise ValueError(f"Invalid gym source: {gym}")
 
         # Create the environment itself
-        environment = Environment(client=client, metadata=metadata, task=task, build_data=build_data)
-
-        if task:
-            await environment._setup()
-        return environment
+        return await _finish(client, metadata, task, build_data)
     except Exception as e:
         build_data["exception"] = str(e)
         raise GymMakeException("Failed to create environment", build_data) from e
+
+
+async def make_many(
+    tasks: Iterable[Task],
+    *,
+    job: Job | None = None,
+    job_id: str | None = None,
+    metadata: dict[str, Any] | None = None,
+    max_concurrency: int = 30,
+) -> AsyncIterator[tuple[Task, Environment | GymMakeException]]:
+    """
+    Create environments for many tasks, yielding each one as soon as it is ready.
+
+    Tasks are grouped by gym, so gym ids and images are resolved once per gym. When the server
+    supports it, remote environments are created with batched requests of up to
+    `CREATE_BATCH_SIZE` environments; other environments are created with `make`.
+
+    A task whose environment could not be created is yielded with its `GymMakeException`
+    instead of an environment, so one failure does not stop the others. Environments that were
+    created but not yet yielded are closed when the generator is closed early, so prefer
+    iterating inside `contextlib.aclosing`.
+
+    Args:
+        tasks: Tasks to create environments for
+        job: Job object to associate with the environments
+        job_id: ID of job to associate with the environments (deprecated, use job instead)
+        metadata: Additional metadata for every environment
+        max_concurrency: Maximum number of environments being created or set up at once
+
+    Yields:
+        tuple[Task, Environment | GymMakeException]: A task and its environment, or the error
+    """
+    tasks = list(tasks)
+    effective_job_id = _effective_job_id(job, job_id)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    ready: asyncio.Queue[tuple[Task, Environment | GymMakeException]] = asyncio.Queue()
+    workers: list[asyncio.Task[None]] = []
+
+    def fail(task: Task, error: Exception, build_data: dict[str, Any]) -> None:
+        build_data = {**build_data, "exception": str(error)}
+        exception = GymMakeException("Failed to create environment", build_data)
+        exception.__cause__ = error
+        ready.put_nowait((task, exception))
+
+    async def make_one(task: Task) -> None:
+        async with semaphore:
+            try:
+                environment = await make(
+                    task, job_id=effective_job_id, metadata=copy.deepcopy(metadata)
+                )
+            except GymMakeException as e:
+                ready.put_nowait((task, e))
+                return
+        ready.put_nowait((task, environment))
+
+    async def set_up(
+        task: Task, client: Client, task_metadata: dict[str, Any], build_data: dict[str, Any]
+    ) -> None:
+        async with semaphore:
+            try:
+                environment = await _finish(client, task_metadata, task, build_data)
+            except Exception as e:
+                with contextlib.suppress(Exception):
+                    await client.close()
+                fail(task, e, build_data)
+                return
+            except asyncio.CancelledError:
+                with contextlib.suppress(Exception):
+                    await client.close()
+                raise
+        ready.put_nowait((task, environment))
+
+    async def make_batch(gym: str | CustomGym, group: list[Task]) -> None:
+        build_data: dict[str, Any] = {}
+        image_uri: str | None = None
+        try:
+            if isinstance(gym, str):
+                gym_id = await get_gym_id(gym)
+            else:
+                image_uri, build_data = await _resolve_image(gym)
+                gym_id = await get_gym_id("docker")
+        except Exception as e:
+            for task in group:
+                fail(task, e, build_data)
+            return
+
+        for start in range(0, len(group), CREATE_BATCH_SIZE):
+            chunk = group[start : start + CREATE_BATCH_SIZE]
+            chunk_metadata = [copy.deepcopy(metadata) if metadata else {} for _ in chunk]
+            requests = []
+            for task, task_metadata in zip(chunk, chunk_metadata, strict=True):
+                if image_uri is not None:
+                    task_metadata.setdefault("environment_config", {})["image_uri"] = image_uri
+                requests.append(
+                    {
+                        # still named run_id for backwards compatibility
+                        "run_id": effective_job_id,
+                        "metadata": task_metadata,
+                        "gym_id": gym_id,
+                        "task_id": task.id,
+                    }
+                )
+
+            logger.info("Creating %d remote environments", len(chunk))
+            try:
+                responses = await create_environments(requests)
+            except Exception as e:
+                if not isinstance(gym, str):
+                    await _forget_cached_image(gym, build_data)
+                for task in chunk:
+                    fail(task, e, build_data)
+                continue
+
+            for task, task_metadata, response in zip(chunk, chunk_metadata, responses, strict=True):
+                try:
+                    if "error" in response:
+                        if not isinstance(gym, str):
+                            # the next make of this gym builds the image again
+                            await _forget_cached_image(gym, build_data)
+                        raise HudResponseError(
+                            message=f"Failed to create remote environment: {response['error']}",
+                            response_json=response,
+                        )
+                    if isinstance(gym, str):
+                        client, env_build_data = RemoteClient.from_create_response(
+                            response, gym_id=gym
+                        )
+                    else:
+                        if image_uri is None:
+                            raise ValueError(f"No image resolved for gym: {gym}")
+                        client = RemoteDockerClient.from_create_response(
+                            response, image_uri=image_uri
+                        )
+                        if isinstance(gym.image_or_build_context, Path):
+                            client.set_source_path(gym.image_or_build_context)
+                        env_build_data = build_data
+                except Exception as e:
+                    fail(task, e, build_data)
+                    continue
+                workers.append(
+                    asyncio.create_task(set_up(task, client, task_metadata, env_build_data))
+                )
+
+    groups: dict[tuple[str, str], tuple[str | CustomGym, list[Task]]] = {}
+    batched = await supports(BATCH_CREATE)
+    for task in tasks:
+        gym = task.gym
+        if batched and isinstance(gym, str):
+            groups.setdefault(("gym", gym), (gym, []))[1].append(task)
+        elif batched and isinstance(gym, CustomGym) and gym.location == "remote":
+            groups.setdefault(("custom", gym.model_dump_json()), (gym, []))[1].append(task)
+        else:
+            workers.append(asyncio.create_task(make_one(task)))
+    for gym, group in groups.values():
+        workers.append(asyncio.create_task(make_batch(gym, group)))
+
+    try:
+        for _ in range(len(tasks)):
+            yield await ready.get()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # close environments that were made but never handed to the caller
+        while not ready.empty():
+            _, result = ready.get_nowait()
+            if isinstance(result, Environment):
+                with contextlib.suppress(Exception):
+                    await result.close()
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import datetime
 import functools
 import inspect
+import itertools
 import logging
+import math
+import multiprocessing
+import queue
 import sys
-from collections.abc import Callable, Coroutine
+from collections.abc import AsyncIterable, Callable, Iterable, Sequence, Sized
 from typing import TYPE_CHECKING, Any, TypeVar, cast
 
 from pydantic import BaseModel, PrivateAttr, TypeAdapter
@@ -17,11 +22,27 @@ from hud.settings import settings
 from hud.task import Task
 from hud.taskset import TaskSet
 from hud.trajectory import Trajectory
+from hud.utils.checkpoint import (
+    COMPLETED,
+    ERROR,
+    PENDING,
+    RUNNING,
+    CheckpointLog,
+    checkpoint_path,
+    discard_if_completed,
+    load_job_checkpoint,
+)
+from hud.utils.concurrency import AdaptiveLimiter
 from hud.utils.progress import StepProgressTracker
+from hud.utils.scheduler import aiter_items, run_worker_pool
 
 if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Awaitable, Collection
+    from multiprocessing.queues import Queue as ProcessQueue
+
     from hud.adapters.common import Adapter
     from hud.agent.base import Agent
+    from hud.env.environment import Environment
 
 logger = logging.getLogger("hud.job")
 
@@ -31,6 +52,11 @@ T = TypeVar("T", bound=Callable)
 # Global registry to store active jobs created by decorators
 _ACTIVE_JOBS = {}
 
+# Concurrency of run_job for tasks that cannot be counted when no limit is given
+DEFAULT_STREAM_CONCURRENCY = 30
+# Seconds a worker process of run_job is given to exit before it is killed
+SHARD_EXIT_TIMEOUT = 10.0
+
 
 class Job(BaseModel):
     """
@@ -49,6 +75,46 @@ class Job(BaseModel):
     _trajectories: list[Trajectory] | None = PrivateAttr(default=None)
     # Store execution errors for debugging
     errors: list[dict[str, Any]] = []
+    # Adaptive concurrency limits of run_job, by stage
+    _limiters: dict[str, AdaptiveLimiter] = PrivateAttr(default_factory=dict)
+    # Limit histories reported by the processes of a sharded run_job, by stage and shard
+    _shard_histories: dict[str, dict[int, list[tuple[float, int, str]]]] = PrivateAttr(
+        default_factory=dict
+    )
+
+    def _add_limiter(self, limiter: AdaptiveLimiter) -> AdaptiveLimiter:
+        self._limiters[limiter.name] = limiter
+        return limiter
+
+    def _add_shard_history(
+        self, shard: int, history: dict[str, list[tuple[float, int, str]]]
+    ) -> None:
+        for name, changes in history.items():
+            if changes:
+                self._shard_histories.setdefault(name, {})[shard] = changes
+
+    @property
+    def concurrency_limits(self) -> dict[str, int]:
+        """
+        The current adaptive concurrency limits of `run_job`, by stage.
+        Empty unless the job was run with `adaptive_concurrency=True`. For a job run in
+        several processes, the limit of a stage is the sum of the limits of the processes.
+        """
+        limits = {name: limiter.limit for name, limiter in self._limiters.items()}
+        for name, shards in self._shard_histories.items():
+            limits[name] = sum(changes[-1][1] for changes in shards.values())
+        return limits
+
+    @property
+    def concurrency_history(self) -> dict[str, list[tuple[float, int, str]]]:
+        """
+        The changes of the adaptive concurrency limits of `run_job`, by stage, as
+        (unix time, limit, reason) tuples.
+        """
+        history = {name: list(limiter.history) for name, limiter in self._limiters.items()}
+        for name, shards in self._shard_histories.items():
+            history[name] = _merge_shard_histories(shards)
+        return history
 
     async def load_trajectories(
         self, *, api_key: str | None = None, force_reload: bool = False
@@ -155,6 +221,7 @@ async def create_job(
             "evalset_id": evalset_id,
         },
         api_key=api_key,
+        retry_policy=hud.server.PATIENT_RETRY_POLICY,
     )
 
     # Assume the backend API returns the full job data upon creation
@@ -271,13 +338,19 @@ async def _execute_task(
     job: Job,
     tracker: StepProgressTracker | None = None,
     # Use semaphores instead of rate limiter
-    env_creation_semaphore: asyncio.Semaphore | None = None,
-    agent_predict_semaphore: asyncio.Semaphore | None = None,
+    env_creation_semaphore: asyncio.Semaphore | AdaptiveLimiter | None = None,
+    agent_predict_semaphore: asyncio.Semaphore | AdaptiveLimiter | None = None,
+    # Environment created ahead of the task, or the error creating it failed with
+    environment: Environment | Exception | None = None,
+    reaper: _EnvironmentReaper | None = None,
+    checkpoint_log: CheckpointLog | None = None,
 ) -> None:
     """Helper function to instantiate/run/evaluate a single task, with concurrency limits via
-    semaphores."""
+    semaphores. With a reaper, the environment is closed in the background."""
     if tracker:
         tracker.start_task(task_id)
+    if checkpoint_log:
+        checkpoint_log.record(task_id, RUNNING)
     env = None
     agent_instance: Agent | None = None
     status = "error"
@@ -291,7 +364,11 @@ async def _execute_task(
             raise RuntimeError("Agent could not be instantiated")
 
         # Environment creation with semaphore
-        if env_creation_semaphore:
+        if isinstance(environment, Exception):
+            raise environment
+        if environment is not None:
+            env = environment
+        elif env_creation_semaphore:
             async with env_creation_semaphore:
                 env = await gym.make(task, job=job)
         else:
@@ -398,22 +475,13 @@ async def _execute_task(
     finally:
         if tracker:
             tracker.finish_task(task_id)
-        if env:
-            try:
-                await env.close()
-            except Exception as close_err:
-                logger.exception(
-                    "[Job: %s/%s, Task: %s] Close Error: %s", job.name, job.id, task_id, close_err
-                )
-                # Store environment close error in job
-                job.errors.append(
-                    {
-                        "task_id": task_id,
-                        "type": "env_close_error",
-                        "error": str(close_err),
-                        "timestamp": datetime.datetime.now().isoformat(),
-                    }
-                )
+        if checkpoint_log:
+            # a cancelled task is recorded as failed, so that it is run again on resume
+            checkpoint_log.record(task_id, COMPLETED if status == "completed" else ERROR, error_msg)
+        if env and reaper is not None:
+            reaper.close(env, task_id)
+        elif env:
+            await _close_environment(env, job, task_id)
 
     log_suffix = f" Error: {error_msg}" if status == "error" else f" Eval: {evaluation_result}"
     logger.info(
@@ -426,6 +494,117 @@ async def _execute_task(
     )
 
 
+async def _close_environment(env: Environment, job: Job, task_id: str) -> None:
+    """Close an environment, storing a failure in job.errors."""
+    try:
+        await env.close()
+    except Exception as close_err:
+        logger.exception(
+            "[Job: %s/%s, Task: %s] Close Error: %s", job.name, job.id, task_id, close_err
+        )
+        # Store environment close error in job
+        job.errors.append(
+            {
+                "task_id": task_id,
+                "type": "env_close_error",
+                "error": str(close_err),
+                "timestamp": datetime.datetime.now().isoformat(),
+            }
+        )
+
+
+class _EnvironmentReaper:
+    """Closes environments in the background, so task slots do not wait on teardown."""
+
+    def __init__(self, job: Job) -> None:
+        self._job = job
+        self._closing: set[asyncio.Task[None]] = set()
+
+    def close(self, env: Environment, task_id: str) -> None:
+        """Start closing an environment."""
+        closing = asyncio.create_task(_close_environment(env, self._job, task_id))
+        self._closing.add(closing)
+        closing.add_done_callback(self._closing.discard)
+
+    async def drain(self) -> None:
+        """Wait until every environment handed over has been closed."""
+        while self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+
+class _Lookahead:
+    """
+    Slots for environments that are being created or whose task is running, `extra` more than
+    the task limit. The limit is read on every acquire, so it can follow an adaptive limiter.
+    """
+
+    def __init__(self, limit: Callable[[], int], extra: int) -> None:
+        self._limit = limit
+        self._extra = extra
+        self._held = 0
+        self._released = asyncio.Event()
+
+    async def acquire(self) -> None:
+        while self._held >= self._limit() + self._extra:
+            self._released.clear()
+            await self._released.wait()
+        self._held += 1
+
+    def release(self) -> None:
+        self._held -= 1
+        self._released.set()
+
+
+async def _provision_environments(
+    items: AsyncIterable[tuple[str, Task]],
+    make_env: Callable[[Task], Awaitable[Environment]],
+    lookahead: _Lookahead,
+    unclaimed: dict[int, tuple[str, Environment]],
+) -> AsyncIterator[tuple[str, Task, Environment | Exception]]:
+    """
+    Create the environments of tasks ahead of the workers that run them.
+
+    A slot of `lookahead` is taken for every environment before it is created, and must be
+    released by whoever starts running it. Environments are yielded as soon as they are ready,
+    not in task order, and stay in `unclaimed`, by `id`, until they are started.
+    """
+    ready: asyncio.Queue[Any] = asyncio.Queue()
+    creating: set[asyncio.Task[None]] = set()
+
+    async def create(task_id: str, task: Task) -> None:
+        try:
+            env = await make_env(task)
+        except Exception as e:
+            ready.put_nowait((task_id, task, e))
+            return
+        unclaimed[id(env)] = (task_id, env)
+        ready.put_nowait((task_id, task, env))
+
+    async def produce() -> None:
+        try:
+            async for task_id, task in items:
+                await lookahead.acquire()
+                creation = asyncio.create_task(create(task_id, task))
+                creating.add(creation)
+                creation.add_done_callback(creating.discard)
+            await asyncio.gather(*creating)
+        except Exception as e:
+            ready.put_nowait(e)
+        else:
+            ready.put_nowait(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (item := await ready.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        for task in (producer, *creating):
+            task.cancel()
+        await asyncio.gather(producer, *creating, return_exceptions=True)
+
+
 async def _progress_monitor(tracker: StepProgressTracker, interval: float = 1.0) -> None:
     """Coroutine to periodically display progress using the tracker."""
     try:
@@ -446,204 +625,482 @@ async def _progress_monitor(tracker: StepProgressTracker, interval: float = 1.0)
         logger.exception("Progress monitor error: %s", e)
 
 
-# --- New run_job function ---
+def _stage_limit(
+    job: Job, stage: str, limit: int | None, adaptive: bool
+) -> asyncio.Semaphore | AdaptiveLimiter | None:
+    """Create the concurrency limit of a stage of run_job, None if it is not limited."""
+    if not limit or limit <= 0:
+        return None
+    if adaptive:
+        return job._add_limiter(AdaptiveLimiter(stage, limit))
+    return asyncio.Semaphore(limit)
 
 
-async def run_job(
+def _split_limit(limit: int | None, parts: int) -> int | None:
+    """Split a concurrency limit of run_job between processes."""
+    if not limit or limit <= 0:
+        return limit
+    return max(1, math.ceil(limit / parts))
+
+
+class _ShardProgress(StepProgressTracker):
+    """Forwards the progress of a shard of run_job to the parent process."""
+
+    def __init__(self, shard: int, events: ProcessQueue[Any]) -> None:
+        super().__init__(total_tasks=1, max_steps_per_task=1)
+        self._shard = shard
+        self._events = events
+
+    def start_task(self, task_id: str) -> None:
+        self._events.put(("start", self._shard, task_id))
+
+    def increment_step(self, task_id: str) -> None:
+        self._events.put(("step", self._shard, task_id))
+
+    def finish_task(self, task_id: str) -> None:
+        self._events.put(("finish", self._shard, task_id))
+
+
+def _run_shard(
+    shard: int,
+    job: Job,
+    tasks: list[tuple[str, Task]],
+    shard_kwargs: dict[str, Any],
+    settings_values: dict[str, Any],
+    events: ProcessQueue[Any],
+) -> None:
+    """Run a shard of run_job in a worker process, reporting to the parent over `events`."""
+    for name, value in settings_values.items():
+        setattr(settings, name, value)
+    known_errors = len(job.errors)
+
+    async def get_job(evalset_id: str | None, gym_id: str | None) -> Job:
+        return job
+
+    try:
+        asyncio.run(
+            _run_job(
+                task_or_taskset=[task for _, task in tasks],
+                get_job=get_job,
+                show_progress=False,
+                task_ids=[task_id for task_id, _ in tasks],
+                progress_tracker=_ShardProgress(shard, events),
+                checkpoint_shard=shard,
+                **shard_kwargs,
+            )
+        )
+    except BaseException as e:
+        events.put(("failed", shard, f"{type(e).__name__}: {e}"))
+    else:
+        events.put(("done", shard, (job.errors[known_errors:], job.concurrency_history)))
+
+
+def _merge_shard_histories(
+    shards: dict[int, list[tuple[float, int, str]]],
+) -> list[tuple[float, int, str]]:
+    """Combine the limit histories of the shards of a stage into one of their total limit."""
+    limits = {shard: changes[0][1] for shard, changes in shards.items()}
+    merged = [(min(changes[0][0] for changes in shards.values()), sum(limits.values()), "initial")]
+    changes = sorted(
+        (when, shard, limit, reason)
+        for shard, shard_changes in shards.items()
+        for when, limit, reason in shard_changes[1:]
+    )
+    for when, shard, limit, reason in changes:
+        limits[shard] = limit
+        merged.append((when, sum(limits.values()), f"shard {shard}: {reason}"))
+    return merged
+
+
+def _add_shard_error(job: Job, shard: int, error: str) -> None:
+    logger.error("[Job: %s/%s] Shard %d failed: %s", job.name, job.id, shard, error)
+    job.errors.append(
+        {
+            "type": "shard_error",
+            "shard": shard,
+            "error": error,
+            "timestamp": datetime.datetime.now().isoformat(),
+        }
+    )
+
+
+async def _run_sharded(
+    job: Job,
+    tasks_source: Iterable[Task] | AsyncIterable[Task],
+    processes: int,
+    shard_kwargs: dict[str, Any],
+    *,
+    completed: Collection[str],
+    show_progress: bool,
+) -> None:
+    """
+    Run the tasks of run_job in worker processes, collecting their progress and errors into
+    `job`. Tasks are dealt round-robin, so shards get a similar mix of tasks.
+    """
+    tasks: list[tuple[str, Task]] = []
+    index = 0
+    async for task in aiter_items(tasks_source):
+        task_id = _task_id(task, index)
+        index += 1
+        if task_id not in completed:
+            tasks.append((task_id, task))
+    if not tasks:
+        return
+    processes = min(processes, len(tasks))
+
+    tracker = None
+    monitor_task = None
+    if show_progress:
+        tracker = StepProgressTracker(
+            total_tasks=len(tasks), max_steps_per_task=shard_kwargs["max_steps_per_task"]
+        )
+        monitor_task = asyncio.create_task(_progress_monitor(tracker))
+
+    # forked processes would inherit the parent's event loop and locks, so start them fresh
+    context = multiprocessing.get_context("spawn")
+    events = context.Queue()
+    workers = [
+        context.Process(
+            target=_run_shard,
+            args=(
+                shard,
+                job,
+                tasks[shard::processes],
+                shard_kwargs,
+                settings.model_dump(),
+                events,
+            ),
+            name=f"hud-job-{job.id}-shard-{shard}",
+        )
+        for shard in range(processes)
+    ]
+    logger.info(
+        "Job '%s' (%s): Running %d tasks in %d processes.", job.name, job.id, len(tasks), processes
+    )
+    running = set(range(processes))
+    try:
+        for worker in workers:
+            worker.start()
+        exited: set[int] = set()
+        while running:
+            try:
+                kind, shard, payload = await asyncio.to_thread(events.get, True, 0.5)
+            except queue.Empty:
+                # a shard that exited without reporting, even after its last events were read
+                for lost in exited & running:
+                    running.discard(lost)
+                    _add_shard_error(
+                        job, lost, f"Process exited with code {workers[lost].exitcode}"
+                    )
+                exited = {alive for alive in running if not workers[alive].is_alive()}
+                continue
+            if kind == "start" and tracker:
+                tracker.start_task(payload)
+            elif kind == "step" and tracker:
+                tracker.increment_step(payload)
+            elif kind == "finish" and tracker:
+                tracker.finish_task(payload)
+            elif kind == "done":
+                running.discard(shard)
+                errors, history = payload
+                job.errors.extend(errors)
+                job._add_shard_history(shard, history)
+            elif kind == "failed":
+                running.discard(shard)
+                _add_shard_error(job, shard, payload)
+    finally:
+        for shard, worker in enumerate(workers):
+            if worker.pid is None:
+                continue
+            if shard in running:
+                # stop shards that are still going when run_job is cancelled or fails
+                worker.terminate()
+            await asyncio.to_thread(worker.join, SHARD_EXIT_TIMEOUT)
+            if worker.is_alive():
+                worker.kill()
+                await asyncio.to_thread(worker.join)
+        events.close()
+        if monitor_task is not None and not monitor_task.done():
+            monitor_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await monitor_task
+
+
+def _task_id(task: Task, index: int) -> str:
+    """The ID a task is tracked under in run_job, by its position if it has no ID."""
+    return str(task.id) if task.id else f"task_{index}"
+
+
+async def _peek(
+    tasks: Iterable[Task] | AsyncIterable[Task],
+) -> tuple[Task | None, Iterable[Task] | AsyncIterable[Task]]:
+    """Get the first task of a source, and a source that still yields every task."""
+    if isinstance(tasks, Sequence):
+        return (tasks[0] if tasks else None), tasks
+    if isinstance(tasks, AsyncIterable):
+        iterator = aiter(tasks)
+        try:
+            first = await anext(iterator)
+        except StopAsyncIteration:
+            return None, []
+
+        async def rest() -> AsyncIterator[Task]:
+            yield first
+            async for task in iterator:
+                yield task
+
+        return first, rest()
+    iterator = iter(tasks)
+    first = next(iterator, None)
+    if first is None:
+        return None, []
+    return first, itertools.chain([first], iterator)
+
+
+async def _run_job(
     agent_cls: type[Agent],
-    task_or_taskset: Task | TaskSet,
-    job_name: str,
+    task_or_taskset: Task | TaskSet | Iterable[Task] | AsyncIterable[Task],
+    get_job: Callable[[str | None, str | None], Awaitable[Job]],
     adapter_cls: type[Adapter] | None = None,
     agent_kwargs: dict[str, Any] | None = None,
     adapter_kwargs: dict[str, Any] | None = None,
     max_steps_per_task: int = 20,
     run_parallel: bool = True,
-    job_metadata: dict[str, Any] | None = None,
     show_progress: bool = True,
-    # Concurrency control with semaphores
-    max_concurrent_env_creations: int | None = 30,  # Limits env.make calls
-    max_concurrent_agent_predictions: int | None = 30,  # Limits agent.predict calls
-    max_concurrent_tasks: int | None = 30,  # Limits overall task concurrency
+    max_concurrent_env_creations: int | None = 30,
+    max_concurrent_agent_predictions: int | None = 30,
+    max_concurrent_tasks: int | None = 30,
+    adaptive_concurrency: bool = False,
+    pipeline_lookahead: int = 0,
+    checkpoint: bool = True,
+    processes: int = 1,
+    completed: Collection[str] = (),
+    task_ids: Sequence[str] | None = None,
+    progress_tracker: StepProgressTracker | None = None,
+    checkpoint_shard: int | None = None,
 ) -> Job:
     """
-    Creates Job, executes tasks locally, linking them to the Job.
-    Instantiates agent/adapter per task. Shows step-based progress.
-
-    Controls concurrency in three ways:
-    1. Limits concurrent environment creations
-    2. Limits concurrent agent predictions
-    3. Limits overall concurrent tasks (when run_parallel=True)
-
-    All concurrency controls use semaphores for reliability.
-    Tracks all errors that occur during execution in job.errors.
-
-    Args:
-        agent_cls: Agent class to instantiate.
-        task_or_taskset: Task or TaskSet to run.
-        job_name: Name for the Job.
-        adapter_cls: Optional Adapter class.
-        agent_kwargs: Optional kwargs for agent constructor.
-        adapter_kwargs: Optional kwargs for adapter constructor.
-        max_steps_per_task: Step limit per task.
-        run_parallel: Run TaskSet tasks concurrently if True (limited by max_concurrent_tasks).
-        job_metadata: Metadata for the created Job.
-        show_progress: Display the step-based progress tracker.
-        max_concurrent_env_creations: Max concurrent environment creation calls.
-        max_concurrent_agent_predictions: Max concurrent agent prediction calls.
-        max_concurrent_tasks: Max number of tasks to run actively at the same time.
-
-    Returns:
-        The created Job object with errors stored in job.errors.
+    Run tasks for the job returned by `get_job(evalset_id, gym_id)`, skipping the IDs in
+    `completed`. `task_ids` gives the IDs of the tasks by position, `progress_tracker`
+    replaces the tracker shown when show_progress is set, and `checkpoint_shard` selects the
+    checkpoint log of a shard. See `run_job` for the other arguments.
     """
-    tasks_to_run: list[Task] = []
-    created_job: Job | None = None
-
+    # --- Task Setup ---
     evalset_id = None
-    if isinstance(task_or_taskset, TaskSet):
-        evalset_id = task_or_taskset.id
-
-    gym_id = None
+    tasks_source: Iterable[Task] | AsyncIterable[Task]
     if isinstance(task_or_taskset, Task):
-        gym_id = task_or_taskset.gym if isinstance(task_or_taskset.gym, str) else None
+        tasks_source = [task_or_taskset]
+        run_parallel = False
     elif isinstance(task_or_taskset, TaskSet):
-        gym_id = (
-            task_or_taskset.tasks[0].gym if isinstance(task_or_taskset.tasks[0].gym, str) else None
+        evalset_id = task_or_taskset.id
+        tasks_source = task_or_taskset.tasks or []
+    elif isinstance(task_or_taskset, Iterable | AsyncIterable):
+        tasks_source = task_or_taskset
+    else:
+        raise TypeError(
+            "task_or_taskset must be a Task, a TaskSet, or an iterable or async iterable of Tasks"
         )
 
-    # --- Create Job ---
-    try:
-        logger.info("Creating job with name: '%s'", job_name)
-        created_job = await create_job(
-            name=job_name,
-            metadata=job_metadata,
-            evalset_id=evalset_id,
-            gym_id=gym_id,
-        )
-        logger.info("Created job with ID: %s", created_job.id)
-    except Exception as e:
-        logger.exception("Failed to create job '%s': %s", job_name, e)
-        raise
+    # the gym of the first task is recorded with the job
+    first_task, tasks_source = await _peek(tasks_source)
+    gym_id = None
+    if first_task is not None and isinstance(first_task.gym, str):
+        gym_id = first_task.gym
 
-    # --- Task Setup ---
-    is_taskset = isinstance(task_or_taskset, TaskSet)
-    if is_taskset:
-        tasks_to_run = task_or_taskset.tasks if task_or_taskset.tasks else []
-    elif isinstance(task_or_taskset, Task):
-        tasks_to_run = [task_or_taskset]
-        run_parallel = False
-    else:
-        raise TypeError("task_or_taskset must be either a Task or a TaskSet")
+    # --- Create Job ---
+    created_job = await get_job(evalset_id, gym_id)
 
-    if not tasks_to_run:
+    if first_task is None:
         logger.warning("Job '%s' (%s): No tasks found to run.", created_job.name, created_job.id)
         return created_job
 
-    task_ids = [(str(task.id) if task.id else f"task_{i}") for i, task in enumerate(tasks_to_run)]
-    num_tasks = len(tasks_to_run)
+    if processes > 1 and run_parallel:
+        shard_kwargs = {
+            "agent_cls": agent_cls,
+            "adapter_cls": adapter_cls,
+            "agent_kwargs": agent_kwargs,
+            "adapter_kwargs": adapter_kwargs,
+            "max_steps_per_task": max_steps_per_task,
+            # the limits are for the whole job, so each process gets its share
+            "max_concurrent_env_creations": _split_limit(max_concurrent_env_creations, processes),
+            "max_concurrent_agent_predictions": _split_limit(
+                max_concurrent_agent_predictions, processes
+            ),
+            "max_concurrent_tasks": _split_limit(max_concurrent_tasks, processes),
+            "adaptive_concurrency": adaptive_concurrency,
+            "pipeline_lookahead": pipeline_lookahead,
+            "checkpoint": checkpoint,
+        }
+        await _run_sharded(
+            created_job,
+            tasks_source,
+            processes,
+            shard_kwargs,
+            completed=completed,
+            show_progress=show_progress,
+        )
+        return created_job
+
+    # streamed tasks are not counted up front
+    num_tasks = None
+    if isinstance(tasks_source, Sized):
+        num_tasks = len(tasks_source)
+        if completed:
+            num_tasks = sum(
+                _task_id(task, index) not in completed
+                for index, task in enumerate(cast("Iterable[Task]", tasks_source))
+            )
+            logger.info(
+                "Job '%s' (%s): %d tasks left to run.", created_job.name, created_job.id, num_tasks
+            )
+    adaptive_suffix = " (adaptive)" if adaptive_concurrency else ""
 
     # --- Create semaphores for concurrency control ---
-    env_creation_sema = None
-    if max_concurrent_env_creations and max_concurrent_env_creations > 0:
-        env_creation_sema = asyncio.Semaphore(max_concurrent_env_creations)
+    env_creation_sema = _stage_limit(
+        created_job, "env_creation", max_concurrent_env_creations, adaptive_concurrency
+    )
+    if env_creation_sema is not None:
         logger.info(
-            "Limiting concurrent environment creations to %d.", max_concurrent_env_creations
+            "Limiting concurrent environment creations to %d%s.",
+            max_concurrent_env_creations,
+            adaptive_suffix,
         )
 
-    agent_predict_sema = None
-    if max_concurrent_agent_predictions and max_concurrent_agent_predictions > 0:
-        agent_predict_sema = asyncio.Semaphore(max_concurrent_agent_predictions)
+    agent_predict_sema = _stage_limit(
+        created_job, "agent_prediction", max_concurrent_agent_predictions, adaptive_concurrency
+    )
+    if agent_predict_sema is not None:
         logger.info(
-            "Limiting concurrent agent predictions to %d.", max_concurrent_agent_predictions
+            "Limiting concurrent agent predictions to %d%s.",
+            max_concurrent_agent_predictions,
+            adaptive_suffix,
         )
 
-    task_execution_sema = None
-    effective_concurrency = num_tasks  # Default to running all if parallel
-    if run_parallel and max_concurrent_tasks and max_concurrent_tasks > 0:
-        effective_concurrency = min(num_tasks, max_concurrent_tasks)
-        task_execution_sema = asyncio.Semaphore(effective_concurrency)
-        logger.info("Limiting concurrent task executions to %d.", effective_concurrency)
-    elif not run_parallel:
+    task_limiter = None
+    if not run_parallel:
         effective_concurrency = 1  # Sequential means concurrency of 1
+    elif max_concurrent_tasks and max_concurrent_tasks > 0:
+        effective_concurrency = min(num_tasks or max_concurrent_tasks, max_concurrent_tasks)
+        if adaptive_concurrency:
+            # task durations vary with the number of steps, so only errors move this limit
+            task_limiter = created_job._add_limiter(
+                AdaptiveLimiter("task_execution", effective_concurrency, latency_tolerance=None)
+            )
+            # enough workers for the limit to grow into
+            effective_concurrency = min(num_tasks or task_limiter.max_limit, task_limiter.max_limit)
+        logger.info(
+            "Limiting concurrent task executions to %d%s.",
+            task_limiter.limit if task_limiter else effective_concurrency,
+            adaptive_suffix,
+        )
+    else:
+        # Default to running all if parallel, as long as the tasks can be counted
+        effective_concurrency = num_tasks or DEFAULT_STREAM_CONCURRENCY
 
     # --- Instantiate Tracker & Start Monitor ---
-    tracker = None
+    tracker = progress_tracker
     monitor_task = None
-    if show_progress and num_tasks > 0:
+    if tracker is None and show_progress and num_tasks:
         tracker = StepProgressTracker(total_tasks=num_tasks, max_steps_per_task=max_steps_per_task)
         monitor_task = asyncio.create_task(_progress_monitor(tracker))
 
     # --- Execute Tasks ---
     job_desc_suffix = f" (Job ID: {created_job.id})"
 
-    async def task_wrapper(task_coro: Coroutine, semaphore: asyncio.Semaphore | None) -> None:
-        if semaphore:
-            async with semaphore:
-                await task_coro
-        else:
-            await task_coro
-
-    try:
-        if run_parallel and is_taskset:
-            logger.info(
-                "Job '%s'%s: Running %d tasks with concurrency %d.",
-                created_job.name,
-                job_desc_suffix,
-                num_tasks,
-                effective_concurrency,
-            )
+    checkpoint_log = (
+        CheckpointLog(checkpoint_path(created_job.id, checkpoint_shard)) if checkpoint else None
+    )
 
-            task_coroutines = [
-                _execute_task(
-                    agent_cls=agent_cls,
-                    adapter_cls=adapter_cls,
-                    agent_kwargs=agent_kwargs,
-                    adapter_kwargs=adapter_kwargs,
-                    task=task,
-                    job_name=created_job.name,
-                    task_id=task_id,
-                    max_steps_per_task=max_steps_per_task,
-                    job=created_job,
-                    tracker=tracker,
-                    env_creation_semaphore=env_creation_sema,
-                    agent_predict_semaphore=agent_predict_sema,
-                )
-                for task, task_id in zip(tasks_to_run, task_ids, strict=True)
-            ]
+    async def numbered_tasks() -> AsyncIterator[tuple[str, Task]]:
+        index = 0
+        async for task in aiter_items(tasks_source):
+            task_id = task_ids[index] if task_ids is not None else _task_id(task, index)
+            index += 1
+            if task_id in completed:
+                continue
+            if checkpoint_log is not None:
+                checkpoint_log.record(task_id, PENDING)
+            yield task_id, task
+
+    # --- Pipeline environment creation ahead of the task slots ---
+    reaper = None
+    lookahead = None
+    unclaimed: dict[int, tuple[str, Environment]] = {}
+    items: AsyncIterable[tuple[str, Task, Environment | Exception | None]]
+    if pipeline_lookahead > 0:
+        reaper = _EnvironmentReaper(created_job)
+        # a slot is held from creating an environment until its task finishes; with an
+        # adaptive limiter there are more workers than running tasks, so follow its limit
+        task_limit = effective_concurrency
+        lookahead = _Lookahead(
+            (lambda: task_limiter.limit) if task_limiter is not None else (lambda: task_limit),
+            pipeline_lookahead,
+        )
 
-            # Wrap coroutines with semaphore management if limiting concurrency
-            wrapped_tasks = [
-                task_wrapper(coro, task_execution_sema) for i, coro in enumerate(task_coroutines)
-            ]
+        async def make_env(task: Task) -> Environment:
+            if env_creation_sema is not None:
+                async with env_creation_sema:
+                    return await gym.make(task, job=created_job)
+            return await gym.make(task, job=created_job)
 
-            # Run all wrapped tasks
-            await asyncio.gather(*wrapped_tasks)
+        items = _provision_environments(numbered_tasks(), make_env, lookahead, unclaimed)
+        logger.info(
+            "Creating up to %d environments ahead of the running tasks.", pipeline_lookahead
+        )
+    else:
+        items = ((task_id, task, None) async for task_id, task in numbered_tasks())
 
+    async def run_task(item: tuple[str, Task, Environment | Exception | None]) -> None:
+        if task_limiter is not None:
+            async with task_limiter:
+                await execute(item)
         else:
-            # SEQUENTIAL (or single task)
-            logger.info(
-                "Job '%s'%s: Running %d tasks sequentially.",
-                created_job.name,
-                job_desc_suffix,
-                num_tasks,
+            await execute(item)
+
+    async def execute(item: tuple[str, Task, Environment | Exception | None]) -> None:
+        task_id, task, environment = item
+        unclaimed.pop(id(environment), None)
+        try:
+            await _execute_task(
+                agent_cls=agent_cls,
+                adapter_cls=adapter_cls,
+                agent_kwargs=agent_kwargs,
+                adapter_kwargs=adapter_kwargs,
+                task=task,
+                job_name=created_job.name,
+                task_id=task_id,
+                max_steps_per_task=max_steps_per_task,
+                job=created_job,
+                tracker=tracker,
+                env_creation_semaphore=env_creation_sema,
+                agent_predict_semaphore=agent_predict_sema,
+                environment=environment,
+                reaper=reaper,
+                checkpoint_log=checkpoint_log,
             )
-            for i, task in enumerate(tasks_to_run):
-                task_id = task_ids[i]
-                await _execute_task(
-                    agent_cls=agent_cls,
-                    adapter_cls=adapter_cls,
-                    agent_kwargs=agent_kwargs,
-                    adapter_kwargs=adapter_kwargs,
-                    task=task,
-                    job_name=created_job.name,
-                    task_id=task_id,
-                    max_steps_per_task=max_steps_per_task,
-                    job=created_job,
-                    tracker=tracker,
-                    env_creation_semaphore=env_creation_sema,
-                    agent_predict_semaphore=agent_predict_sema,
-                )
+        finally:
+            if lookahead is not None:
+                lookahead.release()
+
+    try:
+        logger.info(
+            "Job '%s'%s: Running %s tasks with concurrency %d.",
+            created_job.name,
+            job_desc_suffix,
+            num_tasks if num_tasks is not None else "streamed",
+            effective_concurrency,
+        )
+        # workers pull tasks as they free up, so only the tasks in flight exist at once
+        num_tasks = await run_worker_pool(items, run_task, concurrency=effective_concurrency)
 
     finally:
+        if reaper is not None:
+            # environments created for tasks that never started, e.g. after a cancellation
+            for task_id, env in list(unclaimed.values()):
+                reaper.close(env, task_id)
+            await reaper.drain()
+        if checkpoint_log is not None:
+            checkpoint_log.close()
         # Ensure monitor task is stopped and awaited cleanly
         if monitor_task is not None and not monitor_task.done():
             monitor_task.cancel()
@@ -660,4 +1117,205 @@ async def run_job(
         job_desc_suffix,
         num_tasks,
     )
+    stats = hud.server.client_stats()
+    throttled_seconds = sum(
+        class_stats["throttled_seconds"] for class_stats in hud.server.rate_limit_stats().values()
+    )
+    logger.debug(
+        "Job '%s'%s sent %d API requests over %d pooled connections, throttled for %.1fs.",
+        created_job.name,
+        job_desc_suffix,
+        stats["requests"],
+        stats["connections"],
+        throttled_seconds,
+    )
     return created_job
+
+
+# --- New run_job function ---
+
+
+async def run_job(
+    agent_cls: type[Agent],
+    task_or_taskset: Task | TaskSet | Iterable[Task] | AsyncIterable[Task],
+    job_name: str,
+    adapter_cls: type[Adapter] | None = None,
+    agent_kwargs: dict[str, Any] | None = None,
+    adapter_kwargs: dict[str, Any] | None = None,
+    max_steps_per_task: int = 20,
+    run_parallel: bool = True,
+    job_metadata: dict[str, Any] | None = None,
+    show_progress: bool = True,
+    # Concurrency control with semaphores
+    max_concurrent_env_creations: int | None = 30,  # Limits env.make calls
+    max_concurrent_agent_predictions: int | None = 30,  # Limits agent.predict calls
+    max_concurrent_tasks: int | None = 30,  # Limits overall task concurrency
+    adaptive_concurrency: bool = False,  # Adapts the limits above to latency and errors
+    pipeline_lookahead: int = 0,  # Environments created ahead of free task slots
+    checkpoint: bool = True,  # Logs task statuses for resume_job
+    processes: int = 1,  # Worker processes the tasks are sharded across
+) -> Job:
+    """
+    Creates Job, executes tasks locally, linking them to the Job.
+    Instantiates agent/adapter per task. Shows step-based progress.
+
+    Controls concurrency in three ways:
+    1. Limits concurrent environment creations
+    2. Limits concurrent agent predictions
+    3. Limits overall concurrent tasks (when run_parallel=True)
+
+    Tasks are run by a pool of workers that pull the next task when they free up, so tasks
+    can be streamed from a generator or from `iter_taskset` without loading them all first.
+    Progress is only shown when the number of tasks is known.
+    Tracks all errors that occur during execution in job.errors.
+    Unless checkpoint=False, the status of every task is appended to a log that `resume_job`
+    continues from. The log is deleted once every task has completed.
+
+    Args:
+        agent_cls: Agent class to instantiate.
+        task_or_taskset: Task or TaskSet to run, or an iterable or async iterable of Tasks.
+        job_name: Name for the Job.
+        adapter_cls: Optional Adapter class.
+        agent_kwargs: Optional kwargs for agent constructor.
+        adapter_kwargs: Optional kwargs for adapter constructor.
+        max_steps_per_task: Step limit per task.
+        run_parallel: Run TaskSet tasks concurrently if True (limited by max_concurrent_tasks).
+        job_metadata: Metadata for the created Job.
+        show_progress: Display the step-based progress tracker.
+        max_concurrent_env_creations: Max concurrent environment creation calls.
+        max_concurrent_agent_predictions: Max concurrent agent prediction calls.
+        max_concurrent_tasks: Max number of tasks to run actively at the same time.
+        adaptive_concurrency: Treat the limits above as starting points that grow while
+            their stage stays healthy and shrink on 429s, timeouts and failed environment
+            creations. The limits and their history are available from
+            `Job.concurrency_limits` and `Job.concurrency_history`.
+        pipeline_lookahead: If positive, environments are created and set up in the
+            background, up to this many ahead of the tasks running, so a task slot that frees
+            up starts on a ready environment. Environments are then closed in the background.
+        checkpoint: Log the status of every task to the cache directory, so that the job can
+            be continued with `resume_job` if the run is interrupted or some tasks fail.
+        processes: If more than one, the tasks are loaded and sharded across this many
+            worker processes, each running its shard on its own event loop, so that work on
+            the CPU such as decoding screenshots is spread over several cores. The
+            concurrency limits are split between the processes. Progress and errors are
+            collected into the returned Job. The agent and adapter classes, their kwargs and
+            the tasks must be picklable, and the script calling run_job must guard its entry
+            point with `if __name__ == "__main__":`.
+
+    Returns:
+        The created Job object with errors stored in job.errors.
+    """
+
+    async def get_job(evalset_id: str | None, gym_id: str | None) -> Job:
+        try:
+            logger.info("Creating job with name: '%s'", job_name)
+            created_job = await create_job(
+                name=job_name,
+                metadata=job_metadata,
+                evalset_id=evalset_id,
+                gym_id=gym_id,
+            )
+            logger.info("Created job with ID: %s", created_job.id)
+        except Exception as e:
+            logger.exception("Failed to create job '%s': %s", job_name, e)
+            raise
+        return created_job
+
+    job = await _run_job(
+        agent_cls,
+        task_or_taskset,
+        get_job,
+        adapter_cls=adapter_cls,
+        agent_kwargs=agent_kwargs,
+        adapter_kwargs=adapter_kwargs,
+        max_steps_per_task=max_steps_per_task,
+        run_parallel=run_parallel,
+        show_progress=show_progress,
+        max_concurrent_env_creations=max_concurrent_env_creations,
+        max_concurrent_agent_predictions=max_concurrent_agent_predictions,
+        max_concurrent_tasks=max_concurrent_tasks,
+        adaptive_concurrency=adaptive_concurrency,
+        pipeline_lookahead=pipeline_lookahead,
+        checkpoint=checkpoint,
+        processes=processes,
+    )
+    if checkpoint:
+        discard_if_completed(job.id)
+    return job
+
+
+async def resume_job(
+    job_id: str,
+    agent_cls: type[Agent],
+    task_or_taskset: Task | TaskSet | Iterable[Task] | AsyncIterable[Task],
+    adapter_cls: type[Adapter] | None = None,
+    agent_kwargs: dict[str, Any] | None = None,
+    adapter_kwargs: dict[str, Any] | None = None,
+    max_steps_per_task: int = 20,
+    run_parallel: bool = True,
+    show_progress: bool = True,
+    # Concurrency control with semaphores
+    max_concurrent_env_creations: int | None = 30,  # Limits env.make calls
+    max_concurrent_agent_predictions: int | None = 30,  # Limits agent.predict calls
+    max_concurrent_tasks: int | None = 30,  # Limits overall task concurrency
+    adaptive_concurrency: bool = False,  # Adapts the limits above to latency and errors
+    pipeline_lookahead: int = 0,  # Environments created ahead of free task slots
+    checkpoint: bool = True,  # Logs task statuses for resume_job
+    processes: int = 1,  # Worker processes the tasks are sharded across
+) -> Job:
+    """
+    Continues a job started by `run_job` that did not finish, e.g. because its process died.
+
+    The tasks are read again from `task_or_taskset`, which should be the tasks the job was
+    started with. Tasks completed according to the job's checkpoint log are skipped; tasks
+    that failed, were running or were not started yet are run, and their trajectories are
+    linked to the same job. See `run_job` for the other arguments.
+
+    Args:
+        job_id: The ID of the job to continue.
+        agent_cls: Agent class to instantiate.
+        task_or_taskset: Task or TaskSet the job was run with, or an iterable or async
+            iterable of its Tasks.
+
+    Returns:
+        The resumed Job object with the errors of this run stored in job.errors.
+
+    Raises:
+        ValueError: If there is no checkpoint log for the job on this machine
+    """
+    records = load_job_checkpoint(job_id)
+    if not records:
+        raise ValueError(f"No checkpoint found for job {job_id}")
+    completed = {task_id for task_id, record in records.items() if record["status"] == COMPLETED}
+    logger.info(
+        "Resuming job %s: %d of %d logged tasks already completed.",
+        job_id,
+        len(completed),
+        len(records),
+    )
+
+    async def get_job(evalset_id: str | None, gym_id: str | None) -> Job:
+        return await load_job(job_id)
+
+    job = await _run_job(
+        agent_cls,
+        task_or_taskset,
+        get_job,
+        adapter_cls=adapter_cls,
+        agent_kwargs=agent_kwargs,
+        adapter_kwargs=adapter_kwargs,
+        max_steps_per_task=max_steps_per_task,
+        run_parallel=run_parallel,
+        show_progress=show_progress,
+        max_concurrent_env_creations=max_concurrent_env_creations,
+        max_concurrent_agent_predictions=max_concurrent_agent_predictions,
+        max_concurrent_tasks=max_concurrent_tasks,
+        adaptive_concurrency=adaptive_concurrency,
+        pipeline_lookahead=pipeline_lookahead,
+        checkpoint=checkpoint,
+        processes=processes,
+        completed=completed,
+    )
+    if checkpoint:
+        discard_if_completed(job_id)
+    return job
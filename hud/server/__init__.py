@@ -1,5 +1,56 @@
 from __future__ import annotations
 
-from .requests import make_request, make_request_sync
+from .capabilities import (
+    BATCH_CREATE,
+    BINARY_TRANSPORT,
+    BUILD_LOOKUP,
+    INVOKE_CHANNEL,
+    MULTIPART_UPLOAD,
+    STATUS_LONG_POLL,
+    TASKSET_PAGINATION,
+    get_capabilities,
+    supports,
+)
+from .rate_limit import configure_rate_limit, rate_limit_stats
+from .requests import (
+    aclose_shared_client,
+    client_stats,
+    get_shared_client,
+    make_binary_request,
+    make_request,
+    make_request_sync,
+    step_retry_policy,
+)
+from .retry import (
+    FAIL_FAST_RETRY_POLICY,
+    PATIENT_RETRY_POLICY,
+    CircuitBreaker,
+    RetryBudget,
+    RetryPolicy,
+)
 
-__all__ = ["make_request", "make_request_sync"]
+__all__ = [
+    "BATCH_CREATE",
+    "BINARY_TRANSPORT",
+    "BUILD_LOOKUP",
+    "FAIL_FAST_RETRY_POLICY",
+    "INVOKE_CHANNEL",
+    "MULTIPART_UPLOAD",
+    "PATIENT_RETRY_POLICY",
+    "STATUS_LONG_POLL",
+    "TASKSET_PAGINATION",
+    "CircuitBreaker",
+    "RetryBudget",
+    "RetryPolicy",
+    "aclose_shared_client",
+    "client_stats",
+    "configure_rate_limit",
+    "get_capabilities",
+    "get_shared_client",
+    "make_binary_request",
+    "make_request",
+    "make_request_sync",
+    "rate_limit_stats",
+    "step_retry_policy",
+    "supports",
+]
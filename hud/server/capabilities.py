@@ -0,0 +1,99 @@
+"""
+Optional features advertised by the HUD API.
+
+Newer servers list the features they support at `/v2/capabilities`. Clients check a feature
+before using it and fall back to the original API when it is not advertised, so the SDK keeps
+working against servers that predate the feature or the endpoint itself.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import time
+
+from hud.exceptions import HudException, HudRequestError
+from hud.settings import settings
+from hud.utils.concurrency import single_flight
+
+from .requests import make_request
+
+logger = logging.getLogger("hud.server.capabilities")
+
+# Archives and execute output are sent as raw bytes instead of base64 inside JSON.
+BINARY_TRANSPORT = "binary_transport"
+# Several environments can be created with one request to /v2/create_environments.
+BATCH_CREATE = "batch_create"
+# Invokes can be sent over a persistent WebSocket per environment.
+INVOKE_CHANNEL = "invoke_channel"
+# Environment state requests can be held until the environment reaches a status.
+STATUS_LONG_POLL = "status_long_poll"
+# Build contexts can be uploaded in parts through /v2/builds/{id}/multipart.
+MULTIPART_UPLOAD = "multipart_upload"
+# Builds can be looked up by the digest of their build context.
+BUILD_LOOKUP = "build_lookup"
+# Taskset tasks can be loaded in pages with offset and limit, reporting has_more.
+TASKSET_PAGINATION = "taskset_pagination"
+
+# Seconds before capabilities are fetched again after fetching them failed.
+RETRY_INTERVAL = 30.0
+
+# capabilities of each base url, fetched once per process, and when they expire
+_CAPABILITIES: dict[str, tuple[frozenset[str], float]] = {}
+
+
+async def _fetch_capabilities(base_url: str) -> frozenset[str]:
+    expires = math.inf
+    try:
+        data = await make_request(
+            method="GET",
+            url=f"{base_url}/v2/capabilities",
+            api_key=settings.api_key,
+            max_retries=0,
+        )
+    except HudRequestError as e:
+        capabilities = frozenset()
+        if e.status_code in (404, 405):
+            logger.debug("Server does not advertise capabilities")
+        else:
+            logger.debug("Could not fetch server capabilities: %s", e)
+            expires = time.monotonic() + RETRY_INTERVAL
+    except HudException as e:
+        logger.debug("Could not fetch server capabilities: %s", e)
+        capabilities = frozenset()
+        expires = time.monotonic() + RETRY_INTERVAL
+    else:
+        capabilities = frozenset(data.get("capabilities", []))
+    _CAPABILITIES[base_url] = (capabilities, expires)
+    return capabilities
+
+
+async def get_capabilities() -> frozenset[str]:
+    """
+    Get the features advertised by the HUD API at the configured base url.
+
+    A server without the capabilities endpoint advertises nothing. When fetching fails for
+    another reason, e.g. a network error, nothing is advertised for `RETRY_INTERVAL` seconds
+    before the capabilities are fetched again. Concurrent calls share one request.
+
+    Returns:
+        frozenset[str]: The names of the advertised features
+    """
+    base_url = settings.base_url
+    cached = _CAPABILITIES.get(base_url)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    return await single_flight(("capabilities", base_url), lambda: _fetch_capabilities(base_url))
+
+
+async def supports(feature: str) -> bool:
+    """
+    Check whether the HUD API advertises a feature.
+
+    Args:
+        feature: The name of the feature, e.g. `BINARY_TRANSPORT`
+
+    Returns:
+        bool: True if the feature may be used
+    """
+    return feature in await get_capabilities()
@@ -0,0 +1,80 @@
+"""
+JSON encoding and decoding of HUD API traffic.
+
+Step responses of screenshot environments carry large base64 observations, so the codec
+uses orjson or msgspec when one of them is installed (the `fast-json` and `msgspec` extras)
+and falls back to the standard library otherwise. Bodies are encoded straight to bytes and
+responses are decoded from bytes, without going through an intermediate str.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any
+
+logger = logging.getLogger("hud.server.codec")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec  # pyright: ignore[reportMissingImports]
+except ImportError:
+    msgspec = None
+
+JSON_CONTENT_TYPE = "application/json"
+
+if orjson is not None:
+    BACKEND = "orjson"
+elif msgspec is not None:
+    BACKEND = "msgspec"
+else:
+    BACKEND = "json"
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encode an object as JSON.
+
+    Args:
+        obj: A JSON serializable object
+
+    Returns:
+        bytes: The UTF-8 encoded JSON document
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # e.g. non-str dict keys or integers wider than 64 bits
+            return _stdlib_dumps(obj)
+    if msgspec is not None:
+        try:
+            return msgspec.json.encode(obj)
+        except TypeError:
+            return _stdlib_dumps(obj)
+    return _stdlib_dumps(obj)
+
+
+def loads(data: bytes | str) -> Any:
+    """
+    Decode a JSON document.
+
+    Args:
+        data: The JSON document
+
+    Returns:
+        Any: The decoded object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    return json.loads(data)
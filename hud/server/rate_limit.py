@@ -0,0 +1,254 @@
+"""
+Client-side rate limiting of requests to the HUD API.
+
+Every request made through `hud.server` takes a token from the bucket of its endpoint class
+before it is sent, waiting if the bucket is empty, so large task sets spread their bursts of
+environment creation and step calls out instead of tripping server-side throttling. Buckets
+are shared by every event loop and thread in the process.
+
+The endpoint class of a request is derived from its URL:
+
+- `create`: environment creation and image builds
+- `invoke`: calls on a running environment (invoke, execute, state, archives, close)
+- `eval`: evaluations
+- `telemetry`: telemetry uploads
+- `default`: everything else, which is not limited unless configured
+
+Limits can be changed with `configure_rate_limit`, and `rate_limit_stats` reports how long
+requests of each class spent waiting.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import threading
+import time
+
+import httpx
+
+logger = logging.getLogger("hud.server.rate_limit")
+
+CREATE = "create"
+INVOKE = "invoke"
+EVAL = "eval"
+TELEMETRY = "telemetry"
+DEFAULT = "default"
+
+# requests per second and burst size of each endpoint class
+DEFAULT_RATE_LIMITS: dict[str, tuple[float, int]] = {
+    CREATE: (10.0, 20),
+    INVOKE: (100.0, 200),
+    EVAL: (20.0, 40),
+    TELEMETRY: (50.0, 100),
+}
+
+_ENDPOINT_PATTERNS: list[tuple[re.Pattern[str], str]] = [
+    (re.compile(r"/create_environments?$|/builds(/[^/]+/start)?$"), CREATE),
+    (re.compile(r"/environments/[^/]+/[^/]+$"), INVOKE),
+    (re.compile(r"/evaluations/"), EVAL),
+    (re.compile(r"/telemetry(/|$)"), TELEMETRY),
+]
+
+
+def classify_endpoint(url: str) -> str:
+    """
+    Get the endpoint class of a request URL.
+
+    Args:
+        url: The URL of the request
+
+    Returns:
+        str: The endpoint class, `default` if no other class matches
+    """
+    path = httpx.URL(url).path
+    for pattern, endpoint_class in _ENDPOINT_PATTERNS:
+        if pattern.search(path):
+            return endpoint_class
+    return DEFAULT
+
+
+class TokenBucket:
+    """
+    A token bucket refilled at `rate` tokens per second, holding at most `burst` tokens.
+
+    Tokens are reserved rather than waited for: a caller takes a token straight away, letting
+    the bucket go into debt, and is told how long to wait for the debt to be paid off. This
+    keeps the bucket free of locks tied to an event loop.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """
+        Initialize the TokenBucket.
+
+        Args:
+            rate: Tokens added per second
+            burst: Maximum number of tokens, i.e. requests that may be sent at once
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token.
+
+        Returns:
+            float: Seconds to wait before the token may be used
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class _ClassStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+
+
+class RateLimiter:
+    """
+    Token buckets for each endpoint class, with statistics on the time spent waiting.
+    """
+
+    def __init__(self, limits: dict[str, tuple[float, int]]) -> None:
+        """
+        Initialize the RateLimiter.
+
+        Args:
+            limits: Requests per second and burst size of each limited endpoint class
+        """
+        self._buckets = {
+            endpoint_class: TokenBucket(rate, burst)
+            for endpoint_class, (rate, burst) in limits.items()
+        }
+        self._stats: dict[str, _ClassStats] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, endpoint_class: str, rate: float | None, burst: int | None = None) -> None:
+        """
+        Set the limit of an endpoint class.
+
+        Args:
+            endpoint_class: The endpoint class
+            rate: Requests per second, or None to stop limiting the class
+            burst: Requests that may be sent at once, defaults to one second's worth
+        """
+        if rate is None:
+            self._buckets.pop(endpoint_class, None)
+            return
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._buckets[endpoint_class] = TokenBucket(rate, burst or max(1, int(rate)))
+
+    def reserve(self, endpoint_class: str) -> float:
+        """
+        Take a token for a request of an endpoint class.
+
+        Args:
+            endpoint_class: The endpoint class of the request
+
+        Returns:
+            float: Seconds to wait before sending the request
+        """
+        bucket = self._buckets.get(endpoint_class)
+        delay = bucket.reserve() if bucket is not None else 0.0
+        with self._lock:
+            stats = self._stats.setdefault(endpoint_class, _ClassStats())
+            stats.requests += 1
+            if delay > 0:
+                stats.throttled += 1
+                stats.throttled_seconds += delay
+        return delay
+
+    async def acquire(self, endpoint_class: str) -> float:
+        """
+        Wait until a request of an endpoint class may be sent.
+
+        Args:
+            endpoint_class: The endpoint class of the request
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        delay = self.reserve(endpoint_class)
+        if delay > 0:
+            logger.debug("Throttling %s request for %.3f seconds", endpoint_class, delay)
+            await asyncio.sleep(delay)
+        return delay
+
+    def acquire_sync(self, endpoint_class: str) -> float:
+        """
+        Block until a request of an endpoint class may be sent.
+
+        Args:
+            endpoint_class: The endpoint class of the request
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        delay = self.reserve(endpoint_class)
+        if delay > 0:
+            logger.debug("Throttling %s request for %.3f seconds", endpoint_class, delay)
+            time.sleep(delay)
+        return delay
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """
+        Get the requests made and time spent throttled for each endpoint class.
+
+        Returns:
+            dict[str, dict[str, float]]: For each class, the number of requests, the number
+                of requests that had to wait and the total seconds spent waiting
+        """
+        with self._lock:
+            return {
+                endpoint_class: {
+                    "requests": stats.requests,
+                    "throttled": stats.throttled,
+                    "throttled_seconds": stats.throttled_seconds,
+                }
+                for endpoint_class, stats in self._stats.items()
+            }
+
+    def reset_stats(self) -> None:
+        """Forget the statistics collected so far."""
+        with self._lock:
+            self._stats.clear()
+
+
+RATE_LIMITER = RateLimiter(DEFAULT_RATE_LIMITS)
+
+
+def configure_rate_limit(endpoint_class: str, rate: float | None, burst: int | None = None) -> None:
+    """
+    Set the process-wide limit of an endpoint class, e.g. to match the quota of an API key.
+
+    Args:
+        endpoint_class: The endpoint class, one of `create`, `invoke`, `eval`, `telemetry`
+            or `default`
+        rate: Requests per second, or None to stop limiting the class
+        burst: Requests that may be sent at once, defaults to one second's worth
+    """
+    RATE_LIMITER.configure(endpoint_class, rate, burst)
+
+
+def rate_limit_stats() -> dict[str, dict[str, float]]:
+    """
+    Get the process-wide rate limiting statistics.
+
+    Returns:
+        dict[str, dict[str, float]]: For each endpoint class, the number of requests, the
+            number of requests that had to wait and the total seconds spent waiting
+    """
+    return RATE_LIMITER.stats()
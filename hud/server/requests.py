@@ -5,9 +5,11 @@ HTTP request utilities for the HUD API.
 from __future__ import annotations
 
 import asyncio
+import importlib.util
 import logging
 import time
-from typing import Any
+import weakref
+from typing import TYPE_CHECKING, Any
 
 import httpx
 
@@ -17,12 +19,22 @@ from hud.exceptions import (
     HudRequestError,
     HudTimeoutError,
 )
+from hud.settings import settings
+
+from .codec import JSON_CONTENT_TYPE, dumps, loads
+from .rate_limit import RATE_LIMITER, classify_endpoint
+from .retry import FAIL_FAST_RETRY_POLICY, RetryPolicy
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterable
 
 # Set up logger
 logger = logging.getLogger("hud.http")
 logger.setLevel(logging.DEBUG)
 
 
+BINARY_CONTENT_TYPE = "application/octet-stream"
+
 # Long running requests can take up to 10 minutes.
 _DEFAULT_TIMEOUT = 600.0
 _DEFAULT_LIMITS = httpx.Limits(
@@ -32,28 +44,121 @@ _DEFAULT_LIMITS = httpx.Limits(
 )
 
 
-async def _handle_retry(
-    attempt: int, max_retries: int, retry_delay: float, url: str, error_msg: str
-) -> None:
-    """Helper function to handle retry logic and logging."""
-    retry_time = retry_delay * (2 ** (attempt - 1))  # Exponential backoff
+def _log_retry(attempt: int, max_retries: int, delay: float, url: str, error_msg: str) -> None:
     logger.warning(
         "%s from %s, retrying in %.2f seconds (attempt %d/%d)",
         error_msg,
         url,
-        retry_time,
+        delay,
         attempt,
         max_retries,
     )
-    await asyncio.sleep(retry_time)
 
 
-def _create_default_async_client() -> httpx.AsyncClient:
-    """Create a default httpx AsyncClient with standard configuration."""
-    return httpx.AsyncClient(
-        timeout=_DEFAULT_TIMEOUT,
-        limits=_DEFAULT_LIMITS,
-    )
+async def _handle_retry(
+    attempt: int, max_retries: int, delay: float, url: str, error_msg: str
+) -> None:
+    """Helper function to log and wait before a retry."""
+    _log_retry(attempt, max_retries, delay, url, error_msg)
+    await asyncio.sleep(delay)
+
+
+def _retry_policy(
+    retry_policy: RetryPolicy | None, max_retries: int, retry_delay: float
+) -> RetryPolicy:
+    """Get the policy of a call, building one from the legacy arguments if none is given."""
+    if retry_policy is not None:
+        return retry_policy
+    return RetryPolicy(max_retries=max_retries, base_delay=retry_delay)
+
+
+def step_retry_policy() -> RetryPolicy | None:
+    """
+    Get the retry policy of environment steps and status polls.
+
+    They are retried like other requests unless `settings.fail_fast_steps` is set, in which
+    case they use `FAIL_FAST_RETRY_POLICY` and its shared circuit breaker and retry budget.
+
+    Returns:
+        RetryPolicy | None: The policy to pass to `make_request`, None for the default
+    """
+    return FAIL_FAST_RETRY_POLICY if settings.fail_fast_steps else None
+
+
+class _SharedClient:
+    def __init__(self) -> None:
+        self.requests = 0
+        http2 = settings.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but h2 is not installed, falling back to HTTP/1.1")
+            http2 = False
+        self.client = httpx.AsyncClient(
+            timeout=_DEFAULT_TIMEOUT,
+            limits=_DEFAULT_LIMITS,
+            http2=http2,
+            event_hooks={"request": [self._on_request]},
+        )
+
+    async def _on_request(self, _: httpx.Request) -> None:
+        self.requests += 1
+
+    def stats(self) -> dict[str, int]:
+        # httpx does not expose its connection pool, so look through the transport
+        pool = getattr(self.client._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "requests": self.requests,
+            "connections": len(connections),
+            "idle_connections": idle,
+        }
+
+
+# One client per event loop, since httpx connections cannot be shared between loops.
+_CLIENTS: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _SharedClient] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_shared_client() -> httpx.AsyncClient:
+    """
+    Get the shared httpx AsyncClient of the running event loop, creating it if needed.
+
+    The client keeps connections alive between requests, so repeated calls to the HUD API
+    reuse a handful of connections instead of opening a new one for every request.
+
+    Returns:
+        httpx.AsyncClient: The shared client, which callers must not close
+    """
+    loop = asyncio.get_running_loop()
+    shared = _CLIENTS.get(loop)
+    if shared is None or shared.client.is_closed:
+        shared = _SharedClient()
+        _CLIENTS[loop] = shared
+    return shared.client
+
+
+async def aclose_shared_client() -> None:
+    """
+    Close the shared httpx AsyncClient of the running event loop, if there is one.
+    The next request on the loop opens a new client.
+    """
+    shared = _CLIENTS.pop(asyncio.get_running_loop(), None)
+    if shared is not None:
+        await shared.client.aclose()
+
+
+def client_stats() -> dict[str, int]:
+    """
+    Get the usage of the shared httpx AsyncClient of the running event loop.
+
+    Returns:
+        dict[str, int]: The number of requests sent, and of open and idle pooled connections
+    """
+    shared = _CLIENTS.get(asyncio.get_running_loop())
+    if shared is None or shared.client.is_closed:
+        return {"requests": 0, "connections": 0, "idle_connections": 0}
+    return shared.stats()
 
 
 def _create_default_sync_client() -> httpx.Client:
@@ -72,6 +177,9 @@ async def make_request(
     max_retries: int = 4,
     retry_delay: float = 2.0,
     client: httpx.AsyncClient | None = None,
+    *,
+    retry_policy: RetryPolicy | None = None,
+    endpoint_class: str | None = None,
 ) -> dict[str, Any]:
     """
     Make an asynchronous HTTP request to the HUD API.
@@ -81,10 +189,12 @@ async def make_request(
         url: Full URL for the request
         json: Optional JSON serializable data
         api_key: API key for authentication
-        max_retries: Maximum number of retries
-        retry_delay: Delay between retries
-        *,
-        client: Optional custom httpx.AsyncClient
+        max_retries: Maximum number of retries, ignored if `retry_policy` is given
+        retry_delay: Base delay between retries, ignored if `retry_policy` is given
+        client: Optional custom httpx.AsyncClient, defaults to the shared client of the loop
+        retry_policy: Optional policy deciding how failed requests are retried
+        endpoint_class: Optional rate limiting class of the request, derived from the URL
+            if not given
 
     Returns:
         dict: JSON response from the server
@@ -92,60 +202,182 @@ async def make_request(
     Raises:
         HudAuthenticationError: If API key is missing or invalid.
         HudRequestError: If the request fails with a non-retryable status code.
-        HudNetworkError: If there are network-related issues.
+        HudNetworkError: If there are network-related issues, or the circuit for the route
+            is open.
         HudTimeoutError: If the request times out.
     """
     if not api_key:
         raise HudAuthenticationError("API key is required but not provided")
 
     headers = {"Authorization": f"Bearer {api_key}"}
-    retry_status_codes = [502, 503, 504]
+    content = None
+    if json is not None:
+        content = dumps(json)
+        headers["Content-Type"] = JSON_CONTENT_TYPE
+    policy = _retry_policy(retry_policy, max_retries, retry_delay)
+    endpoint_class = endpoint_class or classify_endpoint(url)
+    route = f"{httpx.URL(url).host} {endpoint_class}"
     attempt = 0
-    should_close_client = False
 
     if client is None:
-        client = _create_default_async_client()
-        should_close_client = True
+        client = get_shared_client()
+
+    while True:
+        attempt += 1
+
+        wait = policy.before_attempt(route, attempt)
+        if wait is not None:
+            await _handle_retry(attempt, policy.max_retries, wait, url, "Circuit open")
+            continue
+        await RATE_LIMITER.acquire(endpoint_class)
+
+        try:
+            response = await client.request(
+                method=method, url=url, content=content, headers=headers
+            )
+        except httpx.TimeoutException as e:
+            policy.on_timeout(route)
+            raise HudTimeoutError(f"Request timed out: {e!s}") from None
+        except httpx.RequestError as e:
+            delay = policy.on_network_error(route, attempt)
+            if delay is None:
+                raise HudNetworkError(f"Network error: {e!s}") from None
+            await _handle_retry(attempt, policy.max_retries, delay, url, f"Network error: {e}")
+            continue
+        except Exception as e:
+            raise HudRequestError(f"Unexpected error: {e!s}") from None
+
+        # Check if we got a retriable status code
+        delay = policy.on_response(route, attempt, response)
+        if delay is not None:
+            await _handle_retry(
+                attempt,
+                policy.max_retries,
+                delay,
+                url,
+                f"Received status {response.status_code}",
+            )
+            continue
+
+        try:
+            response.raise_for_status()
+            return loads(response.content)
+        except httpx.HTTPStatusError as e:
+            raise HudRequestError.from_httpx_error(e) from None
+        except Exception as e:
+            raise HudRequestError(f"Unexpected error: {e!s}") from None
+
+
+async def make_binary_request(
+    method: str,
+    url: str,
+    *,
+    json: Any | None = None,
+    content: bytes | AsyncIterable[bytes] | None = None,
+    params: dict[str, Any] | None = None,
+    api_key: str | None = None,
+    max_retries: int = 4,
+    retry_delay: float = 2.0,
+    client: httpx.AsyncClient | None = None,
+    retry_policy: RetryPolicy | None = None,
+    endpoint_class: str | None = None,
+) -> bytes:
+    """
+    Make an asynchronous HTTP request to the HUD API that returns a binary body.
 
-    try:
-        while attempt <= max_retries:
-            attempt += 1
+    The request body is either a JSON document or raw bytes, which may be streamed from an
+    async iterable. The response body is streamed rather than decoded as JSON.
 
-            try:
-                response = await client.request(method=method, url=url, json=json, headers=headers)
+    Args:
+        method: HTTP method (GET, POST, etc.)
+        url: Full URL for the request
+        json: Optional JSON serializable data, exclusive with `content`
+        content: Optional raw request body, sent as application/octet-stream
+        params: Optional query parameters
+        api_key: API key for authentication
+        max_retries: Maximum number of retries, ignored if `retry_policy` is given
+        retry_delay: Base delay between retries, ignored if `retry_policy` is given
+        client: Optional custom httpx.AsyncClient, defaults to the shared client of the loop
+        retry_policy: Optional policy deciding how failed requests are retried. Streamed
+            request bodies are never retried.
+        endpoint_class: Optional rate limiting class of the request, derived from the URL
+            if not given
+
+    Returns:
+        bytes: The response body
+
+    Raises:
+        HudAuthenticationError: If API key is missing or invalid.
+        HudRequestError: If the request fails with a non-retryable status code.
+        HudNetworkError: If there are network-related issues, or the circuit for the route
+            is open.
+        HudTimeoutError: If the request times out.
+    """
+    if not api_key:
+        raise HudAuthenticationError("API key is required but not provided")
 
+    headers = {"Authorization": f"Bearer {api_key}", "Accept": BINARY_CONTENT_TYPE}
+    policy = _retry_policy(retry_policy, max_retries, retry_delay)
+    # an iterable body is consumed by the first attempt, so it cannot be sent again
+    replayable = content is None or isinstance(content, bytes)
+    if content is not None:
+        headers["Content-Type"] = BINARY_CONTENT_TYPE
+    elif json is not None:
+        content = dumps(json)
+        headers["Content-Type"] = JSON_CONTENT_TYPE
+    endpoint_class = endpoint_class or classify_endpoint(url)
+    route = f"{httpx.URL(url).host} {endpoint_class}"
+    attempt = 0
+
+    if client is None:
+        client = get_shared_client()
+
+    while True:
+        attempt += 1
+
+        wait = policy.before_attempt(route, attempt)
+        if wait is not None:
+            await _handle_retry(attempt, policy.max_retries, wait, url, "Circuit open")
+            continue
+        await RATE_LIMITER.acquire(endpoint_class)
+
+        try:
+            async with client.stream(
+                method, url, content=content, params=params, headers=headers
+            ) as response:
                 # Check if we got a retriable status code
-                if response.status_code in retry_status_codes and attempt <= max_retries:
+                delay = policy.on_response(route, attempt, response)
+                if delay is not None and replayable:
                     await _handle_retry(
                         attempt,
-                        max_retries,
-                        retry_delay,
+                        policy.max_retries,
+                        delay,
                         url,
                         f"Received status {response.status_code}",
                     )
                     continue
 
+                if response.is_error:
+                    # the error body is needed to build the exception
+                    await response.aread()
                 response.raise_for_status()
-                result = response.json()
-                return result
-            except httpx.TimeoutException as e:
-                raise HudTimeoutError(f"Request timed out: {e!s}") from None
-            except httpx.HTTPStatusError as e:
-                raise HudRequestError.from_httpx_error(e) from None
-            except httpx.RequestError as e:
-                if attempt <= max_retries:
-                    await _handle_retry(
-                        attempt, max_retries, retry_delay, url, f"Network error: {e}"
-                    )
-                    continue
-                else:
-                    raise HudNetworkError(f"Network error: {e!s}") from None
-            except Exception as e:
-                raise HudRequestError(f"Unexpected error: {e!s}") from None
-        raise HudRequestError(f"Request failed after {max_retries} retries with unknown error")
-    finally:
-        if should_close_client:
-            await client.aclose()
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                return bytes(body)
+        except httpx.TimeoutException as e:
+            policy.on_timeout(route)
+            raise HudTimeoutError(f"Request timed out: {e!s}") from None
+        except httpx.HTTPStatusError as e:
+            raise HudRequestError.from_httpx_error(e) from None
+        except httpx.RequestError as e:
+            delay = policy.on_network_error(route, attempt)
+            if delay is None or not replayable:
+                raise HudNetworkError(f"Network error: {e!s}") from None
+            await _handle_retry(attempt, policy.max_retries, delay, url, f"Network error: {e}")
+            continue
+        except Exception as e:
+            raise HudRequestError(f"Unexpected error: {e!s}") from None
 
 
 def make_request_sync(
@@ -157,6 +389,8 @@ def make_request_sync(
     retry_delay: float = 2.0,
     *,
     client: httpx.Client | None = None,
+    retry_policy: RetryPolicy | None = None,
+    endpoint_class: str | None = None,
 ) -> dict[str, Any]:
     """
     Make a synchronous HTTP request to the HUD API.
@@ -166,9 +400,12 @@ def make_request_sync(
         url: Full URL for the request
         json: Optional JSON serializable data
         api_key: API key for authentication
-        max_retries: Maximum number of retries
-        retry_delay: Delay between retries
+        max_retries: Maximum number of retries, ignored if `retry_policy` is given
+        retry_delay: Base delay between retries, ignored if `retry_policy` is given
         client: Optional custom httpx.Client
+        retry_policy: Optional policy deciding how failed requests are retried
+        endpoint_class: Optional rate limiting class of the request, derived from the URL
+            if not given
 
     Returns:
         dict: JSON response from the server
@@ -176,14 +413,21 @@ def make_request_sync(
     Raises:
         HudAuthenticationError: If API key is missing or invalid.
         HudRequestError: If the request fails with a non-retryable status code.
-        HudNetworkError: If there are network-related issues.
+        HudNetworkError: If there are network-related issues, or the circuit for the route
+            is open.
         HudTimeoutError: If the request times out.
     """
     if not api_key:
         raise HudAuthenticationError("API key is required but not provided")
 
     headers = {"Authorization": f"Bearer {api_key}"}
-    retry_status_codes = [502, 503, 504]
+    content = None
+    if json is not None:
+        content = dumps(json)
+        headers["Content-Type"] = JSON_CONTENT_TYPE
+    policy = _retry_policy(retry_policy, max_retries, retry_delay)
+    endpoint_class = endpoint_class or classify_endpoint(url)
+    route = f"{httpx.URL(url).host} {endpoint_class}"
     attempt = 0
     should_close_client = False
 
@@ -192,51 +436,51 @@ def make_request_sync(
         should_close_client = True
 
     try:
-        while attempt <= max_retries:
+        while True:
             attempt += 1
 
+            wait = policy.before_attempt(route, attempt)
+            if wait is not None:
+                _log_retry(attempt, policy.max_retries, wait, url, "Circuit open")
+                time.sleep(wait)
+                continue
+            RATE_LIMITER.acquire_sync(endpoint_class)
+
             try:
-                response = client.request(method=method, url=url, json=json, headers=headers)
+                response = client.request(method=method, url=url, content=content, headers=headers)
+            except httpx.TimeoutException as e:
+                policy.on_timeout(route)
+                raise HudTimeoutError(f"Request timed out: {e!s}") from None
+            except httpx.RequestError as e:
+                delay = policy.on_network_error(route, attempt)
+                if delay is None:
+                    raise HudNetworkError(f"Network error: {e!s}") from None
+                _log_retry(attempt, policy.max_retries, delay, url, f"Network error: {e}")
+                time.sleep(delay)
+                continue
+            except Exception as e:
+                raise HudRequestError(f"Unexpected error: {e!s}") from None
 
-                # Check if we got a retriable status code
-                if response.status_code in retry_status_codes and attempt <= max_retries:
-                    retry_time = retry_delay * (2 ** (attempt - 1))  # Exponential backoff
-                    logger.warning(
-                        "Received status %d from %s, retrying in %.2f seconds (attempt %d/%d)",
-                        response.status_code,
-                        url,
-                        retry_time,
-                        attempt,
-                        max_retries,
-                    )
-                    time.sleep(retry_time)
-                    continue
+            # Check if we got a retriable status code
+            delay = policy.on_response(route, attempt, response)
+            if delay is not None:
+                _log_retry(
+                    attempt,
+                    policy.max_retries,
+                    delay,
+                    url,
+                    f"Received status {response.status_code}",
+                )
+                time.sleep(delay)
+                continue
 
+            try:
                 response.raise_for_status()
-                result = response.json()
-                return result
-            except httpx.TimeoutException as e:
-                raise HudTimeoutError(f"Request timed out: {e!s}") from None
+                return loads(response.content)
             except httpx.HTTPStatusError as e:
                 raise HudRequestError.from_httpx_error(e) from None
-            except httpx.RequestError as e:
-                if attempt <= max_retries:
-                    retry_time = retry_delay * (2 ** (attempt - 1))
-                    logger.warning(
-                        "Network error %s from %s, retrying in %.2f seconds (attempt %d/%d)",
-                        str(e),
-                        url,
-                        retry_time,
-                        attempt,
-                        max_retries,
-                    )
-                    time.sleep(retry_time)
-                    continue
-                else:
-                    raise HudNetworkError(f"Network error: {e!s}") from None
             except Exception as e:
                 raise HudRequestError(f"Unexpected error: {e!s}") from None
-        raise HudRequestError(f"Request failed after {max_retries} retries with unknown error")
     finally:
         if should_close_client:
             client.close()
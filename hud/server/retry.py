@@ -0,0 +1,380 @@
+"""
+Retry policies for requests to the HUD API.
+
+A `RetryPolicy` decides whether and how long to wait before a failed request is sent again.
+Delays use full-jitter exponential backoff, so concurrent callers that fail together do not
+retry in lockstep, and a `Retry-After` header sent with a 429 or 503 response is honoured.
+
+A policy can also be given two pieces of state, so that it has memory of how the API has been
+behaving across calls:
+
+- a `CircuitBreaker`, which stops sending requests to a route after repeated failures and lets
+  a single trial request through once a cool-down has passed;
+- a `RetryBudget`, which stops retrying once failures outnumber successes, so retries cannot
+  multiply the load on a struggling server.
+
+Plain policies use neither. `FAIL_FAST_RETRY_POLICY`, for environment steps where a late answer
+is worth little, and `PATIENT_RETRY_POLICY`, for calls such as job creation that should ride
+out a short outage, share `DEFAULT_CIRCUIT_BREAKER` and `DEFAULT_RETRY_BUDGET`. Environment
+steps only use the fail-fast policy if `settings.fail_fast_steps` is set, see
+`step_retry_policy`. Requests are
+tracked per route, the host together with the endpoint class of the URL, so failures of one
+kind of endpoint do not make unrelated calls to the same host fail fast.
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING
+
+from hud.exceptions import HudCircuitOpenError
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger("hud.server.retry")
+
+# Status codes that mean the request may succeed if it is sent again.
+RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+
+def parse_retry_after(response: httpx.Response) -> float | None:
+    """
+    Get the delay requested by the `Retry-After` header of a response.
+
+    Args:
+        response: The response
+
+    Returns:
+        float | None: Seconds to wait, or None if the header is missing or malformed
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class _RouteState:
+    def __init__(self) -> None:
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial_started: float | None = None
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker keeping track of the health of each route.
+
+    After `failure_threshold` consecutive failures the circuit of a route opens and requests to
+    it are refused. Once `reset_timeout` seconds have passed, one trial request is let through:
+    the circuit closes if it succeeds and opens again if it fails.
+    """
+
+    def __init__(self, failure_threshold: int = 10, reset_timeout: float = 30.0) -> None:
+        """
+        Initialize the CircuitBreaker.
+
+        Args:
+            failure_threshold: Consecutive failures after which the circuit opens
+            reset_timeout: Seconds the circuit stays open before a trial request is allowed
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._routes: dict[str, _RouteState] = {}
+        # the sync client may be used from several threads
+        self._lock = threading.Lock()
+
+    def retry_in(self, route: str) -> float:
+        """
+        Check whether a request to a route may be sent now. When the circuit is half-open, a
+        return value of zero claims the trial request for the caller.
+
+        Args:
+            route: The route the request is sent to
+
+        Returns:
+            float: Zero if the request may be sent, else the seconds until it may be tried
+        """
+        with self._lock:
+            state = self._routes.get(route)
+            if state is None or state.opened_at is None:
+                return 0.0
+            remaining = state.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            now = time.monotonic()
+            if state.trial_started is not None and now - state.trial_started < self.reset_timeout:
+                # another request is already testing the route
+                return state.trial_started + self.reset_timeout - now
+            state.trial_started = now
+            return 0.0
+
+    def record_success(self, route: str) -> None:
+        """Record that a request to a route succeeded, closing its circuit."""
+        with self._lock:
+            self._routes.pop(route, None)
+
+    def record_failure(self, route: str) -> None:
+        """Record that a request to a route failed, opening its circuit if needed."""
+        with self._lock:
+            state = self._routes.setdefault(route, _RouteState())
+            state.failures += 1
+            if state.trial_started is not None or state.failures >= self.failure_threshold:
+                if state.opened_at is None:
+                    logger.warning(
+                        "Opening circuit for %s after %d failures", route, state.failures
+                    )
+                state.opened_at = time.monotonic()
+                state.trial_started = None
+
+    def is_open(self, route: str) -> bool:
+        """Whether requests to a route are currently refused."""
+        with self._lock:
+            state = self._routes.get(route)
+            return state is not None and state.opened_at is not None
+
+    def reset(self) -> None:
+        """Forget the health of every route."""
+        with self._lock:
+            self._routes.clear()
+
+
+class RetryBudget:
+    """
+    A budget limiting retries to a fraction of successful requests.
+
+    The budget holds up to `max_tokens` tokens. Every failure takes a token and every success
+    gives back `token_ratio` tokens; retries are only allowed while more than half the tokens
+    are left.
+    """
+
+    def __init__(self, max_tokens: float = 100.0, token_ratio: float = 0.1) -> None:
+        """
+        Initialize the RetryBudget.
+
+        Args:
+            max_tokens: Size of the budget
+            token_ratio: Tokens given back by every successful request
+        """
+        self.max_tokens = max_tokens
+        self.token_ratio = token_ratio
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        """The tokens left in the budget."""
+        return self._tokens
+
+    def record_success(self) -> None:
+        """Give back tokens for a successful request."""
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.token_ratio)
+
+    def record_failure(self) -> bool:
+        """
+        Take a token for a failed request.
+
+        Returns:
+            bool: True if the request may be retried
+        """
+        with self._lock:
+            self._tokens = max(0.0, self._tokens - 1)
+            return self._tokens > self.max_tokens / 2
+
+    def reset(self) -> None:
+        """Refill the budget."""
+        with self._lock:
+            self._tokens = self.max_tokens
+
+
+DEFAULT_CIRCUIT_BREAKER = CircuitBreaker()
+DEFAULT_RETRY_BUDGET = RetryBudget()
+
+
+class RetryPolicy:
+    """
+    How a request to the HUD API is retried.
+
+    Timeouts are never retried, since long running requests may still be executing on the
+    server. Network errors and responses with a status in `retry_status_codes` are retried
+    up to `max_retries` times.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_retries: int = 4,
+        base_delay: float = 2.0,
+        max_delay: float = 30.0,
+        max_retry_after: float = 60.0,
+        retry_status_codes: frozenset[int] = RETRY_STATUS_CODES,
+        wait_for_circuit: bool = False,
+        circuit_breaker: CircuitBreaker | None = None,
+        budget: RetryBudget | None = None,
+    ) -> None:
+        """
+        Initialize the RetryPolicy.
+
+        Args:
+            max_retries: Maximum number of retries
+            base_delay: Backoff delay before the first retry, doubled for every retry after
+            max_delay: Cap on the backoff delay
+            max_retry_after: Longest `Retry-After` delay honoured, longer ones give up instead
+            retry_status_codes: Response status codes that are retried
+            wait_for_circuit: Wait for an open circuit to allow a trial instead of failing
+            circuit_breaker: Circuit breaker to consult and update, None to disable
+            budget: Retry budget to draw from, None to disable
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.retry_status_codes = retry_status_codes
+        self.wait_for_circuit = wait_for_circuit
+        self.circuit_breaker = circuit_breaker
+        self.budget = budget
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Get a full-jitter backoff delay.
+
+        Args:
+            attempt: The attempt that failed, starting at 1
+
+        Returns:
+            float: A random delay between zero and the capped exponential delay
+        """
+        cap = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, cap)  # noqa: S311
+
+    def before_attempt(self, route: str, attempt: int) -> float | None:
+        """
+        Check the circuit of a route before an attempt.
+
+        Args:
+            route: The route the request is sent to
+            attempt: The attempt about to be made, starting at 1
+
+        Returns:
+            float | None: None if the request may be sent now, else the seconds to wait
+                before checking again
+
+        Raises:
+            HudCircuitOpenError: If the circuit is open and the policy does not wait for it
+        """
+        if self.circuit_breaker is None:
+            return None
+        retry_in = self.circuit_breaker.retry_in(route)
+        if retry_in <= 0:
+            return None
+        if self.wait_for_circuit and attempt <= self.max_retries:
+            return retry_in
+        raise HudCircuitOpenError(f"Circuit open for {route}, retry in {retry_in:.1f} seconds")
+
+    def on_response(self, route: str, attempt: int, response: httpx.Response) -> float | None:
+        """
+        Record a response and decide whether to retry it.
+
+        Args:
+            route: The route the request was sent to
+            attempt: The attempt that got the response, starting at 1
+            response: The response
+
+        Returns:
+            float | None: Seconds to wait before retrying, or None to not retry
+        """
+        status = response.status_code
+        if status not in self.retry_status_codes:
+            if status < 500:
+                self._record_success(route)
+            return None
+
+        if status == 429:
+            # a rate limited server is healthy, it is only asking us to slow down
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_success(route)
+        else:
+            self._record_failure(route)
+        if attempt > self.max_retries or not self._take_budget():
+            return None
+
+        retry_after = parse_retry_after(response)
+        if retry_after is None:
+            return self.backoff(attempt)
+        if retry_after > self.max_retry_after:
+            return None
+        return retry_after
+
+    def on_network_error(self, route: str, attempt: int) -> float | None:
+        """
+        Record a network error and decide whether to retry it.
+
+        Args:
+            route: The route the request was sent to
+            attempt: The attempt that failed, starting at 1
+
+        Returns:
+            float | None: Seconds to wait before retrying, or None to not retry
+        """
+        self._record_failure(route)
+        if attempt > self.max_retries or not self._take_budget():
+            return None
+        return self.backoff(attempt)
+
+    def on_timeout(self, route: str) -> None:
+        """Record a timed out request."""
+        self._record_failure(route)
+
+    def _record_success(self, route: str) -> None:
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_success(route)
+        if self.budget is not None:
+            self.budget.record_success()
+
+    def _record_failure(self, route: str) -> None:
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_failure(route)
+
+    def _take_budget(self) -> bool:
+        if self.budget is None:
+            return True
+        if self.budget.record_failure():
+            return True
+        logger.warning("Retry budget exhausted, not retrying")
+        return False
+
+
+# Environment steps, if settings.fail_fast_steps is set: a late answer is worth little, so
+# give up quickly.
+FAIL_FAST_RETRY_POLICY = RetryPolicy(
+    max_retries=1,
+    base_delay=0.5,
+    max_delay=2.0,
+    max_retry_after=5.0,
+    circuit_breaker=DEFAULT_CIRCUIT_BREAKER,
+    budget=DEFAULT_RETRY_BUDGET,
+)
+
+# Job creation and other setup calls: ride out short outages and wait for open circuits.
+PATIENT_RETRY_POLICY = RetryPolicy(
+    max_retries=8,
+    base_delay=2.0,
+    max_delay=60.0,
+    max_retry_after=120.0,
+    wait_for_circuit=True,
+    circuit_breaker=DEFAULT_CIRCUIT_BREAKER,
+    budget=DEFAULT_RETRY_BUDGET,
+)
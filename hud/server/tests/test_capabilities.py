@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from hud.exceptions import HudNetworkError, HudRequestError
+from hud.server import capabilities
+from hud.server.capabilities import BINARY_TRANSPORT, get_capabilities, supports
+
+
+@pytest.fixture(autouse=True)
+def clear_capabilities(monkeypatch):
+    monkeypatch.setattr(capabilities, "_CAPABILITIES", {})
+
+
+@pytest.mark.asyncio
+async def test_capabilities_are_fetched_once(mocker):
+    mock_request = mocker.patch(
+        "hud.server.capabilities.make_request",
+        return_value={"capabilities": [BINARY_TRANSPORT]},
+    )
+
+    assert await supports(BINARY_TRANSPORT)
+    assert await supports(BINARY_TRANSPORT)
+    assert not await supports("unknown")
+    mock_request.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_missing_endpoint_advertises_nothing(mocker):
+    mock_request = mocker.patch(
+        "hud.server.capabilities.make_request",
+        side_effect=HudRequestError("Not found", status_code=404),
+    )
+
+    assert await get_capabilities() == frozenset()
+    assert await get_capabilities() == frozenset()
+    mock_request.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_network_errors_are_cached_briefly(mocker):
+    mock_request = mocker.patch(
+        "hud.server.capabilities.make_request",
+        side_effect=[HudNetworkError("down"), {"capabilities": [BINARY_TRANSPORT]}],
+    )
+
+    assert not await supports(BINARY_TRANSPORT)
+    assert not await supports(BINARY_TRANSPORT)
+    assert mock_request.await_count == 1
+
+    # once the retry interval has passed, the capabilities are fetched again
+    for base_url, (cached, _) in list(capabilities._CAPABILITIES.items()):
+        capabilities._CAPABILITIES[base_url] = (cached, 0.0)
+    assert await supports(BINARY_TRANSPORT)
+    assert mock_request.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_probes_share_one_request(mocker):
+    release = asyncio.Event()
+
+    async def slow_request(**_):
+        await release.wait()
+        return {"capabilities": [BINARY_TRANSPORT]}
+
+    mock_request = mocker.patch("hud.server.capabilities.make_request", side_effect=slow_request)
+    probes = [asyncio.create_task(supports(BINARY_TRANSPORT)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*probes) == [True] * 5
+    mock_request.assert_awaited_once()
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import pytest
+
+from hud.server import codec
+
+
+@pytest.fixture(params=["backend", "stdlib"])
+def backend(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(codec, "orjson", None)
+        monkeypatch.setattr(codec, "msgspec", None)
+    return request.param
+
+
+def test_round_trip(backend):
+    obj = {"observation": {"screenshot": "aGVsbG8=", "text": "héllo"}, "done": False, "n": 1}
+    data = codec.dumps(obj)
+    assert isinstance(data, bytes)
+    assert codec.loads(data) == obj
+
+
+def test_dumps_falls_back_for_unsupported_values(backend):
+    assert codec.loads(codec.dumps({1: 2**70})) == {"1": 2**70}
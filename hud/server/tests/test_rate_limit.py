@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import pytest
+
+from hud.server.rate_limit import (
+    CREATE,
+    DEFAULT,
+    EVAL,
+    INVOKE,
+    TELEMETRY,
+    RateLimiter,
+    TokenBucket,
+    classify_endpoint,
+)
+
+
+@pytest.mark.parametrize(
+    ("url", "expected"),
+    [
+        ("https://api.hud.so/v2/create_environment", CREATE),
+        ("https://api.hud.so/v2/builds", CREATE),
+        ("https://api.hud.so/v2/builds/abc/start", CREATE),
+        ("https://api.hud.so/v2/environments/abc/invoke", INVOKE),
+        ("https://api.hud.so/v2/environments/abc/state", INVOKE),
+        ("https://api.hud.so/evaluations/evaluate", EVAL),
+        ("https://api.hud.so/v2/telemetry", TELEMETRY),
+        ("https://api.hud.so/v2/jobs", DEFAULT),
+    ],
+)
+def test_classify_endpoint(url, expected):
+    assert classify_endpoint(url) == expected
+
+
+def test_token_bucket_allows_burst_then_spaces_requests(monkeypatch):
+    now = 0.0
+    monkeypatch.setattr("hud.server.rate_limit.time.monotonic", lambda: now)
+    bucket = TokenBucket(rate=10.0, burst=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1)
+    assert bucket.reserve() == pytest.approx(0.2)
+
+    now = 1.0
+    assert bucket.reserve() == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_records_throttled_time(mocker):
+    mock_sleep = mocker.patch("hud.server.rate_limit.asyncio.sleep")
+    limiter = RateLimiter({INVOKE: (1.0, 1)})
+
+    assert await limiter.acquire(INVOKE) == 0
+    delay = await limiter.acquire(INVOKE)
+    assert delay > 0
+    mock_sleep.assert_awaited_once_with(delay)
+    assert await limiter.acquire(DEFAULT) == 0
+
+    stats = limiter.stats()
+    assert stats[INVOKE]["requests"] == 2
+    assert stats[INVOKE]["throttled"] == 1
+    assert stats[INVOKE]["throttled_seconds"] == pytest.approx(delay)
+    assert stats[DEFAULT]["throttled"] == 0
+
+
+def test_configure_rate_limit():
+    limiter = RateLimiter({})
+    limiter.configure(DEFAULT, 1.0)
+    assert limiter.reserve(DEFAULT) == 0
+    assert limiter.reserve(DEFAULT) > 0
+
+    limiter.configure(DEFAULT, None)
+    assert limiter.reserve(DEFAULT) == 0
+    with pytest.raises(ValueError):
+        limiter.configure(DEFAULT, 0)
@@ -11,15 +11,29 @@ import pytest
 
 from hud.exceptions import (
     HudAuthenticationError,
+    HudCircuitOpenError,
     HudNetworkError,
     HudRequestError,
     HudTimeoutError,
 )
 from hud.server.requests import (
     _handle_retry,
+    aclose_shared_client,
+    client_stats,
+    get_shared_client,
+    make_binary_request,
     make_request,
     make_request_sync,
+    step_retry_policy,
 )
+from hud.server.retry import (
+    DEFAULT_CIRCUIT_BREAKER,
+    DEFAULT_RETRY_BUDGET,
+    FAIL_FAST_RETRY_POLICY,
+    CircuitBreaker,
+    RetryPolicy,
+)
+from hud.settings import settings
 
 if TYPE_CHECKING:
     from collections.abc import Callable
@@ -44,6 +58,13 @@ def _create_mock_response(
     return handler
 
 
+@pytest.fixture(autouse=True)
+def reset_retry_state():
+    """Keep failures recorded by one test from opening circuits in the next."""
+    DEFAULT_CIRCUIT_BREAKER.reset()
+    DEFAULT_RETRY_BUDGET.reset()
+
+
 @pytest.mark.asyncio
 async def test_handle_retry():
     """Test the retry handler."""
@@ -52,12 +73,11 @@ async def test_handle_retry():
         await _handle_retry(
             attempt=2,
             max_retries=3,
-            retry_delay=1.0,
+            delay=2.0,
             url="https://example.com",
             error_msg="Test error",
         )
 
-        # Check exponential backoff formula: delay * (2 ^ (attempt - 1))
         mock_sleep.assert_awaited_once_with(2.0)
 
 
@@ -158,19 +178,48 @@ async def test_make_request_unexpected_error():
 
 @pytest.mark.asyncio
 async def test_make_request_auto_client_creation(mocker):
-    """Test automatic client creation when not provided."""
-    mock_create_client = mocker.patch("hud.server.requests._create_default_async_client")
+    """Test that requests without a client use the shared client of the loop."""
+    mock_get_client = mocker.patch("hud.server.requests.get_shared_client")
     mock_client = AsyncMock()
     mock_client.request.return_value = httpx.Response(
         200, json={"result": "success"}, request=httpx.Request("GET", "https://api.test.com")
     )
     mock_client.aclose = AsyncMock()
-    mock_create_client.return_value = mock_client
+    mock_get_client.return_value = mock_client
 
     result = await make_request("GET", "https://api.test.com/data", api_key="test-key")
 
     assert result == {"result": "success"}
-    mock_client.aclose.assert_awaited_once()
+    mock_client.aclose.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_shared_client_is_reused_until_closed():
+    """Test that the shared client is created once per loop and replaced after closing."""
+    first = get_shared_client()
+    assert get_shared_client() is first
+    assert client_stats() == {"requests": 0, "connections": 0, "idle_connections": 0}
+
+    await aclose_shared_client()
+    assert first.is_closed
+    second = get_shared_client()
+    assert second is not first
+    await aclose_shared_client()
+
+
+@pytest.mark.asyncio
+async def test_shared_client_counts_requests(monkeypatch):
+    """Test that requests through the shared client are counted in its stats."""
+    client = get_shared_client()
+    monkeypatch.setattr(
+        client, "_transport", httpx.MockTransport(_create_mock_response(200, {"ok": True}))
+    )
+    try:
+        await make_request("GET", "https://api.test.com/data", api_key="test-key")
+        await make_request("GET", "https://api.test.com/data", api_key="test-key")
+        assert client_stats()["requests"] == 2
+    finally:
+        await aclose_shared_client()
 
 
 def test_make_request_sync_success():
@@ -273,3 +322,172 @@ def test_make_request_sync_auto_client_creation():
 
         assert result == {"result": "success"}
         mock_client.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_make_binary_request_sends_and_returns_raw_bytes():
+    """Test that binary requests send octet-stream bodies and return the raw response."""
+    seen: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return httpx.Response(200, content=b"\x00archive\xff", request=request)
+
+    async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    result = await make_binary_request(
+        "POST",
+        "https://api.test.com/put_archive",
+        content=b"\x01\x02",
+        params={"path": "/tmp"},
+        api_key="test-key",
+        client=async_client,
+    )
+
+    assert result == b"\x00archive\xff"
+    assert seen[0].headers["Content-Type"] == "application/octet-stream"
+    assert seen[0].url.params["path"] == "/tmp"
+    assert seen[0].content == b"\x01\x02"
+
+
+@pytest.mark.asyncio
+async def test_make_binary_request_http_error():
+    """Test that binary requests raise HudRequestError with the error body."""
+    async_client = httpx.AsyncClient(
+        transport=httpx.MockTransport(_create_mock_response(404, {"detail": "Not found"}))
+    )
+    with pytest.raises(HudRequestError) as excinfo:
+        await make_binary_request(
+            "POST", "https://api.test.com/get_archive", api_key="test-key", client=async_client
+        )
+
+    assert excinfo.value.status_code == 404
+    assert "Not found" in str(excinfo.value)
+
+
+@pytest.mark.asyncio
+async def test_make_request_retries_rate_limit_with_retry_after():
+    """Test that 429 responses are retried after the delay the server asks for."""
+    responses = iter(
+        [
+            httpx.Response(429, headers={"Retry-After": "3"}),
+            httpx.Response(200, json={"result": "success"}),
+        ]
+    )
+    async_client = httpx.AsyncClient(transport=httpx.MockTransport(lambda _: next(responses)))
+
+    with patch("hud.server.requests._handle_retry", AsyncMock()) as mock_retry:
+        result = await make_request(
+            "GET", "https://api.test.com/data", api_key="test-key", client=async_client
+        )
+
+    assert result == {"result": "success"}
+    assert mock_retry.await_args is not None
+    assert mock_retry.await_args.args[2] == 3.0
+
+
+@pytest.mark.asyncio
+async def test_make_request_uses_retry_policy():
+    """Test that the retry policy of a call overrides max_retries."""
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(503, json={"detail": "Unavailable"}, request=request)
+
+    async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    policy = RetryPolicy(max_retries=1, circuit_breaker=None, budget=None)
+
+    with patch("hud.server.requests._handle_retry", AsyncMock()), pytest.raises(HudRequestError):
+        await make_request(
+            "GET",
+            "https://api.test.com/data",
+            api_key="test-key",
+            max_retries=10,
+            client=async_client,
+            retry_policy=policy,
+        )
+
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_only_affects_its_route():
+    """Test that failing environment steps do not make other calls to the host fail fast."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/execute"):
+            return httpx.Response(503, json={"detail": "Unavailable"}, request=request)
+        return httpx.Response(200, json={"result": "success"}, request=request)
+
+    async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    policy = RetryPolicy(
+        max_retries=0, circuit_breaker=CircuitBreaker(failure_threshold=1), budget=None
+    )
+
+    with pytest.raises(HudRequestError):
+        await make_request(
+            "POST",
+            "https://api.test.com/environments/env-1/execute",
+            api_key="test-key",
+            client=async_client,
+            retry_policy=policy,
+        )
+    with pytest.raises(HudCircuitOpenError):
+        await make_request(
+            "POST",
+            "https://api.test.com/environments/env-2/execute",
+            api_key="test-key",
+            client=async_client,
+            retry_policy=policy,
+        )
+    result = await make_request(
+        "GET",
+        "https://api.test.com/jobs",
+        api_key="test-key",
+        client=async_client,
+        retry_policy=policy,
+    )
+
+    assert result == {"result": "success"}
+
+
+def test_plain_policies_keep_no_shared_state():
+    """Test that calls without a named policy are not failed fast by other calls."""
+    assert RetryPolicy().circuit_breaker is None
+    assert RetryPolicy().budget is None
+
+
+def test_step_retry_policy_is_opt_in(monkeypatch: pytest.MonkeyPatch):
+    """Test that environment steps only fail fast if the setting is on."""
+    assert step_retry_policy() is None
+
+    monkeypatch.setattr(settings, "fail_fast_steps", True)
+    assert step_retry_policy() is FAIL_FAST_RETRY_POLICY
+
+
+@pytest.mark.asyncio
+async def test_environment_steps_keep_default_retries(mocker):
+    """Test that a failing step is retried like other requests and opens no circuit."""
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(503, json={"detail": "Unavailable"}, request=request)
+
+    async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    mocker.patch("hud.server.requests._handle_retry", AsyncMock())
+
+    for _ in range(DEFAULT_CIRCUIT_BREAKER.failure_threshold + 1):
+        with pytest.raises(HudRequestError):
+            await make_request(
+                "POST",
+                "https://api.test.com/v2/environments/env-1/execute",
+                api_key="test-key",
+                client=async_client,
+                retry_policy=step_retry_policy(),
+            )
+
+    # the default four retries every time, never cut short by an open circuit
+    assert calls == 5 * (DEFAULT_CIRCUIT_BREAKER.failure_threshold + 1)
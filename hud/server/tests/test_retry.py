@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+
+from hud.exceptions import HudCircuitOpenError
+from hud.server.retry import CircuitBreaker, RetryBudget, RetryPolicy, parse_retry_after
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(httpx.Response(429, headers={"Retry-After": "5"})) == 5.0
+    assert parse_retry_after(httpx.Response(429, headers={"Retry-After": "soon"})) is None
+    assert parse_retry_after(httpx.Response(429)) is None
+    past = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert parse_retry_after(httpx.Response(503, headers={"Retry-After": past})) == 0.0
+
+
+def test_backoff_is_jittered_and_capped():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+    delays = [policy.backoff(10) for _ in range(100)]
+    assert all(0 <= delay <= 5.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_circuit_opens_and_allows_one_trial(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr("hud.server.retry.time.monotonic", lambda: now)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0)
+
+    breaker.record_failure("api")
+    assert breaker.retry_in("api") == 0
+    breaker.record_failure("api")
+    assert breaker.is_open("api")
+    assert breaker.retry_in("api") == 10.0
+    assert breaker.retry_in("other") == 0
+
+    now = 111.0
+    assert breaker.retry_in("api") == 0
+    # the trial is in flight, so other requests still wait
+    assert breaker.retry_in("api") > 0
+
+    breaker.record_success("api")
+    assert not breaker.is_open("api")
+    assert breaker.retry_in("api") == 0
+
+
+def test_failed_trial_reopens_circuit(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr("hud.server.retry.time.monotonic", lambda: now)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0)
+
+    breaker.record_failure("api")
+    now = 111.0
+    assert breaker.retry_in("api") == 0
+    breaker.record_failure("api")
+    assert breaker.retry_in("api") == 10.0
+
+
+def test_open_circuit_fails_fast_unless_waiting():
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record_failure("api")
+
+    with pytest.raises(HudCircuitOpenError):
+        RetryPolicy(circuit_breaker=breaker).before_attempt("api", 1)
+    assert RetryPolicy(circuit_breaker=breaker, wait_for_circuit=True).before_attempt("api", 1)
+
+
+def test_retry_budget_stops_retries():
+    budget = RetryBudget(max_tokens=4, token_ratio=1)
+    policy = RetryPolicy(max_retries=10, circuit_breaker=None, budget=budget)
+
+    assert policy.on_network_error("api", 1) is not None
+    assert policy.on_network_error("api", 1) is None
+
+    policy.on_response("api", 1, httpx.Response(200))
+    assert budget.tokens == 3
+
+
+def test_rate_limit_is_not_a_circuit_failure():
+    breaker = CircuitBreaker(failure_threshold=1)
+    policy = RetryPolicy(max_retries=0, circuit_breaker=breaker, budget=None)
+
+    assert policy.on_response("api", 1, httpx.Response(429)) is None
+    assert not breaker.is_open("api")
+    policy.on_response("api", 1, httpx.Response(503))
+    assert breaker.is_open("api")
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from pathlib import Path
+
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -38,6 +40,39 @@ class Settings(BaseSettings):
         validation_alias="OPENAI_API_KEY",
     )
 
+    http2: bool = Field(
+        default=False,
+        description="Use HTTP/2 for requests to the HUD API, requires the h2 package",
+        validation_alias="HUD_HTTP2",
+    )
+
+    gym_id_cache_ttl: float = Field(
+        default=3600.0,
+        description="Seconds a gym ID looked up by name is cached for",
+        validation_alias="HUD_GYM_ID_CACHE_TTL",
+    )
+
+    persist_gym_ids: bool = Field(
+        default=False,
+        description="Keep looked up gym IDs in the cache directory across processes",
+        validation_alias="HUD_PERSIST_GYM_IDS",
+    )
+
+    fail_fast_steps: bool = Field(
+        default=False,
+        description=(
+            "Retry environment steps and status polls once, failing fast once the HUD API "
+            "keeps failing, instead of retrying them like other requests"
+        ),
+        validation_alias="HUD_FAIL_FAST_STEPS",
+    )
+
+    cache_dir: Path = Field(
+        default=Path.home() / ".cache" / "hud",
+        description="Directory for local caches kept by the SDK",
+        validation_alias="HUD_CACHE_DIR",
+    )
+
 
 # Create a singleton instance
 settings = Settings()
@@ -5,12 +5,12 @@ from venv import logger
 
 from pydantic import BaseModel
 
-from hud.server import make_request
+from hud.server import TASKSET_PAGINATION, make_request, supports
 from hud.settings import settings
 from hud.task import Task
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import AsyncIterator, Iterator
 
     from inspect_ai.dataset import Dataset
 
@@ -125,6 +125,55 @@ async def load_taskset(taskset_id: str, api_key: str | None = None) -> TaskSet:
     )
 
 
+async def iter_taskset(
+    taskset_id: str, *, page_size: int = 500, api_key: str | None = None
+) -> AsyncIterator[Task]:
+    """
+    Iterates over the tasks of a TaskSet, loading them one page at a time, so large
+    tasksets can be run without holding every task in memory. Servers that do not
+    advertise pagination send every task in one request.
+
+    Args:
+        taskset_id: The ID of the taskset to load
+        page_size: The number of tasks loaded per request
+        api_key: Optional API key to use for the request
+
+    Yields:
+        Task: The tasks of the taskset, in order
+    """
+
+    if api_key is None:
+        api_key = settings.api_key
+
+    url = f"{settings.base_url}/v2/tasksets/{taskset_id}/tasks"
+    if not await supports(TASKSET_PAGINATION):
+        # the server would ignore offset and limit and send every task at once
+        data = await make_request(method="GET", url=url, api_key=api_key)
+        for task in data["evalset"]:
+            yield Task.model_validate(task)
+        return
+
+    offset = 0
+    previous_ids: list[str | None] = []
+    while True:
+        data = await make_request(
+            method="GET",
+            url=f"{url}?offset={offset}&limit={page_size}",
+            api_key=api_key,
+        )
+        page = data["evalset"]
+        page_ids = [task.get("id") for task in page]
+        if any(page_ids) and page_ids == previous_ids:
+            logger.warning("Taskset %s sent the same page twice, stopping", taskset_id)
+            return
+        for task in page:
+            yield Task.model_validate(task)
+        if not data.get("has_more") or not page:
+            return
+        offset += len(page)
+        previous_ids = page_ids
+
+
 def load_from_inspect(dataset: Dataset) -> TaskSet:
     """
     Creates a TaskSet from an inspect-ai dataset.
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import datetime
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
@@ -10,11 +10,15 @@ from pydantic import ConfigDict
 
 from hud.env.client import Client
 from hud.env.environment import Environment
-from hud.gym import make
+from hud.env.remote_client import RemoteClient
+from hud.exceptions import GymMakeException
+from hud.gym import make, make_many
 from hud.job import Job
 from hud.task import Task
 from hud.types import CustomGym, EnvironmentStatus
-from hud.utils.config import FunctionConfig
+
+if TYPE_CHECKING:
+    from hud.utils.config import FunctionConfig
 
 
 class MockClient(Client):
@@ -51,35 +55,24 @@ class MockClient(Client):
     [
         {
             "name": "custom_local_gym",
-            "env_src": CustomGym(
-                dockerfile="test.Dockerfile",
-                location="local",
-                controller_source_dir="/path/to/source",
-            ),
+            "env_src": CustomGym(image_or_build_context="test-image", location="local"),
             "mock_path": "hud.gym.LocalDockerClient.create",
-            "expected_create_args": ("test.Dockerfile",),
-            "expected_source_path": "/path/to/source",
-            "config": [FunctionConfig(function="test", args=[])],
+            "expected_create_args": ("test-image",),
         },
         {
             "name": "custom_remote_gym",
             "env_src": Task(
                 id="test-task-1",
                 prompt="Test Task",
-                gym=CustomGym(
-                    dockerfile="test.Dockerfile",
-                    location="remote",
-                    controller_source_dir="/path/to/source",
-                ),
+                gym=CustomGym(image_or_build_context="test-image", location="remote"),
             ),
             "mock_path": "hud.gym.RemoteDockerClient.create",
             "expected_create_args": {
-                "dockerfile": "test.Dockerfile",
+                "image_uri": "test-image",
                 "job_id": None,
                 "task_id": "test-task-1",
                 "metadata": {},
             },
-            "expected_source_path": "/path/to/source",
         },
         {
             "name": "preconfigured_gym",
@@ -92,19 +85,22 @@ class MockClient(Client):
                 "metadata": {},
             },
             "mock_get_gym_id": True,
+            "expected_build_data": {"image": "test-image"},
         },
     ],
 )
 async def test_make_gym(mocker, test_case):
     """Test creating environments with different gym types."""
     mock_client = MockClient()
-    mock_build_data = {"image": "test-image"}
     mock_create = mocker.patch(test_case["mock_path"], new_callable=AsyncMock)
-    mock_create.return_value = (mock_client, mock_build_data)
-
+    expected_build_data = test_case.get("expected_build_data", {})
     if test_case.get("mock_get_gym_id"):
+        mock_create.return_value = (mock_client, expected_build_data)
         mock_get_gym_id = mocker.patch("hud.gym.get_gym_id", new_callable=AsyncMock)
         mock_get_gym_id.return_value = "true-gym-id"
+    else:
+        # docker clients are created from an image that needs no build
+        mock_create.return_value = mock_client
 
     # Mock the _setup method to avoid the config requirement
     mocker.patch("hud.env.environment.Environment._setup", new_callable=AsyncMock)
@@ -113,13 +109,86 @@ async def test_make_gym(mocker, test_case):
 
     assert isinstance(env, Environment)
     assert env.client == mock_client
-    assert env.build_data == mock_build_data
+    assert env.build_data == expected_build_data
     if isinstance(test_case["expected_create_args"], tuple):
         mock_create.assert_called_once_with(*test_case["expected_create_args"])
     else:
         mock_create.assert_called_once_with(**test_case["expected_create_args"])
-    if "expected_source_path" in test_case:
-        mock_client.set_source_path.assert_called_once_with(Path(test_case["expected_source_path"]))
+    mock_client.set_source_path.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_make_sets_source_path_of_build_context(mocker):
+    """Test that environments built from a build context keep it in sync."""
+    mock_client = MockClient()
+    mocker.patch(
+        "hud.gym.build_cache.get_or_build",
+        new_callable=AsyncMock,
+        return_value=("built-image", {"image": "built-image"}),
+    )
+    mock_create = mocker.patch(
+        "hud.gym.LocalDockerClient.create", new_callable=AsyncMock, return_value=mock_client
+    )
+
+    env = await make(CustomGym(image_or_build_context=Path("/path/to/source"), location="local"))
+
+    assert env.build_data == {"image": "built-image"}
+    mock_create.assert_called_once_with("built-image")
+    mock_client.set_source_path.assert_called_once_with(Path("/path/to/source"))
+
+
+@pytest.mark.asyncio
+async def test_make_waits_for_remote_environments_to_run(mocker):
+    """Test that a remote environment is only handed out once it is running."""
+    client, _ = RemoteClient.from_create_response({"id": "env-1"}, gym_id="qa")
+    mocker.patch("hud.gym.get_gym_id", new_callable=AsyncMock, return_value="true-gym-id")
+    mocker.patch("hud.gym.RemoteClient.create", new_callable=AsyncMock, return_value=(client, {}))
+    mocker.patch("hud.env.remote_client.supports", new_callable=AsyncMock, return_value=False)
+    mock_status = mocker.patch(
+        "hud.env.remote_client.fetch_remote_status",
+        new_callable=AsyncMock,
+        side_effect=[EnvironmentStatus.INITIALIZING, EnvironmentStatus.RUNNING],
+    )
+    mocker.patch("hud.env.status.MIN_POLL_INTERVAL", 0.001)
+
+    env = await make("qa")
+
+    assert env.client is client
+    assert mock_status.await_count == 2
+    assert client.startup_latency is not None
+
+
+@pytest.mark.asyncio
+async def test_make_fails_when_remote_environment_does_not_start(mocker):
+    """Test that a remote environment that stops while starting is not handed out."""
+    client, _ = RemoteClient.from_create_response({"id": "env-1"}, gym_id="qa")
+    mocker.patch("hud.gym.get_gym_id", new_callable=AsyncMock, return_value="true-gym-id")
+    mocker.patch("hud.gym.RemoteClient.create", new_callable=AsyncMock, return_value=(client, {}))
+    mocker.patch("hud.env.remote_client.supports", new_callable=AsyncMock, return_value=False)
+    mocker.patch(
+        "hud.env.remote_client.fetch_remote_status",
+        new_callable=AsyncMock,
+        return_value=EnvironmentStatus.ERROR,
+    )
+
+    with pytest.raises(GymMakeException) as excinfo:
+        await make("qa")
+    assert "instead of running" in str(excinfo.value.__cause__)
+
+
+@pytest.mark.asyncio
+async def test_make_does_not_poll_local_environments(mocker):
+    """Test that local environments, which run once created, are not polled."""
+    mock_client = MockClient()
+    mock_status = mocker.patch.object(MockClient, "get_status", new_callable=AsyncMock)
+    mocker.patch(
+        "hud.gym.LocalDockerClient.create", new_callable=AsyncMock, return_value=mock_client
+    )
+
+    env = await make(CustomGym(image_or_build_context="test-image", location="local"))
+
+    assert env.client is mock_client
+    mock_status.assert_not_awaited()
 
 
 @pytest.mark.asyncio
@@ -156,38 +225,76 @@ async def test_make_with_job_association(mocker):
 @pytest.mark.asyncio
 async def test_make_with_invalid_gym():
     """Test creating an environment with an invalid gym source."""
-    with pytest.raises(ValueError, match="Invalid gym source"):
+    with pytest.raises(GymMakeException) as excinfo:
         # Create a mock object that is neither a Gym nor a Task
         mock_invalid = MagicMock()
         mock_invalid.__class__ = type("InvalidGym", (), {})
         await make(mock_invalid)
+    assert "Invalid gym source" in str(excinfo.value.__cause__)
 
 
 @pytest.mark.asyncio
 async def test_make_with_invalid_location():
     """Test creating an environment with an invalid location."""
     # Create a CustomGym instance with an invalid location
-    with pytest.raises(ValueError, match="Invalid environment location"):
+    with pytest.raises(GymMakeException) as excinfo:
         await make(
-            MagicMock(
-                spec=CustomGym,
-                dockerfile="test.Dockerfile",
-                location="invalid",
-                controller_source_dir="/path/to/source",
-            )
+            MagicMock(spec=CustomGym, image_or_build_context="test-image", location="invalid")
         )
+    assert "Invalid environment location" in str(excinfo.value.__cause__)
 
 
 @pytest.mark.asyncio
-async def test_make_without_dockerfile():
-    """Test creating an environment without a dockerfile."""
-    # Create a CustomGym instance without a dockerfile
-    with pytest.raises(ValueError, match="Dockerfile is required for custom environments"):
-        await make(
-            MagicMock(
-                spec=CustomGym,
-                dockerfile=None,
-                location="local",
-                controller_source_dir="/path/to/source",
-            )
-        )
+async def test_make_without_image_or_build_context():
+    """Test creating an environment without an image or a build context."""
+    with pytest.raises(GymMakeException) as excinfo:
+        await make(MagicMock(spec=CustomGym, image_or_build_context=None, location="local"))
+    assert "Invalid image or build context" in str(excinfo.value.__cause__)
+
+
+@pytest.mark.asyncio
+async def test_make_many_batches_remote_environments(mocker):
+    """Test that make_many resolves each gym once and creates environments in batches."""
+    mocker.patch("hud.gym.supports", new_callable=AsyncMock, return_value=True)
+    mock_get_gym_id = mocker.patch(
+        "hud.gym.get_gym_id", new_callable=AsyncMock, return_value="true-gym-id"
+    )
+    mock_create = mocker.patch(
+        "hud.gym.create_environments",
+        new_callable=AsyncMock,
+        return_value=[{"id": "env-1"}, {"error": "no capacity"}, {"id": "env-3"}],
+    )
+    mocker.patch(
+        "hud.env.remote_client.fetch_remote_status",
+        new_callable=AsyncMock,
+        return_value=EnvironmentStatus.RUNNING,
+    )
+    mocker.patch("hud.env.environment.Environment._setup", new_callable=AsyncMock)
+    tasks = [Task(id=f"task-{i}", prompt="Test Task", gym="qa") for i in range(1, 4)]
+
+    results = {task.id: result async for task, result in make_many(tasks, job_id="job-1")}
+
+    mock_get_gym_id.assert_awaited_once_with("qa")
+    requests = mock_create.await_args.args[0]
+    assert [request["task_id"] for request in requests] == ["task-1", "task-2", "task-3"]
+    assert all(request["run_id"] == "job-1" for request in requests)
+    for task_id, env_id in [("task-1", "env-1"), ("task-3", "env-3")]:
+        environment = results[task_id]
+        assert isinstance(environment, Environment)
+        assert isinstance(environment.client, RemoteClient)
+        assert environment.client.env_id == env_id
+    assert isinstance(results["task-2"], GymMakeException)
+
+
+@pytest.mark.asyncio
+async def test_make_many_falls_back_to_make(mocker):
+    """Test that make_many makes environments one by one without batch support."""
+    mocker.patch("hud.gym.supports", new_callable=AsyncMock, return_value=False)
+    environment = Environment(client=MockClient(), metadata={}, build_data={})
+    mock_make = mocker.patch("hud.gym.make", new_callable=AsyncMock, return_value=environment)
+    tasks = [Task(id=f"task-{i}", prompt="Test Task", gym="qa") for i in range(2)]
+
+    results = [result async for _, result in make_many(tasks)]
+
+    assert results == [environment, environment]
+    assert mock_make.await_count == 2
@@ -1,13 +1,16 @@
 from __future__ import annotations
 
+import asyncio
 import datetime
 import datetime as dt
+import multiprocessing
 from typing import Any
 from unittest.mock import AsyncMock
 
 import pytest
 
 import hud.job
+from hud.utils.checkpoint import checkpoint_path
 
 
 @pytest.fixture
@@ -182,3 +185,297 @@ async def test_get_active_job(mocker):
     await test_function()
     # Should go back to None after the function returns.
     assert hud.job.get_active_job() is None
+
+
+@pytest.mark.asyncio
+async def test_run_job_streams_tasks(mocker):
+    """Test that run_job runs tasks from an async generator without counting them first."""
+    from hud.agent.base import Agent
+    from hud.task import Task
+
+    class MockAgent(Agent):
+        async def predict(self, obs):
+            return "action", True
+
+        async def fetch_response(self, prompt: str) -> str:
+            return "mock response"
+
+    mock_create_job = mocker.patch("hud.job.create_job", new_callable=AsyncMock)
+    mock_create_job.return_value = hud.job.Job(
+        id="test-job-123",
+        name="Test Job",
+        metadata={},
+        created_at=datetime.datetime.now(),
+        status="created",
+    )
+    mock_gym_make = mocker.patch("hud.gym.make", new_callable=AsyncMock)
+    mock_env = AsyncMock()
+    mock_env.reset.return_value = ("obs", {})
+    mock_env.step.return_value = ("obs", 0, True, {})
+    mock_gym_make.return_value = mock_env
+
+    async def tasks():
+        for i in range(5):
+            yield Task(id=f"task-{i}", prompt="Test Task", gym="hud-browser")
+
+    job = await hud.job.run_job(
+        agent_cls=MockAgent,
+        task_or_taskset=tasks(),
+        job_name="Test Job",
+        max_concurrent_tasks=2,
+        adaptive_concurrency=True,
+    )
+
+    assert mock_create_job.call_args.kwargs["gym_id"] == "hud-browser"
+    assert mock_gym_make.await_count == 5
+    assert set(job.concurrency_limits) == {"env_creation", "agent_prediction", "task_execution"}
+    assert job.concurrency_history["task_execution"][0][1:] == (2, "initial")
+
+
+@pytest.mark.asyncio
+async def test_run_job_pipelines_environments(mocker):
+    """Test that run_job creates environments ahead of the tasks and closes them all."""
+    from hud.agent.base import Agent
+    from hud.exceptions import GymMakeException
+    from hud.task import Task
+
+    class MockAgent(Agent):
+        async def predict(self, obs):
+            return "action", True
+
+        async def fetch_response(self, prompt: str) -> str:
+            return "mock response"
+
+    mock_create_job = mocker.patch("hud.job.create_job", new_callable=AsyncMock)
+    mock_create_job.return_value = hud.job.Job(
+        id="test-job-123",
+        name="Test Job",
+        metadata={},
+        created_at=datetime.datetime.now(),
+        status="created",
+    )
+    envs = []
+
+    async def make(task, job=None):
+        if task.id == "task-3":
+            raise GymMakeException("failed", {})
+        env = AsyncMock()
+        env.reset.return_value = ("obs", {})
+        env.step.return_value = ("obs", 0, True, {})
+        if task.id == "task-4":
+            env.close.side_effect = RuntimeError("close failed")
+        envs.append(env)
+        return env
+
+    mocker.patch("hud.gym.make", side_effect=make)
+    tasks = [Task(id=f"task-{i}", prompt="Test Task") for i in range(8)]
+
+    job = await hud.job.run_job(
+        agent_cls=MockAgent,
+        task_or_taskset=tasks,
+        job_name="Test Job",
+        max_concurrent_tasks=2,
+        pipeline_lookahead=2,
+        show_progress=False,
+    )
+
+    assert len(envs) == 7
+    assert all(env.close.await_count == 1 for env in envs)
+    assert sorted((error["task_id"], error["type"]) for error in job.errors) == [
+        ("task-3", "setup_error"),
+        ("task-4", "env_close_error"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_pipelining_follows_adaptive_task_limit(mocker):
+    """Test that environments are created ahead of the current task limit, not its maximum."""
+    from hud.agent.base import Agent
+    from hud.task import Task
+
+    class MockAgent(Agent):
+        async def predict(self, obs):
+            return "action", True
+
+        async def fetch_response(self, prompt: str) -> str:
+            return "mock response"
+
+    mock_create_job = mocker.patch("hud.job.create_job", new_callable=AsyncMock)
+    mock_create_job.return_value = hud.job.Job(
+        id="test-job-123",
+        name="Test Job",
+        metadata={},
+        created_at=datetime.datetime.now(),
+        status="created",
+    )
+    release = asyncio.Event()
+    lookahead_created = asyncio.Event()
+    envs = []
+
+    async def step(*args, **kwargs):
+        await release.wait()
+        return ("obs", 0, True, {})
+
+    async def make(task, job=None):
+        env = AsyncMock()
+        env.reset.return_value = ("obs", {})
+        env.step.side_effect = step
+        envs.append(env)
+        if len(envs) == 5:
+            lookahead_created.set()
+        return env
+
+    mocker.patch("hud.gym.make", side_effect=make)
+    tasks = [Task(id=f"task-{i}", prompt="Test Task") for i in range(30)]
+
+    run = asyncio.create_task(
+        hud.job.run_job(
+            agent_cls=MockAgent,
+            task_or_taskset=tasks,
+            job_name="Test Job",
+            max_concurrent_tasks=3,
+            adaptive_concurrency=True,
+            pipeline_lookahead=2,
+            show_progress=False,
+        )
+    )
+    await asyncio.wait_for(lookahead_created.wait(), timeout=5)
+    await asyncio.sleep(0.1)
+    # three running tasks and two environments ready for the next ones
+    assert len(envs) == 5
+
+    release.set()
+    await run
+    assert len(envs) == 30
+
+
+@pytest.mark.asyncio
+async def test_resume_job_skips_completed_tasks(mocker):
+    """Test that resume_job runs only the tasks that did not complete before."""
+    from hud.agent.base import Agent
+    from hud.task import Task
+
+    class MockAgent(Agent):
+        async def predict(self, obs):
+            return "action", True
+
+        async def fetch_response(self, prompt: str) -> str:
+            return "mock response"
+
+    job = hud.job.Job(
+        id="test-job-123",
+        name="Test Job",
+        metadata={},
+        created_at=datetime.datetime.now(),
+        status="created",
+    )
+    mocker.patch("hud.job.create_job", new_callable=AsyncMock, return_value=job)
+    mock_load_job = mocker.patch("hud.job.load_job", new_callable=AsyncMock, return_value=job)
+
+    async def make(task, job=None):
+        if task.id == "task-1":
+            raise RuntimeError("failed")
+        env = AsyncMock()
+        env.reset.return_value = ("obs", {})
+        env.step.return_value = ("obs", 0, True, {})
+        return env
+
+    mock_gym_make = mocker.patch("hud.gym.make", side_effect=make)
+    tasks = [Task(id=f"task-{i}", prompt="Test Task") for i in range(3)]
+
+    with pytest.raises(ValueError):
+        await hud.job.resume_job("test-job-123", MockAgent, tasks, show_progress=False)
+
+    await hud.job.run_job(MockAgent, tasks, "Test Job", show_progress=False)
+    assert mock_gym_make.call_count == 3
+
+    mock_gym_make.reset_mock()
+    mock_gym_make.side_effect = None
+    mock_gym_make.return_value = await make(tasks[0])
+    await hud.job.resume_job("test-job-123", MockAgent, tasks, show_progress=False)
+
+    mock_load_job.assert_awaited_once_with("test-job-123")
+    # only the task that failed is run again
+    assert [call.args[0].id for call in mock_gym_make.call_args_list] == ["task-1"]
+    # every task completed, so there is nothing left to resume
+    assert not checkpoint_path("test-job-123").exists()
+
+
+def test_run_shard_reports_progress_and_errors(mocker):
+    """Test that a shard of a multi-process run_job reports its progress and errors."""
+    from hud.agent.base import Agent
+    from hud.task import Task
+
+    class MockAgent(Agent):
+        async def predict(self, obs):
+            return "action", True
+
+        async def fetch_response(self, prompt: str) -> str:
+            return "mock response"
+
+    job = hud.job.Job(
+        id="test-job-123",
+        name="Test Job",
+        metadata={},
+        created_at=datetime.datetime.now(),
+        status="created",
+        errors=[{"type": "setup_error", "task_id": "earlier"}],
+    )
+
+    async def make(task, job=None):
+        if task.id == "task-1":
+            raise RuntimeError("failed")
+        env = AsyncMock()
+        env.reset.return_value = ("obs", {})
+        env.step.return_value = ("obs", 0, True, {})
+        return env
+
+    mocker.patch("hud.gym.make", side_effect=make)
+    events = multiprocessing.get_context("spawn").Queue()
+    tasks = [(f"task-{i}", Task(id=f"task-{i}", prompt="Test Task")) for i in range(3)]
+
+    shard_kwargs = {"agent_cls": MockAgent, "checkpoint": False, "adaptive_concurrency": True}
+    hud.job._run_shard(0, job, tasks, shard_kwargs, {}, events)
+
+    reported = [events.get(timeout=5)]
+    while reported[-1][0] != "done":
+        reported.append(events.get(timeout=5))
+    assert sorted(task_id for kind, _, task_id in reported if kind == "finish") == [
+        "task-0",
+        "task-1",
+        "task-2",
+    ]
+    kind, shard, (errors, history) = reported[-1]
+    assert (kind, shard) == ("done", 0)
+    # only the errors of the shard are sent back
+    assert [(error["task_id"], error["type"]) for error in errors] == [("task-1", "setup_error")]
+    # with the state of its limiters
+    assert {"env_creation", "agent_prediction", "task_execution"} <= set(history)
+
+
+def test_shard_limits_are_merged():
+    """Test that the limits of the shards of a multi-process run_job add up in the job."""
+    job = hud.job.Job(
+        id="test-job-123",
+        name="Test Job",
+        metadata={},
+        created_at=datetime.datetime.now(),
+        status="created",
+    )
+    job._add_shard_history(0, {"task_execution": [(1.0, 8, "initial"), (3.0, 4, "errors")]})
+    job._add_shard_history(1, {"task_execution": [(1.5, 8, "initial"), (2.0, 10, "latency")]})
+
+    assert job.concurrency_limits == {"task_execution": 14}
+    assert job.concurrency_history == {
+        "task_execution": [
+            (1.0, 16, "initial"),
+            (2.0, 18, "shard 1: latency"),
+            (3.0, 14, "shard 0: errors"),
+        ]
+    }
+
+
+def test_split_limit():
+    assert hud.job._split_limit(30, 4) == 8
+    assert hud.job._split_limit(2, 4) == 1
+    assert hud.job._split_limit(None, 4) is None
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import pytest
+
+from hud.taskset import iter_taskset
+
+
+def _page(*ids: str, has_more: bool = True):
+    return {
+        "evalset": [{"id": task_id, "prompt": "Test Task"} for task_id in ids],
+        "has_more": has_more,
+    }
+
+
+@pytest.mark.asyncio
+async def test_iter_taskset_loads_pages(mocker):
+    mocker.patch("hud.taskset.supports", return_value=True)
+    mock_request = mocker.patch(
+        "hud.taskset.make_request",
+        side_effect=[_page("a", "b"), _page("c", has_more=False)],
+    )
+
+    tasks = [task async for task in iter_taskset("taskset-1", page_size=2, api_key="key")]
+
+    assert [task.id for task in tasks] == ["a", "b", "c"]
+    urls = [call.kwargs["url"] for call in mock_request.await_args_list]
+    assert urls[0].endswith("/tasks?offset=0&limit=2")
+    assert urls[1].endswith("/tasks?offset=2&limit=2")
+
+
+@pytest.mark.asyncio
+async def test_iter_taskset_without_pagination_loads_once(mocker):
+    mocker.patch("hud.taskset.supports", return_value=False)
+    mock_request = mocker.patch("hud.taskset.make_request", return_value=_page("a", "b"))
+
+    tasks = [task async for task in iter_taskset("taskset-1", page_size=1, api_key="key")]
+
+    assert [task.id for task in tasks] == ["a", "b"]
+    mock_request.assert_awaited_once()
+    assert mock_request.await_args.kwargs["url"].endswith("/tasks")
+
+
+@pytest.mark.asyncio
+async def test_iter_taskset_stops_on_repeated_page(mocker):
+    mocker.patch("hud.taskset.supports", return_value=True)
+    # a server that ignores offset and keeps reporting more tasks
+    mock_request = mocker.patch("hud.taskset.make_request", return_value=_page("a", "b"))
+
+    tasks = [task async for task in iter_taskset("taskset-1", page_size=2, api_key="key")]
+
+    assert [task.id for task in tasks] == ["a", "b"]
+    assert mock_request.await_count == 2
@@ -0,0 +1,330 @@
+"""
+Streaming, deterministic archives of docker build contexts.
+
+Build contexts are archived file by file, in sorted order, with normalised timestamps, owners
+and permissions, so the same context always produces the same bytes. Files excluded by the
+context's `.dockerignore` are left out, like `docker build` does, and the archive is produced
+as a stream of chunks so a large context is never held in memory at once.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+import re
+import stat
+import tarfile
+import zipfile
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from pathlib import Path
+
+logger = logging.getLogger("hud.utils.archive")
+
+CHUNK_SIZE = 1 << 20
+
+# Files that docker always sends with the build context, even if .dockerignore excludes them.
+_ALWAYS_INCLUDED = ("Dockerfile", ".dockerignore")
+
+# The timestamp of every zip entry, the earliest one zip can represent.
+_ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+class DockerIgnore:
+    """
+    The exclusion patterns of a `.dockerignore` file.
+
+    Patterns follow the docker syntax: `*` and `?` match within a path segment, `**` matches
+    any number of segments, a pattern that matches a directory excludes everything under it,
+    and a pattern starting with `!` re-includes paths excluded by earlier patterns.
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()) -> None:
+        """
+        Initialize the DockerIgnore.
+
+        Args:
+            patterns: The lines of a .dockerignore file
+        """
+        self._rules: list[tuple[re.Pattern[str], bool]] = []
+        for line in patterns:
+            pattern = line.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            negated = pattern.startswith("!")
+            if negated:
+                pattern = pattern[1:].strip()
+            pattern = os.path.normpath(pattern).replace(os.sep, "/").lstrip("/")
+            if pattern in ("", "."):
+                continue
+            self._rules.append((_compile_pattern(pattern), negated))
+
+    @classmethod
+    def from_context(cls, context: Path) -> DockerIgnore:
+        """
+        Read the .dockerignore file of a build context.
+
+        Args:
+            context: The build context directory
+
+        Returns:
+            DockerIgnore: The patterns of the context, which exclude nothing if there is no file
+        """
+        try:
+            return cls((context / ".dockerignore").read_text().splitlines())
+        except FileNotFoundError:
+            return cls()
+
+    @property
+    def has_exceptions(self) -> bool:
+        """Whether any pattern re-includes paths."""
+        return any(negated for _, negated in self._rules)
+
+    def is_excluded(self, rel_path: str) -> bool:
+        """
+        Check if a path is excluded from the build context.
+
+        Args:
+            rel_path: A posix path relative to the build context
+
+        Returns:
+            bool: True if the path, or a directory it is in, is excluded
+        """
+        if rel_path in _ALWAYS_INCLUDED:
+            return False
+        parts = rel_path.split("/")
+        candidates = ["/".join(parts[: i + 1]) for i in range(len(parts))]
+        excluded = False
+        for regex, negated in self._rules:
+            if any(regex.fullmatch(candidate) for candidate in candidates):
+                excluded = not negated
+        return excluded
+
+
+def _compile_pattern(pattern: str) -> re.Pattern[str]:
+    """Translate a .dockerignore pattern into a regular expression."""
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**", i):
+            i += 2
+            if pattern.startswith("/", i):
+                # "**/" matches zero or more leading directories
+                regex += "(?:.*/)?"
+                i += 1
+            else:
+                regex += ".*"
+            continue
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                body = pattern[i + 1 : end]
+                negated = body[:1] in ("!", "^")
+                # escape the members, but keep ranges working
+                members = re.escape(body[1:] if negated else body).replace("\\-", "-")
+                regex += ("[^" if negated else "[") + members + "]"
+                i = end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(char)
+        i += 1
+    return re.compile(regex)
+
+
+def context_paths(context: Path, ignore: DockerIgnore | None = None) -> list[str]:
+    """
+    List the entries of a build context that are not excluded, in sorted order.
+
+    Directories are listed as well as files, so empty directories are kept.
+
+    Args:
+        context: The build context directory
+        ignore: The exclusion patterns, read from the context's .dockerignore by default
+
+    Returns:
+        list[str]: Posix paths relative to the context
+    """
+    if ignore is None:
+        ignore = DockerIgnore.from_context(context)
+    # an excluded directory can only be skipped if no pattern can re-include part of it
+    prune = not ignore.has_exceptions
+
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(context):
+        rel_dir = os.path.relpath(dirpath, context).replace(os.sep, "/")
+        prefix = "" if rel_dir == "." else f"{rel_dir}/"
+
+        kept_dirs = []
+        for dirname in sorted(dirnames):
+            rel_path = prefix + dirname
+            excluded = ignore.is_excluded(rel_path)
+            if not excluded:
+                paths.append(rel_path)
+            if not (excluded and prune):
+                kept_dirs.append(dirname)
+        # walk in sorted order, and only into directories that are not skipped
+        dirnames[:] = kept_dirs
+
+        paths.extend(
+            prefix + filename for filename in filenames if not ignore.is_excluded(prefix + filename)
+        )
+    return sorted(paths)
+
+
+def _normalized_mode(mode: int) -> int:
+    """Normalise permissions to 0755 or 0644, so the archive does not depend on the umask."""
+    return 0o755 if stat.S_ISDIR(mode) or mode & 0o111 else 0o644
+
+
+def _tar_info(context: Path, rel_path: str) -> tarfile.TarInfo:
+    path = context / rel_path
+    st = path.lstat()
+    info = tarfile.TarInfo(rel_path)
+    info.mtime = 0
+    info.uid = info.gid = 0
+    info.uname = info.gname = ""
+    info.mode = _normalized_mode(st.st_mode)
+    if stat.S_ISLNK(st.st_mode):
+        info.type = tarfile.SYMTYPE
+        info.linkname = os.readlink(path)
+    elif stat.S_ISDIR(st.st_mode):
+        info.type = tarfile.DIRTYPE
+    else:
+        info.size = st.st_size
+    return info
+
+
+def iter_tar(
+    context: Path,
+    paths: Iterable[str] | None = None,
+    *,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Archive a build context as an uncompressed tar stream.
+
+    Args:
+        context: The build context directory
+        paths: The relative paths to archive, by default all paths not excluded by .dockerignore
+        chunk_size: The size of chunks read from files
+
+    Yields:
+        bytes: Consecutive chunks of the tar archive
+    """
+    if paths is None:
+        paths = context_paths(context)
+
+    written = 0
+    for rel_path in paths:
+        try:
+            info = _tar_info(context, rel_path)
+        except FileNotFoundError:
+            logger.debug("Skipping %s, which was removed while archiving", rel_path)
+            continue
+        header = info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+        yield header
+        written += len(header)
+        if not info.isreg():
+            continue
+
+        remaining = info.size
+        with (context / rel_path).open("rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    # the file shrank after its header was written, keep the header honest
+                    chunk = bytes(min(chunk_size, remaining))
+                yield chunk
+                remaining -= len(chunk)
+        written += info.size
+        padding = -info.size % tarfile.BLOCKSIZE
+        if padding:
+            yield bytes(padding)
+            written += padding
+
+    # two empty blocks end the archive, padded to a full record like tarfile does
+    end = 2 * tarfile.BLOCKSIZE
+    end += -(written + end) % tarfile.RECORDSIZE
+    yield bytes(end)
+
+
+class _ChunkWriter(io.RawIOBase):
+    """A write-only stream that collects what is written to it until it is drained."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:  # type: ignore[override]
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(
+    context: Path,
+    paths: Iterable[str] | None = None,
+    *,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Archive a build context as a deflated zip stream.
+
+    Args:
+        context: The build context directory
+        paths: The relative paths to archive, by default all paths not excluded by .dockerignore
+        chunk_size: The size of chunks read from files
+
+    Yields:
+        bytes: Consecutive chunks of the zip archive
+    """
+    if paths is None:
+        paths = context_paths(context)
+
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, "w", zipfile.ZIP_DEFLATED) as zipf:
+        for rel_path in paths:
+            path = context / rel_path
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                info = zipfile.ZipInfo(f"{rel_path}/", date_time=_ZIP_EPOCH)
+                info.external_attr = (stat.S_IFDIR | _normalized_mode(st.st_mode)) << 16
+                zipf.writestr(info, b"")
+                continue
+
+            info = zipfile.ZipInfo(rel_path, date_time=_ZIP_EPOCH)
+            info.external_attr = (stat.S_IFREG | _normalized_mode(st.st_mode)) << 16
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.file_size = st.st_size
+            with (
+                path.open("rb") as src,
+                zipf.open(info, "w", force_zip64=st.st_size >= zipfile.ZIP64_LIMIT) as dest,
+            ):
+                while chunk := src.read(chunk_size):
+                    dest.write(chunk)
+                    if data := writer.drain():
+                        yield data
+            if data := writer.drain():
+                yield data
+    yield writer.drain()
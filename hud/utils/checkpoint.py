@@ -0,0 +1,224 @@
+"""
+Append-only checkpoint logs of the tasks of a job.
+
+`run_job` writes one JSON line per change of a task's status to a log in the cache directory,
+so that `resume_job` can skip the tasks a crashed or interrupted run already completed. Every
+line is written with a single `os.write` to a file opened for appending, so a record is either
+in the log whole or, if the process dies mid-write, leaves a partial last line that is skipped
+when the log is read. Nothing is buffered in the process, so a crash loses no records; only a
+crash of the machine can lose the last ones, which are then run again. Once every task of a
+job has completed there is nothing left to resume, so the log is deleted.
+
+A job run in several processes gives each shard its own log, so that no two processes append
+to the same file; the logs of a job are read and deleted together.
+"""
+
+from __future__ import annotations
+
+import glob
+import json
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Any
+
+from hud.settings import settings
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from types import TracebackType
+
+    from typing_extensions import Self
+
+logger = logging.getLogger("hud.utils.checkpoint")
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+ERROR = "error"
+
+_CHECKPOINT_DIR = "jobs"
+
+
+def checkpoint_path(job_id: str, shard: int | None = None) -> Path:
+    """
+    Get the path of the checkpoint log of a job.
+
+    Args:
+        job_id: The ID of the job
+        shard: The shard writing the log, for a job run in several processes
+
+    Returns:
+        Path: The log, in the cache directory
+    """
+    name = job_id if shard is None else f"{job_id}.shard-{shard}"
+    return settings.cache_dir / _CHECKPOINT_DIR / f"{name}.jsonl"
+
+
+def checkpoint_paths(job_id: str) -> list[Path]:
+    """
+    Get the paths of the checkpoint logs of a job, including those of its shards.
+
+    Args:
+        job_id: The ID of the job
+
+    Returns:
+        list[Path]: The logs that exist
+    """
+    path = checkpoint_path(job_id)
+    shards = sorted(path.parent.glob(f"{glob.escape(job_id)}.shard-*.jsonl"))
+    return [path, *shards] if path.exists() else shards
+
+
+def _parse_line(line: bytes) -> dict[str, Any] | None:
+    """Decode a line of a checkpoint log, None if it is not a whole record."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict) or not isinstance(record.get("task_id"), str):
+        return None
+    return record
+
+
+def load_checkpoint(path: Path) -> dict[str, dict[str, Any]]:
+    """
+    Read the latest record of every task in a checkpoint log.
+
+    Args:
+        path: The log
+
+    Returns:
+        dict[str, dict[str, Any]]: The latest record by task ID, empty if there is no log
+    """
+    records: dict[str, dict[str, Any]] = {}
+    try:
+        with path.open("rb") as f:
+            for line in f:
+                record = _parse_line(line)
+                if record is None:
+                    # the partial last line of a run that died mid-write
+                    logger.debug("Skipping unreadable line in checkpoint %s", path)
+                    continue
+                records[record["task_id"]] = record
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def load_job_checkpoint(job_id: str) -> dict[str, dict[str, Any]]:
+    """
+    Read the latest record of every task in the checkpoint logs of a job.
+
+    Args:
+        job_id: The ID of the job
+
+    Returns:
+        dict[str, dict[str, Any]]: The latest record by task ID, empty if there is no log
+    """
+    records: dict[str, dict[str, Any]] = {}
+    for path in checkpoint_paths(job_id):
+        for task_id, record in load_checkpoint(path).items():
+            # a task can be in several logs if the job was resumed with other shards
+            known = records.get(task_id)
+            if known is None or record.get("time", 0) >= known.get("time", 0):
+                records[task_id] = record
+    return records
+
+
+def discard_if_completed(job_id: str) -> bool:
+    """
+    Delete the checkpoint logs of a job if every task in them has completed.
+
+    Args:
+        job_id: The ID of the job
+
+    Returns:
+        bool: True if the logs were deleted
+    """
+    records = load_job_checkpoint(job_id)
+    if not records or any(record.get("status") != COMPLETED for record in records.values()):
+        return False
+    return all([_unlink(path) for path in checkpoint_paths(job_id)])
+
+
+def _unlink(path: Path) -> bool:
+    try:
+        path.unlink()
+    except OSError as e:
+        logger.debug("Could not delete checkpoint %s: %s", path, e)
+        return False
+    return True
+
+
+class CheckpointLog:
+    """
+    An append-only log of the status of the tasks of a job.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Initialize the CheckpointLog. The log is opened on the first record.
+
+        Args:
+            path: The log, appended to if it exists
+        """
+        self.path = path
+        self._fd: int | None = None
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            flags = os.O_RDWR | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0)
+            fd = os.open(self.path, flags, 0o644)
+            size = os.fstat(fd).st_size
+            if size:
+                # appends go to the end whatever the position, so it is only moved to read
+                os.lseek(fd, size - 1, os.SEEK_SET)
+                if os.read(fd, 1) != b"\n":
+                    # end the partial line of a run that died mid-write
+                    os.write(fd, b"\n")
+            self._fd = fd
+        return self._fd
+
+    def record(self, task_id: str, status: str, error: str | None = None) -> None:
+        """
+        Append the status of a task.
+
+        Args:
+            task_id: The ID of the task
+            status: One of PENDING, RUNNING, COMPLETED and ERROR
+            error: What the task failed with, for ERROR
+        """
+        record: dict[str, Any] = {"task_id": task_id, "status": status, "time": time.time()}
+        if error is not None:
+            record["error"] = error
+        line = (json.dumps(record) + "\n").encode()
+        try:
+            os.write(self._open(), line)
+        except OSError as e:
+            # a lost record only means the task may be run again on resume
+            logger.warning("Could not write checkpoint %s: %s", self.path, e)
+
+    def close(self) -> None:
+        """Flush the log to disk and close it."""
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            os.fsync(fd)
+        except OSError as e:
+            logger.debug("Could not sync checkpoint %s: %s", self.path, e)
+        finally:
+            os.close(fd)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
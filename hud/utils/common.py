@@ -3,16 +3,19 @@ from __future__ import annotations
 import io
 import logging
 import tarfile
+import time
 from typing import TYPE_CHECKING, Any, TypedDict
-import zipfile
 
 from pydantic import BaseModel
 
 from hud.server.requests import make_request
 from hud.settings import settings
+from hud.utils.archive import iter_tar, iter_zip
+from hud.utils.concurrency import single_flight
+from hud.utils.disk_cache import load_json, save_json
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import Iterable, Iterator
     from pathlib import Path
 
 logger = logging.getLogger("hud.utils.common")
@@ -83,49 +86,104 @@ def directory_to_tar_bytes(directory_path: Path) -> bytes:
     """
     Converts a directory to a tar archive and returns it as bytes.
 
-    This function creates a tar archive of the specified directory in memory,
-    without writing to a temporary file on disk.
+    Files excluded by the directory's .dockerignore are left out. Use
+    `hud.utils.archive.iter_tar` to stream large directories instead.
 
     Args:
         path: Path to the directory to convert
 
+    Returns:
+        Bytes of the tar archive
+    """
+    return b"".join(iter_tar(directory_path))
+
+
+def files_to_tar_bytes(directory_path: Path, rel_paths: Iterable[str]) -> bytes:
+    """
+    Converts some files of a directory to a tar archive and returns it as bytes.
+
+    Args:
+        directory_path: Path to the directory the files are in
+        rel_paths: Paths of the files to add, relative to the directory
+
     Returns:
         Bytes of the tar archive
     """
     output = io.BytesIO()
 
     with tarfile.open(fileobj=output, mode="w") as tar:
-        # Walk through the directory
-        for file_path in directory_path.rglob("*"):
-            if file_path.is_file():
-                # Calculate relative path for the archive
-                rel_path = file_path.relative_to(directory_path)
-                logger.debug("Adding %s to tar archive", rel_path)
-                tar.add(file_path, arcname=str(rel_path))
-
-    # Get the bytes from the BytesIO object
-    output.seek(0)
+        for rel_path in rel_paths:
+            logger.debug("Adding %s to tar archive", rel_path)
+            tar.add(directory_path / rel_path, arcname=rel_path)
+
     return output.getvalue()
 
+
 def directory_to_zip_bytes(context_dir: Path) -> bytes:
-    """Zip a directory and return the zip archive as bytes."""
-    output = io.BytesIO()
-    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zipf:
-        for file_path in context_dir.rglob("*"):
-            if file_path.is_file():
-                rel_path = file_path.relative_to(context_dir)
-                logger.debug("Adding %s to zip archive", rel_path)
-                zipf.write(str(file_path), arcname=str(rel_path))
-    return output.getvalue()
+    """Zip a directory, leaving out files excluded by its .dockerignore."""
+    return b"".join(iter_zip(context_dir))
 
-async def get_gym_id(gym_name_or_id: str) -> str:
-    """
-    Get the gym ID for a given gym name or ID.
-    """
+
+_GYM_ID_CACHE_FILE = "gym_ids.json"
+
+# "<base url>|<gym name or id>" -> {"id": ..., "expires": unix time}
+_gym_ids: dict[str, dict[str, Any]] | None = None
+
+
+def _load_gym_ids() -> dict[str, dict[str, Any]]:
+    global _gym_ids
+    if _gym_ids is None:
+        gym_ids = load_json(_GYM_ID_CACHE_FILE) if settings.persist_gym_ids else None
+        _gym_ids = gym_ids if isinstance(gym_ids, dict) else {}
+    return _gym_ids
+
+
+def _save_gym_ids() -> None:
+    if not settings.persist_gym_ids:
+        return
+    now = time.time()
+    save_json(
+        _GYM_ID_CACHE_FILE,
+        {key: entry for key, entry in _load_gym_ids().items() if entry["expires"] > now},
+    )
+
+
+async def _lookup_gym_id(key: str, gym_name_or_id: str) -> str:
     data = await make_request(
         method="GET",
         url=f"{settings.base_url}/v1/gyms/{gym_name_or_id}",
         api_key=settings.api_key,
     )
-
+    _load_gym_ids()[key] = {"id": data["id"], "expires": time.time() + settings.gym_id_cache_ttl}
+    _save_gym_ids()
     return data["id"]
+
+
+async def get_gym_id(gym_name_or_id: str) -> str:
+    """
+    Get the gym ID for a given gym name or ID.
+
+    IDs are cached for `settings.gym_id_cache_ttl` seconds, and concurrent lookups of the same
+    name wait for a single request. Set `HUD_PERSIST_GYM_IDS` to keep the cache on disk.
+    """
+    key = f"{settings.base_url}|{gym_name_or_id}"
+    cached = _load_gym_ids().get(key)
+    if cached is not None and cached["expires"] > time.time():
+        return cached["id"]
+
+    return await single_flight(("gym_id", key), lambda: _lookup_gym_id(key, gym_name_or_id))
+
+
+def invalidate_gym_id(gym_name_or_id: str | None = None) -> None:
+    """
+    Forget a cached gym ID, or every cached gym ID.
+
+    Args:
+        gym_name_or_id: The gym name or ID to forget, None to forget all of them
+    """
+    gym_ids = _load_gym_ids()
+    if gym_name_or_id is None:
+        gym_ids.clear()
+    else:
+        gym_ids.pop(f"{settings.base_url}|{gym_name_or_id}", None)
+    _save_gym_ids()
@@ -0,0 +1,247 @@
+"""
+Adaptive concurrency limits, and deduplication of concurrent calls.
+
+An `AdaptiveLimiter` is used like an `asyncio.Semaphore`, but its limit moves with the health
+of whatever it guards, following additive-increase/multiplicative-decrease (AIMD):
+
+- while callers are waiting for a slot and calls succeed without their latency drifting far
+  above the best latency seen, the limit grows by one for every `limit` successful calls;
+- when a call fails with an overload error (a 429, a timeout, or a `GymMakeException`), or
+  latency climbs past `latency_tolerance` times the best latency, the limit is cut by
+  `decrease_factor`. After a cut, further cuts wait until `limit` more calls have finished,
+  so a burst of failures from calls started under the old limit counts as one signal.
+
+Every change of the limit is kept in `history`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import logging
+import time
+from typing import TYPE_CHECKING, TypeVar
+
+from hud.exceptions import GymMakeException, HudRateLimitError, HudTimeoutError
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Hashable
+    from types import TracebackType
+
+logger = logging.getLogger("hud.utils.concurrency")
+
+# Weight of the latest call in the moving average of latency.
+LATENCY_SMOOTHING = 0.2
+# How fast the best latency seen is forgotten, per call, so a stale best does not pin the limit.
+BASELINE_DRIFT = 0.01
+
+T = TypeVar("T")
+
+# calls in progress, per event loop and key
+_FLIGHTS: dict[tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Future] = {}
+
+
+async def single_flight(key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run `call`, unless a call with the same key is already running on this event loop, in
+    which case wait for its result instead.
+
+    A cancelled caller does not cancel the call other callers are waiting for.
+
+    Args:
+        key: Identifies the work, e.g. ("gym_id", name); it should be namespaced by its caller
+        call: Starts the work
+
+    Returns:
+        T: The result of the call
+    """
+    flight_key = (asyncio.get_running_loop(), key)
+    flight = _FLIGHTS.get(flight_key)
+    if flight is None:
+        flight = asyncio.ensure_future(call())
+        _FLIGHTS[flight_key] = flight
+        flight.add_done_callback(lambda _: _FLIGHTS.pop(flight_key, None))
+    return await asyncio.shield(flight)
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """
+    Whether an error means the guarded service is overloaded.
+
+    Besides the HUD SDK's own errors, errors of model provider clients are recognised by a
+    `status_code` of 429 or by "RateLimit" or "Timeout" in their class name.
+
+    Args:
+        error: The error raised by a call
+
+    Returns:
+        bool: True if concurrency should be reduced
+    """
+    if isinstance(error, GymMakeException | HudRateLimitError | HudTimeoutError):
+        return True
+    if isinstance(error, TimeoutError | asyncio.TimeoutError):
+        return True
+    if getattr(error, "status_code", None) == 429:
+        return True
+    name = type(error).__name__
+    return "RateLimit" in name or "Timeout" in name
+
+
+class AdaptiveLimiter:
+    """
+    A semaphore whose limit adapts to the latency and errors of the calls it guards.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        *,
+        min_limit: int = 1,
+        max_limit: int | None = None,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float | None = 2.0,
+        history_size: int = 1000,
+    ) -> None:
+        """
+        Initialize the AdaptiveLimiter.
+
+        Args:
+            name: Name of the guarded stage, used in logs
+            initial: The starting limit
+            min_limit: The lowest the limit is cut to
+            max_limit: The highest the limit grows to, four times `initial` by default
+            decrease_factor: Factor the limit is multiplied by when it is cut
+            latency_tolerance: Multiple of the best latency above which the limit is cut, None
+                to only adapt to errors, e.g. for calls whose duration varies by design
+            history_size: Number of limit changes kept in `history`
+        """
+        if initial < 1 or min_limit < 1:
+            raise ValueError("limits must be at least 1")
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit or initial * 4, initial)
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self._limit = max(min_limit, min(initial, self.max_limit))
+        self._in_flight = 0
+        self._waiters: collections.deque[asyncio.Future[None]] = collections.deque()
+        self._started: dict[asyncio.Task | None, float] = {}
+        self._latency: float | None = None
+        self._best_latency: float | None = None
+        self._credit = 0.0
+        self._cooldown = 0
+        # (unix time, limit, reason) for every change of the limit
+        self.history: collections.deque[tuple[float, int, str]] = collections.deque(
+            [(time.time(), self._limit, "initial")], maxlen=history_size
+        )
+
+    @property
+    def limit(self) -> int:
+        """The current limit."""
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        """The number of calls holding a slot."""
+        return self._in_flight
+
+    async def acquire(self) -> None:
+        """Wait for a free slot and take it."""
+        if self._in_flight < self._limit and not self._waiters:
+            self._in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as the caller was cancelled
+                self._in_flight -= 1
+                self._wake()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, latency: float | None = None, error: BaseException | None = None) -> None:
+        """
+        Give back a slot, adapting the limit to how the call went.
+
+        Args:
+            latency: Seconds the call took, None if unknown
+            error: The error the call failed with, None if it succeeded
+        """
+        self._in_flight -= 1
+        if self._cooldown > 0:
+            self._cooldown -= 1
+
+        if error is not None:
+            if is_overload_error(error):
+                self._decrease(type(error).__name__)
+        elif latency is not None:
+            self._observe(latency)
+        self._wake()
+
+    def _observe(self, latency: float) -> None:
+        if self._latency is None:
+            self._latency = latency
+        else:
+            self._latency += LATENCY_SMOOTHING * (latency - self._latency)
+        if self._best_latency is None:
+            self._best_latency = self._latency
+        else:
+            self._best_latency = min(self._latency, self._best_latency * (1 + BASELINE_DRIFT))
+
+        tolerance = self.latency_tolerance
+        if tolerance is not None and self._latency > self._best_latency * tolerance:
+            self._decrease("latency")
+        elif self._waiters and self._cooldown == 0 and self._limit < self.max_limit:
+            # only grow when the limit is what holds callers back
+            self._credit += 1 / self._limit
+            if self._credit >= 1:
+                self._credit = 0.0
+                self._set_limit(self._limit + 1, "increase")
+
+    def _decrease(self, reason: str) -> None:
+        if self._cooldown > 0:
+            return
+        limit = max(self.min_limit, int(self._limit * self.decrease_factor))
+        self._credit = 0.0
+        # let the calls started under the old limit finish before judging the new one
+        self._cooldown = self._limit
+        if limit != self._limit:
+            logger.info(
+                "Reducing %s concurrency from %d to %d (%s)", self.name, self._limit, limit, reason
+            )
+            self._set_limit(limit, reason)
+
+    def _set_limit(self, limit: int, reason: str) -> None:
+        self._limit = limit
+        self.history.append((time.time(), limit, reason))
+
+    def _wake(self) -> None:
+        while self._waiters and self._in_flight < self._limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+        self._started[asyncio.current_task()] = time.monotonic()
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        started = self._started.pop(asyncio.current_task(), None)
+        if exc is not None and not isinstance(exc, Exception):
+            # a cancelled call says nothing about the health of the stage
+            self.release()
+            return
+        latency = None if started is None else time.monotonic() - started
+        self.release(latency, exc)
@@ -0,0 +1,90 @@
+"""
+Files kept in the SDK cache directory.
+
+Caches are only an optimization, so a cache file that is missing or unreadable reads as empty
+and a cache file that cannot be written is skipped, with a debug log either way. Files are
+replaced atomically, so concurrent processes never read a half-written cache, and indexes
+shared by processes are changed with `update_json`, so one process does not drop the entries
+another added since it loaded the file.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import TYPE_CHECKING, Any
+
+from hud.settings import settings
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+logger = logging.getLogger("hud.utils.disk_cache")
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """
+    Replace a cache file, logging instead of raising if it cannot be written.
+
+    Args:
+        path: The file
+        text: The new contents
+    """
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(text)
+        tmp_path.replace(path)
+    except OSError as e:
+        logger.debug("Could not persist cache %s: %s", path, e)
+
+
+def load_json(name: str) -> Any | None:
+    """
+    Read a JSON file from the cache directory.
+
+    Args:
+        name: The name of the file in `settings.cache_dir`
+
+    Returns:
+        Any | None: The decoded contents, None if the file is missing or unreadable
+    """
+    path = settings.cache_dir / name
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.debug("Ignoring unreadable cache %s: %s", path, e)
+        return None
+
+
+def save_json(name: str, data: Any) -> None:
+    """
+    Write a JSON file to the cache directory.
+
+    Args:
+        name: The name of the file in `settings.cache_dir`
+        data: The contents, encodable as JSON
+    """
+    write_atomic(settings.cache_dir / name, json.dumps(data))
+
+
+def update_json(name: str, update: Callable[[Any | None], Any]) -> Any:
+    """
+    Change a JSON file of the cache directory, applying the change to what the file holds now
+    rather than to a copy loaded earlier.
+
+    Args:
+        name: The name of the file in `settings.cache_dir`
+        update: Gets the current contents, None if the file is missing or unreadable, and
+            returns the new contents
+
+    Returns:
+        Any: The new contents
+    """
+    data = update(load_json(name))
+    save_json(name, data)
+    return data
@@ -0,0 +1,98 @@
+"""
+A worker pool for running many items through an async function.
+
+Instead of creating one coroutine per item up front, a fixed number of workers pull items
+from a bounded queue that is fed from an iterator as the workers make room. Only the items in
+flight and in the queue exist at any time, so memory does not grow with the number of items,
+and items can come from a generator or a paginated API.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import AsyncIterable
+from typing import TYPE_CHECKING, Any, TypeVar
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+
+logger = logging.getLogger("hud.utils.scheduler")
+
+T = TypeVar("T")
+
+# Marks the end of the queue for one worker.
+_DONE: Any = object()
+
+
+async def aiter_items(items: Iterable[T] | AsyncIterable[T]) -> AsyncIterator[T]:
+    """
+    Iterate over a sync or async iterable.
+
+    Args:
+        items: The items
+
+    Yields:
+        T: The items, in order
+    """
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def run_worker_pool(
+    items: Iterable[T] | AsyncIterable[T],
+    worker: Callable[[T], Awaitable[Any]],
+    *,
+    concurrency: int,
+    queue_size: int | None = None,
+) -> int:
+    """
+    Run every item through `worker`, with at most `concurrency` items in flight.
+
+    An exception raised by `worker` is logged and does not stop the other items. An exception
+    raised while getting the next item, or a cancellation, cancels the items in flight and is
+    raised.
+
+    Args:
+        items: The items, read lazily as workers become free
+        worker: Processes one item
+        concurrency: The number of workers
+        queue_size: The number of items read ahead of the workers, `concurrency` by default
+
+    Returns:
+        int: The number of items processed
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=queue_size or concurrency)
+    processed = 0
+
+    async def feed() -> None:
+        async for item in aiter_items(items):
+            await queue.put(item)
+        for _ in range(concurrency):
+            await queue.put(_DONE)
+
+    async def work() -> None:
+        nonlocal processed
+        while (item := await queue.get()) is not _DONE:
+            try:
+                await worker(item)
+            except Exception:
+                logger.exception("Worker failed on %r", item)
+            processed += 1
+
+    feeder = asyncio.create_task(feed())
+    workers = [asyncio.create_task(work()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(feeder, *workers)
+    finally:
+        for task in (feeder, *workers):
+            task.cancel()
+        await asyncio.gather(feeder, *workers, return_exceptions=True)
+    return processed
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from hud.utils.archive import (
+    DockerIgnore,
+    context_paths,
+    iter_tar,
+    iter_zip,
+)
+
+
+@pytest.fixture
+def context(tmp_path):
+    root = tmp_path / "context"
+    (root / "src" / "__pycache__").mkdir(parents=True)
+    (root / ".git").mkdir()
+    (root / "data").mkdir()
+    (root / "Dockerfile").write_text("FROM python:3.11\n")
+    (root / ".dockerignore").write_text(
+        "# comment\n.git\n**/__pycache__\n*.log\ndata/*\n!data/keep.txt\n/Dockerfile\n"
+    )
+    (root / "src" / "main.py").write_text("print('hi')\n")
+    (root / "src" / "weights.bin").write_bytes(os.urandom(1000))
+    (root / "src" / "__pycache__" / "main.pyc").write_bytes(b"\0")
+    (root / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    (root / "data" / "big.bin").write_bytes(os.urandom(1000))
+    (root / "data" / "keep.txt").write_text("keep\n")
+    (root / "debug.log").write_text("log\n")
+    return root
+
+
+def test_dockerignore_patterns():
+    ignore = DockerIgnore(["*.md", "!README.md", "docs/**/*.png", "/build", "[a-c]?.txt"])
+    assert ignore.is_excluded("notes.md")
+    assert not ignore.is_excluded("README.md")
+    # patterns without ** only match within their own directory level
+    assert not ignore.is_excluded("sub/notes.md")
+    assert ignore.is_excluded("docs/a/b/c.png")
+    assert ignore.is_excluded("docs/c.png")
+    # a matching directory excludes everything under it
+    assert ignore.is_excluded("build/out/app")
+    assert ignore.is_excluded("b1.txt")
+    assert not ignore.is_excluded("d1.txt")
+
+
+def test_context_paths_honour_dockerignore(context):
+    assert context_paths(context) == [
+        ".dockerignore",
+        "Dockerfile",
+        "data",
+        "data/keep.txt",
+        "src",
+        "src/main.py",
+        "src/weights.bin",
+    ]
+
+
+def test_tar_is_deterministic_and_streamed(context):
+    first = list(iter_tar(context, chunk_size=256))
+    # files are read in chunks rather than all at once, only the end padding is larger
+    assert max(len(chunk) for chunk in first[:-1]) <= 512
+
+    os.utime(context / "src" / "main.py", (0, 12345))
+    second = b"".join(iter_tar(context))
+    assert b"".join(first) == second
+    assert len(second) % tarfile.RECORDSIZE == 0
+
+    with tarfile.open(fileobj=io.BytesIO(second)) as tar:
+        members = tar.getmembers()
+        assert [m.name for m in members] == context_paths(context)
+        assert {m.mtime for m in members} == {0}
+        extracted = tar.extractfile("data/keep.txt")
+        assert extracted is not None
+        assert extracted.read() == b"keep\n"
+
+
+def test_zip_is_deterministic(context):
+    first = b"".join(iter_zip(context))
+    os.utime(context / "src" / "main.py", (0, 12345))
+    assert b"".join(iter_zip(context)) == first
+
+    with zipfile.ZipFile(io.BytesIO(first)) as zipf:
+        assert zipf.read("src/main.py") == b"print('hi')\n"
+        assert "src/__pycache__/main.pyc" not in zipf.namelist()
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from hud.utils.checkpoint import (
+    COMPLETED,
+    ERROR,
+    PENDING,
+    RUNNING,
+    CheckpointLog,
+    checkpoint_path,
+    checkpoint_paths,
+    discard_if_completed,
+    load_checkpoint,
+    load_job_checkpoint,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_latest_status_wins(tmp_path: Path):
+    path = tmp_path / "jobs" / "job-1.jsonl"
+    with CheckpointLog(path) as log:
+        log.record("a", PENDING)
+        log.record("b", PENDING)
+        log.record("a", RUNNING)
+        log.record("a", COMPLETED)
+        log.record("b", ERROR, "boom")
+
+    records = load_checkpoint(path)
+    assert {task_id: record["status"] for task_id, record in records.items()} == {
+        "a": COMPLETED,
+        "b": ERROR,
+    }
+    assert records["b"]["error"] == "boom"
+
+
+def test_partial_line_is_skipped(tmp_path: Path):
+    path = tmp_path / "job-1.jsonl"
+    with CheckpointLog(path) as log:
+        log.record("a", COMPLETED)
+    # a process that died in the middle of a write
+    with path.open("ab") as f:
+        f.write(b'{"task_id": "b", "sta')
+
+    assert set(load_checkpoint(path)) == {"a"}
+
+    with CheckpointLog(path) as log:
+        log.record("c", COMPLETED)
+    assert set(load_checkpoint(path)) == {"a", "c"}
+
+
+def test_missing_log_is_empty(tmp_path: Path):
+    assert load_checkpoint(tmp_path / "missing.jsonl") == {}
+
+
+def test_log_is_discarded_once_every_task_completed():
+    path = checkpoint_path("job-1")
+    with CheckpointLog(path) as log:
+        log.record("a", COMPLETED)
+        log.record("b", ERROR, "boom")
+    assert not discard_if_completed("job-1")
+    assert path.exists()
+
+    with CheckpointLog(path) as log:
+        log.record("b", COMPLETED)
+    assert discard_if_completed("job-1")
+    assert not path.exists()
+
+
+def test_shards_write_their_own_logs():
+    with CheckpointLog(checkpoint_path("job-1", 0)) as log:
+        log.record("a", ERROR, "boom")
+    with CheckpointLog(checkpoint_path("job-1", 1)) as log:
+        log.record("b", COMPLETED)
+    # a resume in a single process retries "a" in the log of the job
+    with CheckpointLog(checkpoint_path("job-1")) as log:
+        log.record("a", COMPLETED)
+    with CheckpointLog(checkpoint_path("job-10", 0)) as log:
+        log.record("c", PENDING)
+
+    assert len(checkpoint_paths("job-1")) == 3
+    records = load_job_checkpoint("job-1")
+    assert {task_id: record["status"] for task_id, record in records.items()} == {
+        "a": COMPLETED,
+        "b": COMPLETED,
+    }
+
+    assert discard_if_completed("job-1")
+    assert checkpoint_paths("job-1") == []
+    assert checkpoint_paths("job-10") == [checkpoint_path("job-10", 0)]
+
+
+def test_partial_line_of_a_one_byte_log_is_ended(tmp_path: Path):
+    path = tmp_path / "job-1.jsonl"
+    path.write_bytes(b"{")
+    with CheckpointLog(path) as log:
+        log.record("a", COMPLETED)
+    assert set(load_checkpoint(path)) == {"a"}
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import io
 import tarfile
 from pathlib import Path
@@ -7,7 +8,7 @@ from typing import TYPE_CHECKING
 
 import pytest
 
-from hud.utils.common import directory_to_tar_bytes, get_gym_id
+from hud.utils.common import directory_to_tar_bytes, get_gym_id, invalidate_gym_id
 
 if TYPE_CHECKING:
     import pytest_mock
@@ -45,8 +46,60 @@ def test_directory_to_tar_bytes(tmpdir_factory: pytest.TempdirFactory):
 
 
 @pytest.mark.asyncio
-async def test_get_gym_id(mocker: pytest_mock.MockerFixture):
+async def test_get_gym_id(mocker: pytest_mock.MockerFixture, gym_id_cache):
     """Test that the gym ID can be retrieved."""
     mocker.patch("hud.utils.common.make_request", return_value={"id": "test_gym_id"})
     gym_id = await get_gym_id("test_gym")
     assert gym_id == "test_gym_id"
+
+
+@pytest.fixture
+def gym_id_cache(monkeypatch: pytest.MonkeyPatch, cache_dir: Path):
+    """An empty gym id cache, persisted in the temporary cache directory."""
+    from hud.settings import settings
+    from hud.utils import common
+
+    monkeypatch.setattr(common, "_gym_ids", None)
+    monkeypatch.setattr(settings, "persist_gym_ids", True)
+    return common
+
+
+@pytest.mark.asyncio
+async def test_get_gym_id_single_flight_and_cached(mocker: pytest_mock.MockerFixture, gym_id_cache):
+    """Test that concurrent lookups share one request and later lookups hit the cache."""
+    release = asyncio.Event()
+
+    async def slow_request(**_):
+        await release.wait()
+        return {"id": "test_gym_id"}
+
+    mock_request = mocker.patch("hud.utils.common.make_request", side_effect=slow_request)
+    lookups = [asyncio.create_task(get_gym_id("test_gym")) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*lookups) == ["test_gym_id"] * 5
+    assert await get_gym_id("test_gym") == "test_gym_id"
+    assert mock_request.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_get_gym_id_expires_and_persists(
+    mocker: pytest_mock.MockerFixture, monkeypatch: pytest.MonkeyPatch, gym_id_cache
+):
+    """Test that cached ids expire after the TTL and are read back from the cache file."""
+    from hud.settings import settings
+
+    mock_request = mocker.patch("hud.utils.common.make_request", return_value={"id": "test_gym_id"})
+    await get_gym_id("test_gym")
+
+    # a new process reads the id from disk
+    monkeypatch.setattr(gym_id_cache, "_gym_ids", None)
+    assert await get_gym_id("test_gym") == "test_gym_id"
+    assert mock_request.await_count == 1
+
+    monkeypatch.setattr(settings, "gym_id_cache_ttl", -1.0)
+    invalidate_gym_id("test_gym")
+    await get_gym_id("test_gym")
+    await get_gym_id("test_gym")
+    assert mock_request.await_count == 3
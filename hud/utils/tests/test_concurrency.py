@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from hud.exceptions import GymMakeException, HudRequestError
+from hud.utils.concurrency import AdaptiveLimiter, is_overload_error
+
+
+class RateLimitError(Exception):
+    """Stand-in for the rate limit error of a model provider client."""
+
+
+def test_is_overload_error():
+    assert is_overload_error(GymMakeException("failed", {}))
+    assert is_overload_error(HudRequestError("slow down", status_code=429))
+    assert is_overload_error(asyncio.TimeoutError())
+    assert is_overload_error(RateLimitError())
+    assert not is_overload_error(HudRequestError("bad request", status_code=400))
+    assert not is_overload_error(ValueError("bug"))
+
+
+@pytest.mark.asyncio
+async def test_limit_is_enforced():
+    limiter = AdaptiveLimiter("test", 2)
+    running = 0
+    peak = 0
+
+    async def call() -> None:
+        nonlocal running, peak
+        async with limiter:
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.001)
+            running -= 1
+
+    await asyncio.gather(*(call() for _ in range(10)))
+    assert peak <= 4  # the limit may have grown while callers were waiting
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_limit_grows_while_callers_wait():
+    limiter = AdaptiveLimiter("test", 2, max_limit=5, latency_tolerance=None)
+
+    async def call() -> None:
+        async with limiter:
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(call() for _ in range(50)))
+    assert limiter.limit == 5
+    assert [reason for _, _, reason in limiter.history] == ["initial"] + ["increase"] * 3
+
+
+@pytest.mark.asyncio
+async def test_overload_cuts_limit_once_per_window():
+    limiter = AdaptiveLimiter("test", 8)
+
+    async def failing() -> None:
+        async with limiter:
+            await asyncio.sleep(0)
+            raise GymMakeException("failed", {})
+
+    results = await asyncio.gather(*(failing() for _ in range(8)), return_exceptions=True)
+    assert all(isinstance(result, GymMakeException) for result in results)
+    # eight failures of calls started together are one signal
+    assert limiter.limit == 4
+    assert limiter.history[-1][1:] == (4, "GymMakeException")
+
+    async def ok() -> None:
+        async with limiter:
+            pass
+
+    # once the window has passed, errors cut the limit again
+    for _ in range(8):
+        await ok()
+    with pytest.raises(GymMakeException):
+        await failing()
+    assert limiter.limit == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiters_do_not_leak_slots():
+    limiter = AdaptiveLimiter("test", 1)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    limiter.release()
+    assert limiter.in_flight == 0
+    await asyncio.wait_for(limiter.acquire(), timeout=1)
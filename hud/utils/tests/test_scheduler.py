@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from hud.utils.scheduler import run_worker_pool
+
+
+@pytest.mark.asyncio
+async def test_items_are_read_lazily_and_concurrency_is_bounded():
+    read = 0
+    running = 0
+    peak = 0
+
+    def items():
+        nonlocal read
+        for i in range(100):
+            read += 1
+            yield i
+
+    async def worker(item: int) -> None:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # workers and their read-ahead queue hold at most 2 * concurrency items
+        assert read <= item + 2 + 2 * 4
+        await asyncio.sleep(0)
+        running -= 1
+
+    assert await run_worker_pool(items(), worker, concurrency=4) == 100
+    assert peak == 4
+
+
+@pytest.mark.asyncio
+async def test_async_items_and_worker_errors():
+    seen: list[int] = []
+
+    async def items():
+        for i in range(10):
+            await asyncio.sleep(0)
+            yield i
+
+    async def worker(item: int) -> None:
+        if item == 3:
+            raise RuntimeError("task failed")
+        seen.append(item)
+
+    # one failing item does not stop the others
+    assert await run_worker_pool(items(), worker, concurrency=3) == 10
+    assert sorted(seen) == [0, 1, 2, 4, 5, 6, 7, 8, 9]
+
+
+@pytest.mark.asyncio
+async def test_source_errors_cancel_items_in_flight():
+    cancelled = 0
+
+    def items():
+        yield 1
+        raise ValueError("page failed to load")
+
+    async def worker(item: int) -> None:
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled += 1
+            raise
+
+    with pytest.raises(ValueError, match="page failed"):
+        await run_worker_pool(items(), worker, concurrency=2)
+    assert cancelled == 1